@@ -0,0 +1,121 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the size of the change log and the time to read it back when the old and new values are stored
+as plain text, as done previously, against the compact storage of blobs and deltas.
+
+Run with: python -m benchmarks.bench_changelog
+
+A change log with the plain text columns is written first and then migrated by opening it as a ChangeLog,
+so the time to migrate is measured as well.  The time to read the first and the last page of changes, as shown
+by the View Log dialog, is also measured.  Each note is changed twice, once by each cleaner, since
+fixes are usually run more than once over the same notes.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from japanese_text_cleaner.db.change_log import PAGE_SIZE, ChangeLog, row_key
+from japanese_text_cleaner.db.sqlite import DB
+from japanese_text_cleaner.results import PREVIEW_CHARS
+
+from .corpus import html_multiline_field
+
+NOTE_COUNTS = [10000, 50000]
+
+
+def _create_legacy(path, count):
+    rand = random.Random(0)
+    db = DB(path)
+    db.executescript("""
+        create table changelog (id integer primary key, op text not null, init_ts integer not null,
+                                ts integer not null, nid integer not null, fld text not null,
+                                old text not null, new text not null);
+        create index ix_changelog_ts on changelog (ts);
+    """)
+    rows = []
+    for nid in range(1, count + 1):
+        old = html_multiline_field(rand)
+        spaced = old.replace("> ", ">")
+        rows.append(("clean_spaces", 1000, 1000 + nid, nid, "Reading", old, spaced))
+        rows.append(("clean_furigana", 2000, 2000 + nid, nid, "Reading", spaced, spaced.replace("]", "] ")))
+    db.executemany("insert into changelog (op, init_ts, ts, nid, fld, old, new) values (?,?,?,?,?,?,?)", rows)
+    db.commit()
+    db.close()
+
+
+def _read_legacy(path):
+    db = DB(path)
+    count = sum(1 for _ in db.execute("select op, ts, nid, fld, old, new from changelog order by ts, id"))
+    db.close()
+    return count
+
+
+def _read_compact(path):
+    changelog = ChangeLog(path)
+    count = sum(1 for _ in changelog.iter_changes())
+    changelog.close()
+    return count
+
+
+def _page_times(path):
+    """Returns the time to read the first and the last full page, reading each page from the one before it"""
+    changelog = ChangeLog(path)
+    times = []
+    before = None
+    while True:
+        start = time.perf_counter()
+        rows = changelog.page(before=before, preview_chars=PREVIEW_CHARS)
+        if len(rows) < PAGE_SIZE:
+            break
+        times.append(time.perf_counter() - start)
+        before = row_key(rows[-1])
+    changelog.close()
+    return times[0], times[-1]
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    for count in NOTE_COUNTS:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "changelog.db")
+            _create_legacy(path, count)
+            legacy_size = os.path.getsize(path)
+            rows, legacy_read = _timed(_read_legacy, path)
+
+            _, migrate = _timed(lambda: ChangeLog(path).close())
+            compact_size = os.path.getsize(path)
+            _, compact_read = _timed(_read_compact, path)
+            first_page, last_page = _page_times(path)
+        finally:
+            shutil.rmtree(tmp_dir)
+        print("{:>6} changes plain   {:>8.2f} MB read {:>7.3f} s".format(rows, legacy_size / 1e6, legacy_read))
+        print("{:>6} changes compact {:>8.2f} MB read {:>7.3f} s migrate {:>7.3f} s".format(
+            rows, compact_size / 1e6, compact_read, migrate))
+        print("{:>6} changes first page {:>7.2f} ms last page {:>7.2f} ms".format(
+            rows, first_page * 1000, last_page * 1000))
+
+
+if __name__ == "__main__":
+    main()
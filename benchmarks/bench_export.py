@@ -0,0 +1,95 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the peak memory used to export the change log when all the changes are read before writing them,
+as done previously, against streaming them with export_changes, along with the time to export.
+
+Run with: python -m benchmarks.bench_export
+
+Memory is measured with tracemalloc, so it only counts the memory allocated by Python.
+"""
+
+import csv
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from japanese_text_cleaner.db.change_log import ChangeLog, ChangeLogEntry
+from japanese_text_cleaner.export import EXPORT_FIELDS, export_changes
+
+from .corpus import html_multiline_field
+
+CHANGE_COUNTS = [20000, 100000]
+BATCH_SIZE = 10000
+
+
+def _create_changelog(path, count):
+    rand = random.Random(0)
+    changelog = ChangeLog(path)
+    for start in range(0, count, BATCH_SIZE):
+        entries = []
+        for nid in range(start, min(start + BATCH_SIZE, count)):
+            old = html_multiline_field(rand)
+            entries.append(ChangeLogEntry(ts=1000 + nid, nid=nid, fld="Reading", old=old,
+                                          new=old.replace("> ", ">")))
+        changelog.record_and_commit_changes("clean_spaces", 1000 + start, entries)
+    changelog.close()
+
+
+def _export_all_at_once(changelog, path):
+    rows = list(changelog.iter_changes())
+    with open(path, "w", encoding="utf-8", newline="") as outf:
+        writer = csv.writer(outf)
+        writer.writerow(EXPORT_FIELDS)
+        for op, ts, nid, fld, old, new in rows:
+            writer.writerow([ts, op, nid, fld, old, new])
+
+
+def _measure(export, changelog_path, path):
+    changelog = ChangeLog(changelog_path)
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        export(changelog, path)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        changelog.close()
+    return elapsed, peak
+
+
+def main():
+    for count in CHANGE_COUNTS:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            changelog_path = os.path.join(tmp_dir, "changelog.db")
+            _create_changelog(changelog_path, count)
+            for name, export, file_name in (("all at once", _export_all_at_once, "changes.csv"),
+                                            ("streamed", export_changes, "changes.csv"),
+                                            ("streamed gzip", export_changes, "changes.csv.gz")):
+                path = os.path.join(tmp_dir, file_name)
+                elapsed, peak = _measure(export, changelog_path, path)
+                print("{:>6} changes {:<13} {:>7.3f} s peak {:>8.1f} MB file {:>8.1f} MB".format(
+                    count, name, elapsed, peak / 1e6, os.path.getsize(path) / 1e6))
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
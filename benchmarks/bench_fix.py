@@ -0,0 +1,103 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares writing the changes made by Fix one note at a time, as done previously with Note.flush and
+ChangeLog.record_change, against the bulk update_note_fields and record_and_commit_changes.
+
+Run with: python -m benchmarks.bench_fix
+
+Both use SQLite files in a temporary directory standing in for the collection and the change log.
+Only the SQL is measured.  Within Anki, each getNote and flush also builds a Note, looks up its model and
+generates its cards, so the per note path is slower there than shown here.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from japanese_text_cleaner.db.change_log import ChangeLog, ChangeLogEntry
+from japanese_text_cleaner.db.notes import FIELD_SEPARATOR, NoteChange, update_note_fields
+from japanese_text_cleaner.db.sqlite import DB
+
+from .corpus import core_2000_field
+
+MID = 1
+READING_INDEX = 1
+NOTE_COUNTS = [10000, 50000]
+
+
+def _create_collection(path, count):
+    rand = random.Random(0)
+    db = DB(path)
+    db.executescript("""
+        create table notes (id integer primary key, mid integer not null, mod integer not null,
+                            usn integer not null, flds text not null);
+    """)
+    changes = []
+    rows = []
+    for nid in range(1, count + 1):
+        old = core_2000_field(rand)
+        changes.append(NoteChange(nid=nid, field="Reading", old=old, new=old.replace("  ", " ")))
+        rows.append((nid, MID, FIELD_SEPARATOR.join(["expression", old, "meaning"])))
+    db.executemany("insert into notes (id, mid, mod, usn, flds) values (?,?,0,0,?)", rows)
+    db.commit()
+    return db, changes
+
+
+def _per_note(db, changelog, changes):
+    init_ts = int(time.time() * 1000)
+    for change in changes:
+        # Note.flush reads the note and writes all its columns back
+        flds = db.scalar("select flds from notes where id = ?", change.nid)
+        fields = flds.split(FIELD_SEPARATOR)
+        fields[READING_INDEX] = change.new
+        db.execute("update notes set flds = ?, mod = ?, usn = ? where id = ?",
+                   FIELD_SEPARATOR.join(fields), init_ts // 1000, -1, change.nid)
+        changelog.record_change("clean_spaces", init_ts, ChangeLogEntry(
+            ts=int(time.time() * 1000), nid=change.nid, fld="Reading", old=change.old, new=change.new))
+    db.commit()
+    changelog.commit_changes()
+
+
+def _bulk(db, changelog, changes):
+    init_ts = int(time.time() * 1000)
+    update_note_fields(db, changes, {MID: (("Reading", READING_INDEX),)}, mod=init_ts // 1000, usn=-1)
+    changelog.record_and_commit_changes("clean_spaces", init_ts, [
+        ChangeLogEntry(ts=init_ts, nid=change.nid, fld="Reading", old=change.old, new=change.new)
+        for change in changes])
+    db.commit()
+
+
+def main():
+    for count in NOTE_COUNTS:
+        for name, write in (("per note", _per_note), ("bulk", _bulk)):
+            tmp_dir = tempfile.mkdtemp()
+            try:
+                db, changes = _create_collection(os.path.join(tmp_dir, "collection.db"), count)
+                changelog = ChangeLog(os.path.join(tmp_dir, "changelog.db"))
+                start = time.perf_counter()
+                write(db, changelog, changes)
+                elapsed = time.perf_counter() - start
+                db.close()
+                changelog.close()
+            finally:
+                shutil.rmtree(tmp_dir)
+            print("{:>6} notes {:<9} {:>8.3f} s {:>10.0f} notes/sec".format(count, name, elapsed, count / elapsed))
+
+
+if __name__ == "__main__":
+    main()
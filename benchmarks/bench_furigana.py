@@ -0,0 +1,121 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compares the throughput of the furigana alignment code against the previous regex based
+implementation, which is kept below for reference.
+
+Run with: python -m benchmarks.bench_furigana
+"""
+
+import re
+import timeit
+
+from japanese_text_cleaner.text.furigana import _trim_redundant_furigana_from_chunk
+
+# Chunks with a single reading, as seen by _trim_redundant_furigana_from_chunk.  Expressions never
+# equal their readings since the legacy implementation never terminates for those.
+CHUNKS = [
+    "別に[べつに]",
+    "疲れる[つかれる]",
+    "相変わらず[あいかわらず]",
+    "当たり前[あたりまえ]",
+    "振り返る[ふりかえる]",
+    "世の中[よのなか]",
+    "彼女[かのじょ]",
+    "月曜日[げつようび]",
+    "申し訳ありません[もうしわけありません]",
+    "取り扱い説明書[とりあつかいせつめいしょ]",
+    "aaabbcddddefg[mmbbnnnddddopqr]",
+    "お見舞い[おみまい]",
+]
+
+
+def _legacy_trim_redundant_furigana_middle(src):
+    m = re.match(r"""^
+        ([^\[\]]+)
+        \[
+            ([^\[\]]+)
+        \]
+    $""", src, re.VERBOSE)
+    if m:
+        expression, furigana = m.group(1), m.group(2)
+        common_chars = set(expression).intersection(set(furigana))
+        if common_chars:
+            pattern = "([" + "".join(common_chars) + "]+)"
+            expression_split = re.split(pattern, expression)
+            furigana_split = re.split(pattern, furigana)
+            if len(expression_split) == len(furigana_split):
+                result = ""
+                for i, chunks in enumerate(zip(expression_split, furigana_split)):
+                    exp_chunk, furi_chunk = chunks
+                    if i % 2 == 0:
+                        if result:
+                            result += " "
+                        result += exp_chunk + "[" + furi_chunk + "]"
+                    elif exp_chunk == furi_chunk:
+                        result += exp_chunk
+                    else:
+                        return src
+                return result
+    return src
+
+
+def _legacy_trim_redundant_furigana_from_chunk(src):
+    m = re.match(r"""^
+        ([^\[\]]+)
+        \[
+            ([^\[\]]+)
+        \]
+        ([^\[\]]*)
+    $""", src, re.VERBOSE)
+    if m:
+        expression, furigana, extra = m.group(1), m.group(2), m.group(3)
+        trim_start_len = 0
+        trim_end_len = 0
+        while expression[:(trim_start_len + 1)] == furigana[:(trim_start_len + 1)]:
+            trim_start_len += 1
+        while expression[-(trim_end_len + 1):] == furigana[-(trim_end_len + 1):]:
+            trim_end_len += 1
+        if trim_start_len or trim_end_len:
+            beginning = ""
+            if trim_start_len:
+                beginning = expression[:trim_start_len] + " "
+            if trim_end_len:
+                middle = expression[trim_start_len:-trim_end_len]
+                reading = furigana[trim_start_len:-trim_end_len]
+            else:
+                middle = expression[trim_start_len:]
+                reading = furigana[trim_start_len:]
+            middle += "[" + reading + "]"
+            end = expression[-trim_end_len:] if trim_end_len else ""
+            return beginning + _legacy_trim_redundant_furigana_middle(middle) + end + extra
+        else:
+            return _legacy_trim_redundant_furigana_middle(src)
+    return src
+
+
+def main():
+    for chunk in CHUNKS:
+        assert _trim_redundant_furigana_from_chunk(chunk) == _legacy_trim_redundant_furigana_from_chunk(chunk), chunk
+
+    number = 2000
+    for name, trim in [("legacy", _legacy_trim_redundant_furigana_from_chunk),
+                       ("current", _trim_redundant_furigana_from_chunk)]:
+        elapsed = min(timeit.repeat(lambda: [trim(chunk) for chunk in CHUNKS], number=number, repeat=5))
+        print("{:>8}: {:>10.0f} chunks/sec".format(name, number * len(CHUNKS) / elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures the latency of cleaning a field in the editor with IncrementalCleaner, against a budget.
+
+Run with: python -m benchmarks.bench_on_save [--budget-ms 1.0]
+
+For each typical shape of field, reports the median and 99th percentile time to clean a field when it is
+first seen (cold) and after one of its lines is edited (edit), and exits with a non-zero status when the
+99th percentile of any of them exceeds the budget.  The long_line shape is reported but not held to the
+budget since it is far larger than a field typed in the editor.
+"""
+
+import argparse
+import sys
+import time
+
+from japanese_text_cleaner.text.incremental import IncrementalCleaner
+from japanese_text_cleaner.text.pipeline import ALL_CLEANERS
+
+from .corpus import generate_corpus
+
+# Shapes held to the budget
+TYPICAL_SHAPES = ["core2000", "v2k", "html_multiline"]
+
+
+def _edit(field):
+    """Returns the field with a stray space typed into its last line"""
+    lines = field.split("\n")
+    lines[-1] = lines[-1] + " は"
+    return "\n".join(lines)
+
+
+def measure(fields, cleaner):
+    """Returns the sorted times in seconds to clean each field cold and then after an edit"""
+    cold = []
+    edit = []
+    for field in fields:
+        incremental = IncrementalCleaner(cleaner)
+        start = time.perf_counter()
+        incremental.clean(field)
+        cold.append(time.perf_counter() - start)
+
+        edited = _edit(field)
+        start = time.perf_counter()
+        incremental.clean(edited)
+        edit.append(time.perf_counter() - start)
+    return sorted(cold), sorted(edit)
+
+
+def _percentile(times, fraction):
+    return times[min(len(times) - 1, int(len(times) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the latency of cleaning fields in the editor")
+    parser.add_argument("--budget-ms", type=float, default=1.0,
+                        help="99th percentile time to clean a typical field (default 1.0)")
+    args = parser.parse_args(argv)
+
+    over_budget = 0
+    for shape, fields in generate_corpus().items():
+        for kind, times in zip(["cold", "edit"], measure(fields, ALL_CLEANERS)):
+            p99_ms = _percentile(times, 0.99) * 1000
+            enforced = shape in TYPICAL_SHAPES
+            over = enforced and p99_ms > args.budget_ms
+            over_budget += over
+            print("{:<15} {:<5} {:>8.3f} ms median {:>8.3f} ms p99{}".format(
+                shape, kind, _percentile(times, 0.5) * 1000, p99_ms,
+                "  OVER BUDGET" if over else "" if enforced else "  (not enforced)"))
+    if over_budget:
+        print("{} measurements exceeded the budget of {} ms".format(over_budget, args.budget_ms))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
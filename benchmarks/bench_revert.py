@@ -0,0 +1,96 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures reverting a batch of changes to the Reading field of every note in a collection, checking for
+conflicts with plan_revert and then updating the notes and logging the reverts with apply_revert.
+
+Run with: python -m benchmarks.bench_revert
+
+Uses SQLite files in a temporary directory standing in for the collection and the change log, with the
+batch to revert logged as the fix of every note.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from japanese_text_cleaner.db.change_log import ChangeLog, ChangeLogEntry, ChangeLogQuery
+from japanese_text_cleaner.db.notes import FIELD_SEPARATOR
+from japanese_text_cleaner.db.revert import apply_revert, plan_revert
+from japanese_text_cleaner.db.sqlite import DB
+
+from .corpus import core_2000_field
+
+MID = 1
+INIT_TS = 1000
+NOTE_COUNTS = [20000, 50000]
+
+
+class Models:
+    """Stands in for the collection's ModelManager"""
+
+    def all(self):
+        return [{"id": MID, "flds": [{"name": name, "ord": i} for i, name in
+                                     enumerate(["Expression", "Reading", "Meaning"])]}]
+
+    def fieldMap(self, model):
+        return {f["name"]: (f["ord"], f) for f in model["flds"]}
+
+
+def _setup(tmp_dir, count):
+    rand = random.Random(0)
+    db = DB(os.path.join(tmp_dir, "collection.db"))
+    db.executescript("""
+        create table notes (id integer primary key, mid integer not null, mod integer not null,
+                            usn integer not null, flds text not null);
+    """)
+    rows = []
+    entries = []
+    for nid in range(1, count + 1):
+        old = "<b> 一[いち]</b>" + core_2000_field(rand)
+        new = old.replace("<b> ", "<b>")
+        rows.append((nid, MID, FIELD_SEPARATOR.join(["expression", new, "meaning"])))
+        entries.append(ChangeLogEntry(ts=INIT_TS, nid=nid, fld="Reading", old=old, new=new))
+    db.executemany("insert into notes (id, mid, mod, usn, flds) values (?,?,0,0,?)", rows)
+    db.commit()
+    changelog = ChangeLog(os.path.join(tmp_dir, "changelog.db"))
+    changelog.record_and_commit_changes("clean_spaces", INIT_TS, entries)
+    return db, changelog
+
+
+def main():
+    for count in NOTE_COUNTS:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            db, changelog = _setup(tmp_dir, count)
+            start = time.perf_counter()
+            plan = plan_revert(db, Models(), changelog, ChangeLogQuery(init_ts=INIT_TS))
+            planned = time.perf_counter()
+            apply_revert(db, changelog, plan, int(time.time() * 1000), usn=-1)
+            db.commit()
+            applied = time.perf_counter()
+            db.close()
+            changelog.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+        assert not plan.conflicts and len(plan.changes) == count
+        print("{:>6} notes plan {:>7.3f} s apply {:>7.3f} s total {:>7.3f} s".format(
+            count, planned - start, applied - planned, applied - start))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures how clean_spaces scales with the number of tokens in a single line.
+
+Run with: python -m benchmarks.bench_spacing
+
+The time per token should stay roughly flat as lines grow.  A time per token that grows with the
+line length indicates quadratic behavior.
+"""
+
+import timeit
+
+from japanese_text_cleaner.text.spacing import clean_spaces
+from japanese_text_cleaner.text.split import formatting_aware_split
+
+# Patterns repeated to build long lines.  Each has spaces that must be kept, spaces that must be
+# dropped and html tags between the spaces and the furigana they belong to.
+PATTERNS = [
+    "<b> 一[いち]</b>から  始[はじ]めましょう。 ",
+    "杯[はい],   <i><b>杯[さかずき]</b></i> ",
+    "あ <br><br><br><br><br><br> い ",
+]
+
+TOKEN_COUNTS = [1000, 2000, 4000, 8000, 16000]
+
+
+def build_line(pattern, token_count):
+    """Repeats pattern until the line has at least token_count tokens"""
+    tokens_per_pattern = len(formatting_aware_split(pattern))
+    return pattern * (token_count // tokens_per_pattern + 1)
+
+
+def main():
+    for pattern in PATTERNS:
+        print("Pattern: {!r}".format(pattern))
+        for token_count in TOKEN_COUNTS:
+            line = build_line(pattern, token_count)
+            number = max(1, 64000 // token_count)
+            elapsed = min(timeit.repeat(lambda: clean_spaces(line), number=number, repeat=3)) / number
+            print("  {:>6} tokens: {:>9.2f} ms/line {:>7.3f} us/token".format(
+                token_count, elapsed * 1000, elapsed * 1e6 / token_count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Generates synthetic fields shaped like those found in the shared decks listed in the README.  The
+fields are built from a fixed seed so every run measures the same content.
+"""
+
+import random
+from collections import OrderedDict
+
+# Words with readings, including some where the reading repeats kana from the expression so the
+# furigana can be trimmed.
+WORDS = [
+    "一[いち]", "始[はじ]める", "彼女[かのじょ]", "語[ご]", "月曜日[げつようび]", "世の中[よのなか]",
+    "別に[べつに]", "疲れる[つかれる]", "当たり前[あたりまえ]", "学校[がっこう]", "先生[せんせい]",
+    "電車[でんしゃ]", "お見舞い[おみまい]", "振り返る[ふりかえる]", "相変わらず[あいかわらず]",
+]
+
+KANA = ["から", "が", "は", "を", "に", "で", "ました", "です", "。", "、", "ましょう"]
+
+TAGS = [("<b>", "</b>"), ("<i>", "</i>"), ('<span style="color: red">', "</span>")]
+
+
+def _sentence(rand, words):
+    """A sentence alternating words and kana, with a space before each reading as needed"""
+    parts = []
+    for _ in range(words):
+        word = rand.choice(WORDS)
+        if parts:
+            # Usually one space as required before a reading, sometimes extra spaces to clean
+            parts.append(" " * rand.choice([1, 1, 1, 2]))
+        parts.append(word)
+        parts.append(rand.choice(KANA))
+    return "".join(parts)
+
+
+def core_2000_field(rand):
+    """Reading field of an example sentence, some with stray spaces inside bold tags"""
+    sentence = _sentence(rand, rand.randint(2, 5))
+    if rand.random() < 0.3:
+        return "<b> {}</b>{}".format(rand.choice(WORDS), sentence)
+    return sentence
+
+
+def v2k_field(rand):
+    """Single vocabulary word with a reading that often has redundant furigana"""
+    return rand.choice(WORDS)
+
+
+def html_multiline_field(rand):
+    """Several sentences wrapped in tags and split over lines"""
+    lines = []
+    for _ in range(rand.randint(2, 6)):
+        start, end = rand.choice(TAGS)
+        lines.append("{}{}{}<br>".format(start, _sentence(rand, rand.randint(1, 4)), end))
+    return "<div>{}</div>".format("\n".join(lines))
+
+
+def long_line_field(rand):
+    """A single line with thousands of tokens and long runs of spaces and tags"""
+    parts = []
+    for _ in range(500):
+        start, end = rand.choice(TAGS)
+        parts.append("{} {}{}{}".format(start, _sentence(rand, 2), " " * rand.randint(1, 8), end))
+    return "".join(parts)
+
+
+# Shape name => (generator, number of fields)
+SHAPES = OrderedDict([
+    ("core2000", (core_2000_field, 2000)),
+    ("v2k", (v2k_field, 2000)),
+    ("html_multiline", (html_multiline_field, 1000)),
+    ("long_line", (long_line_field, 10)),
+])
+
+
+def generate_corpus(seed=0):
+    """Returns an OrderedDict of shape name => list of fields"""
+    corpus = OrderedDict()
+    for shape, (generator, count) in SHAPES.items():
+        rand = random.Random("{}:{}".format(seed, shape))
+        corpus[shape] = [generator(rand) for _ in range(count)]
+    return corpus
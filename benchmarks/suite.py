@@ -0,0 +1,149 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures the throughput of the text functions over a synthetic corpus of each deck shape.
+
+Run with: python -m benchmarks.suite [--save baseline.json] [--compare baseline.json]
+
+Reports fields/sec and bytes/sec for each function and shape.  --save writes the results as a JSON
+baseline.  --compare reports the change against a saved baseline and exits with a non-zero status
+when any throughput dropped by more than --threshold.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import timeit
+from collections import OrderedDict
+
+from japanese_text_cleaner.text.furigana import clean_redundant_furigana
+from japanese_text_cleaner.text.spacing import clean_spaces
+from japanese_text_cleaner.text.split import HTML, SPACES, TEXT, formatting_aware_split
+from japanese_text_cleaner.text.validation import (valiate_no_spaces_chunk, validate_all_spaces_chunk,
+                                                   validate_chunk_is_html_tag, validate_japanese_reading_formatting)
+
+from .corpus import generate_corpus
+
+_CHUNK_VALIDATORS = {
+    TEXT: valiate_no_spaces_chunk,
+    HTML: validate_chunk_is_html_tag,
+    SPACES: validate_all_spaces_chunk,
+}
+
+
+def _validate(content):
+    validate_japanese_reading_formatting(content)
+    for token in formatting_aware_split(content):
+        _CHUNK_VALIDATORS[token.type](token.text)
+
+
+# Benchmark name => function called on each field
+FUNCTIONS = OrderedDict([
+    ("formatting_aware_split", formatting_aware_split),
+    ("validators", _validate),
+    ("clean_spaces", clean_spaces),
+    ("clean_redundant_furigana", clean_redundant_furigana),
+])
+
+# Minimum time to spend on each measurement, so fast benchmarks are repeated enough to be stable
+MIN_SECONDS = 0.2
+
+
+def _time_fields(function, fields, repeat):
+    def run():
+        for field in fields:
+            function(field)
+
+    number = 1
+    while True:
+        elapsed = timeit.timeit(run, number=number)
+        if elapsed >= MIN_SECONDS:
+            break
+        number *= 2
+    return min([elapsed] + timeit.repeat(run, number=number, repeat=repeat - 1)) / number
+
+
+def run_suite(repeat=3, seed=0):
+    """Returns an OrderedDict of "function/shape" => {"fields_per_sec", "bytes_per_sec"}"""
+    corpus = generate_corpus(seed)
+    results = OrderedDict()
+    for name, function in FUNCTIONS.items():
+        for shape, fields in corpus.items():
+            elapsed = _time_fields(function, fields, repeat)
+            total_bytes = sum(len(field.encode("utf-8")) for field in fields)
+            results["{}/{}".format(name, shape)] = OrderedDict([
+                ("fields_per_sec", len(fields) / elapsed),
+                ("bytes_per_sec", total_bytes / elapsed),
+            ])
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns (key, baseline fields/sec, fields/sec, change, regressed) for each benchmark in both
+    results and baseline.  A benchmark regressed when its throughput dropped by more than threshold.
+    """
+    comparisons = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        before = baseline[key]["fields_per_sec"]
+        after = result["fields_per_sec"]
+        change = after / before - 1.0
+        comparisons.append((key, before, after, change, change < -threshold))
+    return comparisons
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the text cleaning functions")
+    parser.add_argument("--save", metavar="FILE", help="save the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="compare the results to a JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="fractional drop in throughput reported as a regression (default 0.2)")
+    parser.add_argument("--repeat", type=int, default=3, help="measurements to take the best of (default 3)")
+    args = parser.parse_args(argv)
+
+    results = run_suite(repeat=args.repeat)
+    for key, result in results.items():
+        print("{:<45} {:>12.0f} fields/sec {:>8.2f} MB/sec".format(
+            key, result["fields_per_sec"], result["bytes_per_sec"] / 1e6))
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as outf:
+            json.dump(OrderedDict([
+                ("python", platform.python_version()),
+                ("machine", platform.machine()),
+                ("results", results),
+            ]), outf, indent=2)
+        print("Saved baseline to {}".format(args.save))
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as inf:
+            baseline = json.load(inf)["results"]
+        regressions = 0
+        print("Compared to {}:".format(args.compare))
+        for key, before, after, change, regressed in compare(results, baseline, args.threshold):
+            print("{:<45} {:>12.0f} => {:>12.0f} fields/sec {:>+7.1%}{}".format(
+                key, before, after, change, "  REGRESSION" if regressed else ""))
+            regressions += regressed
+        if regressions:
+            print("{} benchmarks regressed by more than {:.0%}".format(regressions, args.threshold))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,7 +16,8 @@ import sys
 
 from .__version__ import __version__  # noqa: F401
 
-# Don't import dialog when testing since we don't have the anki
-# libraries available.
-if "pytest" not in sys.modules:
+# Only set up the menus and editor hooks when loaded as an add-on by Anki.  Tests and benchmarks
+# use the text processing modules without the anki libraries available.
+if "aqt" in sys.modules:
+    from . import clean_on_save  # noqa: F401
     from . import setup_menus  # noqa: F401
@@ -0,0 +1,71 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import traceback
+
+from anki.hooks import addHook
+from aqt import mw
+
+from .text.incremental import IncrementalCleaner
+from .text.pipeline import CLEANERS
+
+# Settings under "clean_on_save" in the add-on's config, read once and updated when the config is edited
+_config = {}
+
+# IncrementalCleaner for each cleaner by name, so that cleaned lines are cached across edits
+_cleaners = {}
+
+
+def load_config(config=None):
+    global _config
+    if config is None:
+        config = mw.addonManager.getConfig(__name__)
+    _config = (config or {}).get("clean_on_save", {})
+
+
+def incremental_cleaner(name):
+    cleaner = _cleaners.get(name)
+    if cleaner is None:
+        cleaner = _cleaners[name] = IncrementalCleaner(CLEANERS[name])
+    return cleaner
+
+
+def on_focus_lost(changed, note, field_index):
+    """
+    Cleans the field of the note in the editor when it loses focus, which includes when the note is saved, if
+    cleaning on save is enabled for the field.  Returns whether the note was changed so the editor reloads it.
+    """
+    if not _config.get("enabled"):
+        return changed
+    try:
+        model = note.model()
+        note_types = _config.get("note_types") or []
+        if note_types and model["name"] not in note_types:
+            return changed
+        if model["flds"][field_index]["name"] not in _config.get("fields", []):
+            return changed
+        content = note.fields[field_index]
+        cleaned = incremental_cleaner(_config.get("cleaner", "clean_all")).clean(content)
+        if cleaned != content:
+            note.fields[field_index] = cleaned
+            return True
+    except Exception:
+        # Editing must never be interrupted by a failure to clean
+        traceback.print_exc()
+    return changed
+
+
+load_config()
+mw.addonManager.setConfigUpdatedAction(__name__, load_config)
+addHook("editFocusLost", on_focus_lost)
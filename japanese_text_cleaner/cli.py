@@ -0,0 +1,259 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runs the cleaners over a collection file, or a notes file exported from Anki as plain text, without Anki
+or its GUI.  Anki must not have the collection open.
+
+Run with: python -m japanese_text_cleaner.cli {check,diff,fix} PATH --field NAME [--field NAME ...]
+
+check reports how many fields need to be updated.  diff also writes an HTML diff of the updates to --output.
+fix updates the fields.  For a collection, the notes are updated and the changes are recorded in the change
+log in bulk, a chunk of notes at a time.  For a notes file, the cleaned file is written to --output, and
+rows are numbered from 1 in place of note ids.  Fields of a notes file are named by the column names in its
+"#columns:" header line or by column numbers counting from 1.
+
+The fields of a collection found clean are recorded, and later runs skip them until their notes are modified.
+"""
+
+import argparse
+import itertools
+import os
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+
+from .db.change_log import ChangeLog, ChangeLogEntry
+from .db.clean_state import CleanState
+from .db.collection import CollectionModels, mark_collection_modified, update_sort_fields
+from .db.notes import NoteChange, NoteChangedError, NoteField, field_indices, note_ids, update_note_fields
+from .db.sqlite import DB
+from .diff_report import DiffReportWriter
+from .notes_file import column_indices, read_notes_file, write_notes_file
+from .progress import Progress
+from .scan import CHUNK_SIZE, Rescan, ScanSummary, clean_note_fields
+from .text.parallel import default_workers
+from .text.pipeline import ALL_CLEANERS, CLEANERS, CleanerPipeline
+
+# Default delimiter of notes files by extension.  Files with any other extension are opened as collections.
+NOTES_FILE_DELIMITERS = {".txt": "\t", ".tsv": "\t", ".csv": ","}
+
+
+def make_cleaner(names):
+    """Returns the cleaner with the name, or a pipeline running the named cleaners in order"""
+    cleaners = [CLEANERS[name] for name in names]
+    return cleaners[0] if len(cleaners) == 1 else CleanerPipeline(cleaners)
+
+
+def note_changes(chunk):
+    """Returns a NoteChange for each of the fields in the chunk of (NoteField, CleanOutcome) pairs that changed"""
+    return [NoteChange(nid=note_field.nid, field=note_field.field, old=note_field.content, new=result.cleaned)
+            for note_field, (result, error, _) in chunk if error is None and result.changed]
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Runner:
+    """Cleans the fields chunk by chunk, reporting progress and failures and writing the diff when asked"""
+
+    def __init__(self, cleaner, workers, report=None, log=sys.stderr):
+        self.cleaner = cleaner
+        self.workers = workers
+        self.report = report
+        self.log = log
+        self.summary = ScanSummary()
+
+    def clean(self, chunks, progress, label):
+        """
+        Cleans each list of NoteFields from chunks, yielding the (NoteField, CleanOutcome) pairs of each.
+        label names what the nid of a NoteField refers to in messages.
+        """
+        for chunk in clean_note_fields(chunks, self.cleaner, self.workers):
+            self.summary.add(chunk)
+            for note_field, (result, error, _) in chunk:
+                if error is not None:
+                    print("{} {} {} failed to be processed: {}".format(label, note_field.nid, note_field.field, error),
+                          file=self.log)
+                elif self.report is not None and result.changed:
+                    self.report.add(note_field.nid, note_field.field, result)
+            progress.update(len({note_field.nid for note_field, _ in chunk}))
+            print(progress, file=self.log)
+            yield chunk
+
+
+def run_collection(args, runner):
+    """Cleans the fields of all the notes in the collection having them, updating the notes in fix mode"""
+    db = DB(args.path)
+    changelog = None
+    clean_state = CleanState(args.clean_state)
+    try:
+        models = CollectionModels(db)
+        indices = field_indices(models, args.field)
+        if not indices:
+            raise ValueError("No note type has any of the fields {}".format(", ".join(args.field)))
+        nids = note_ids(db, list(indices))
+        progress = Progress(len(nids))
+        skipped = []
+
+        def chunks():
+            # Fields found clean since their notes were last modified are skipped, unless rechecking
+            for start in range(0, len(nids), args.chunk_size):
+                rescan = Rescan(db, None, nids[start:start + args.chunk_size], indices, runner.cleaner,
+                                None if args.recheck else clean_state)
+                skipped.append(rescan.skipped)
+                progress.update(rescan.skipped_notes)
+                yield rescan.pending
+
+        init_ts = int(time.time() * 1000)
+        if args.mode == "fix":
+            changelog = ChangeLog(args.changelog)
+        updated_nids = set()
+        sort_field_nids = set()
+        for chunk in runner.clean(chunks(), progress, "nid"):
+            clean_state.record_clean(runner.cleaner, chunk)
+            changes = note_changes(chunk) if changelog is not None else []
+            if not changes:
+                continue
+            update_note_fields(db, changes, indices, mod=init_ts // 1000, usn=-1)
+            # Anki only updates its caches of the sort field and first field checksum when it saves a note, so
+            # they're updated here for the notes where either field changed
+            chunk_sort_field_nids = []
+            for note_field, (result, error, _) in chunk:
+                if error is None and result.changed:
+                    index = dict(indices[note_field.mid])[note_field.field]
+                    if index in (0, models.sort_index(note_field.mid)):
+                        chunk_sort_field_nids.append(note_field.nid)
+            chunk_sort_field_nids = list(OrderedDict.fromkeys(chunk_sort_field_nids))
+            update_sort_fields(db, models, chunk_sort_field_nids)
+            mark_collection_modified(db, init_ts)
+            # The changes are logged before the notes are committed, so no committed change is missing from the log
+            changelog.record_and_commit_changes(runner.cleaner.name, init_ts, [
+                ChangeLogEntry(ts=init_ts, nid=change.nid, fld=change.field, old=change.old, new=change.new)
+                for change in changes])
+            db.commit()
+            updated_nids.update(change.nid for change in changes)
+            sort_field_nids.update(chunk_sort_field_nids)
+
+        if sum(skipped):
+            print("Skipped {} fields found clean since their notes were last modified".format(sum(skipped)))
+        if changelog is not None:
+            print("Updated {} fields of {} notes".format(runner.summary.need_clean, len(updated_nids)))
+            if sort_field_nids:
+                print("Updated the sort field and duplicate checksum of {} notes".format(len(sort_field_nids)))
+    finally:
+        if changelog is not None:
+            changelog.close()
+        clean_state.close()
+        db.close()
+
+
+def run_notes_file(args, runner):
+    """Cleans the fields of all the rows of the notes file, writing the cleaned file in fix mode"""
+    default_delimiter = NOTES_FILE_DELIMITERS[os.path.splitext(args.path)[1].lower()]
+    with open(args.path, encoding="utf-8", newline="") as inf:
+        header, rows = read_notes_file(inf, default_delimiter)
+        fields = list(zip(args.field, column_indices(header, args.field)))
+
+        def row_fields(row_chunk):
+            return [NoteField(nid=row_number, mid=None, field=name, content=row[index], mod=None)
+                    for row_number, row in row_chunk for name, index in fields if index < len(row)]
+
+        # The rows are read a chunk at a time, with the same chunk of rows cleaned and then written out
+        row_chunks, cleaned_row_chunks = itertools.tee(_chunked(enumerate(rows, 1), args.chunk_size))
+        chunks = runner.clean((row_fields(row_chunk) for row_chunk in cleaned_row_chunks), Progress(None, "rows"),
+                              "row")
+        if args.mode != "fix":
+            for _ in chunks:
+                pass
+            return
+
+        with open(args.output, "w", encoding="utf-8", newline="") as outf:
+            writer = write_notes_file(outf, header)
+            for row_chunk, chunk in zip(row_chunks, chunks):
+                cleaned = {(change.nid, change.field): change.new for change in note_changes(chunk)}
+                for row_number, row in row_chunk:
+                    for name, index in fields:
+                        if (row_number, name) in cleaned:
+                            row[index] = cleaned[(row_number, name)]
+                    writer.writerow(row)
+        print("Updated {} fields.  Saved to {}".format(runner.summary.need_clean, args.output))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Clean Japanese text in the notes of a collection or notes file")
+    parser.add_argument("mode", choices=["check", "diff", "fix"],
+                        help="check the fields, write an HTML diff of the updates, or update the fields")
+    parser.add_argument("path", help="collection file, such as collection.anki2, or notes file (.txt, .tsv, .csv)")
+    parser.add_argument("--field", action="append", required=True,
+                        help="field to clean, for every note type having it.  Can be given more than once.")
+    parser.add_argument("--cleaner", action="append", choices=list(CLEANERS),
+                        help="cleaner to run.  Can be given more than once to run several in order.  "
+                             "(default {})".format(ALL_CLEANERS.name))
+    parser.add_argument("--output", help="file to write the HTML diff to in diff mode, or the cleaned notes file "
+                                         "to in fix mode")
+    parser.add_argument("--changelog", help="change log database to record the changes to a collection in "
+                                            "(default the add-on's change log)")
+    parser.add_argument("--clean-state", help="database of the fields found clean, which are skipped until their "
+                                              "notes are modified (default the add-on's)")
+    parser.add_argument("--recheck", action="store_true",
+                        help="check every note, including those found clean since they were last modified")
+    parser.add_argument("--workers", type=int, default=default_workers(),
+                        help="processes to clean the notes with (default {})".format(default_workers()))
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE * 10,
+                        help="notes read and cleaned at a time (default {})".format(CHUNK_SIZE * 10))
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.path):
+        parser.error("{} does not exist".format(args.path))
+    is_notes_file = os.path.splitext(args.path)[1].lower() in NOTES_FILE_DELIMITERS
+    if args.output is None and (args.mode == "diff" or (args.mode == "fix" and is_notes_file)):
+        parser.error("--output is required to {} a notes file".format(args.mode) if args.mode == "fix"
+                     else "--output is required for diff")
+    if args.output is not None and os.path.abspath(args.output) == os.path.abspath(args.path):
+        parser.error("--output must not be the file being cleaned")
+    if args.workers < 1 or args.chunk_size < 1:
+        parser.error("--workers and --chunk-size must be at least 1")
+    return args, is_notes_file
+
+
+def main(argv=None):
+    args, is_notes_file = parse_args(argv)
+    report = DiffReportWriter(args.output) if args.mode == "diff" else None
+    runner = Runner(make_cleaner(args.cleaner or [ALL_CLEANERS.name]), args.workers, report)
+    try:
+        if is_notes_file:
+            run_notes_file(args, runner)
+        else:
+            run_collection(args, runner)
+    except (ValueError, NoteChangedError, sqlite3.Error) as e:
+        print("Failed: {}".format(e), file=sys.stderr)
+        return 2
+    finally:
+        if report is not None:
+            report.close()
+    print(runner.summary)
+    if report is not None:
+        print("Saved diff of {} fields in {} pages to {}".format(report.count, len(report.page_counts), args.output))
+    return 1 if runner.summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -13,61 +13,202 @@
 # limitations under the License.
 
 import os
+import queue
+import threading
+import time
 from collections import namedtuple
 
-from anki.db import DB
+from .compact import decode_blob, decode_change, encode_blob, encode_change, value_hash
+from .sqlite import DB
 
 ChangeLogEntry = namedtuple("ChangeLogEntry", ["ts", "nid", "fld", "old", "new"])
 
+# Selects the changes to a note, to a field, made by an op, in a batch identified by its init_ts, or made
+# within the time range [start_ts, end_ts).  Only the fields that are not None are used.
+ChangeLogQuery = namedtuple("ChangeLogQuery", ["nid", "fld", "op", "init_ts", "start_ts", "end_ts"])
+ChangeLogQuery.__new__.__defaults__ = (None,) * len(ChangeLogQuery._fields)
+
+# Changes in a page of the change log
+PAGE_SIZE = 500
+
+# Changes read from the database at a time when iterating over them
+READ_BATCH = 1000
+
+# Entries buffered by the writer before they are committed
+MAX_BATCH = 5000
+
+# Seconds the writer waits for more entries before committing those it has
+MAX_DELAY = 0.5
+
+# Seconds a connection waits for another connection writing to the change log, such as from another dialog
+BUSY_TIMEOUT = 30
+
+# Version of the schema stored in the database's user_version.  Version 0 stored the old and new values of
+# each change in full and version 1 only had the index on ts.
+SCHEMA_VERSION = 2
+
+# Changes copied at a time when migrating
+MIGRATE_BATCH = 1000
+
 
 class ChangeLog:
-    """Tracks changes made to notes"""
-    def __init__(self):
-        base_path = os.path.dirname(os.path.abspath(__file__))
-        db_path = os.path.join(base_path, "..", "user_files", "changelog.db")
-        need_create = not os.path.exists(db_path)
-        self.db = DB(db_path)
+    """
+    Tracks changes made to notes.  Changes are written by a ChangeLogWriter on a background thread, so
+    recording them doesn't wait on the database.  The database uses WAL mode so that it can be read while
+    being written, and ids are assigned by the database so that several change logs can write to it at once.
+
+    The old and new values are stored compactly, as described in compact.py, and decoded when read.  A
+    database with the full values in the changelog table is migrated when opened.
+    """
+    def __init__(self, db_path=None):
+        if db_path is None:
+            base_path = os.path.dirname(os.path.abspath(__file__))
+            db_path = os.path.join(base_path, "..", "user_files", "changelog.db")
+        self.db_path = db_path
+        self.db = DB(db_path, timeout=BUSY_TIMEOUT)
         self.db.setAutocommit(True)
-        if need_create:
-            self._create_tables()
-            self._create_indices()
+        self.db.execute("pragma journal_mode = wal")
+        if self.db.scalar("pragma user_version") != SCHEMA_VERSION:
+            self._upgrade()
         self.db.setAutocommit(False)
-        max_id = self.db.scalar("select max(id) from changelog")
-        if max_id is not None:
-            self.next_id = max_id + 1
-        else:
-            self.next_id = 0
+        self._writer = None
 
     def close(self):
-        self.db.close()
+        """Commits the queued changes and closes the database, raising the writer's error once if it failed"""
+        writer = self._writer
+        self._writer = None
+        try:
+            if writer is not None:
+                writer.close()
+        finally:
+            self.db.close()
+
+    def write_error(self):
+        """Returns the error the writer failed with, after which no more changes are written, or None"""
+        return self._writer.error if self._writer is not None else None
 
     def commit_changes(self):
-        self.db.commit()
-        self.db.mod = False
+        """Waits until all the changes recorded so far are committed"""
+        if self._writer is not None:
+            self._writer.flush()
 
     def record_change(self, op, init_ts, change):
-        self.db.execute(
-            """
-            insert into changelog (id, op, init_ts, ts, nid, fld, old, new)
-            values (?,?,?,?,?,?,?,?)
-            """, self.next_id, op, init_ts, change.ts, change.nid, change.fld,
-            change.old, change.new)
-        self.next_id += 1
+        self.record_changes(op, init_ts, [change])
+
+    def record_changes(self, op, init_ts, changes):
+        """Queues the changes to be written, returning without waiting for them to be committed"""
+        if self._writer is None:
+            self._writer = ChangeLogWriter(self.db_path)
+        self._writer.write([(None, op, init_ts, change.ts, change.nid, change.fld, change.old, change.new)
+                            for change in changes])
 
     def record_and_commit_changes(self, op, init_ts, changes):
-        data = []
-        for change in changes:
-            data.append((self.next_id, op, init_ts, change.ts, change.nid, change.fld,
-                         change.old, change.new))
-            self.next_id += 1
-        self.db.executemany("""
-            insert into changelog (id, op, init_ts, ts, nid, fld, old, new)
-            values (?,?,?,?,?,?,?,?)
-        """, data)
+        self.record_changes(op, init_ts, changes)
         self.commit_changes()
 
+    def count(self, query=None):
+        """Returns the number of changes recorded, or of those selected by the ChangeLogQuery"""
+        where, args = _where(query)
+        return self.db.scalar("select count(*) from changelog c {}".format(where), *args)
+
+    def page(self, query=None, before=None, after=None, limit=PAGE_SIZE, preview_chars=None):
+        """
+        Returns (id, op, init_ts, ts, nid, fld, old, new) for a page of the changes selected by the
+        ChangeLogQuery, most recent first.  Pages are read using keyset pagination, so reading a page takes
+        the same time however many changes come before it.  The page is the newest changes older than the
+        row key before, the oldest changes newer than the row key after, or else the newest changes.  When
+        preview_chars is given, only the first preview_chars + 1 characters of old and new are returned, so
+        a page stays small however large the fields are.  Use get_values to read the full values.
+        """
+        where, args = _where(query, before=before, after=after)
+        rows = []
+        for change_id, op, init_ts, ts, nid, fld, data, base_is_old, delta in self.db.all("""
+                select c.id, c.op, c.init_ts, c.ts, c.nid, c.fld, b.data, c.base_is_old, c.delta
+                from changelog c join blobs b on b.hash = c.base
+                {}
+                order by c.ts {order}, c.id {order}
+                limit ?
+                """.format(where, order="asc" if after is not None else "desc"), *args, limit):
+            old, new = _decode(data, base_is_old, delta)
+            if preview_chars is not None:
+                old, new = old[:preview_chars + 1], new[:preview_chars + 1]
+            rows.append((change_id, op, init_ts, ts, nid, fld, old, new))
+        if after is not None:
+            rows.reverse()
+        return rows
+
+    def get_values(self, change_id):
+        """Returns (old, new) for the change"""
+        row = self.db.first("""
+            select b.data, c.base_is_old, c.delta
+            from changelog c join blobs b on b.hash = c.base
+            where c.id = ?
+        """, change_id)
+        return _decode(*row) if row is not None else None
+
+    def iter_changes(self, query=None, batch_size=READ_BATCH):
+        """
+        Yields (op, ts, nid, fld, old, new) for each of the changes selected by the ChangeLogQuery in the
+        order they were made.  The changes are read from the cursor batch_size at a time and are in the
+        order of the indices, so memory use doesn't grow with the number of changes.
+        """
+        where, args = _where(query)
+        cursor = self.db.execute("""
+            select c.op, c.ts, c.nid, c.fld, b.data, c.base_is_old, c.delta
+            from changelog c join blobs b on b.hash = c.base
+            {}
+            order by c.ts, c.id
+        """.format(where), *args)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for op, ts, nid, fld, data, base_is_old, delta in rows:
+                    yield (op, ts, nid, fld) + _decode(data, base_is_old, delta)
+        finally:
+            cursor.close()
+
+    def _upgrade(self):
+        # Another change log may be upgrading the database at the same time, so the version is checked again
+        # once holding the write lock
+        self.db.execute("begin immediate")
+        try:
+            columns = [row[1] for row in self.db.all("pragma table_info(changelog)")]
+            if self.db.scalar("pragma user_version") != SCHEMA_VERSION:
+                if "old" in columns:
+                    self.db.execute("alter table changelog rename to changelog_v0")
+                    self.db.execute("drop index if exists ix_changelog_ts")
+                self._create_tables()
+                self._create_indices()
+                if "old" in columns:
+                    self._migrate_v0()
+                self.db.execute("pragma user_version = {}".format(SCHEMA_VERSION))
+            self.db.execute("commit")
+        except Exception:
+            self.db.execute("rollback")
+            raise
+        if "old" in columns:
+            # Reclaims the space of the full values
+            self.db.execute("vacuum")
+
+    def _migrate_v0(self):
+        last_id = -1
+        while True:
+            rows = self.db.all("""
+                select id, op, init_ts, ts, nid, fld, old, new from changelog_v0
+                where id > ?
+                order by id
+                limit ?
+            """, last_id, MIGRATE_BATCH)
+            if not rows:
+                break
+            insert_changes(self.db, rows)
+            last_id = rows[-1][0]
+        self.db.execute("drop table changelog_v0")
+
     def _create_tables(self):
-        self.db.executescript("""
+        self.db.execute("""
             create table if not exists changelog (
               id      integer primary key,
               -- identifies the operation performed
@@ -80,14 +221,170 @@ class ChangeLog:
               nid     integer not null,
               -- field name
               fld     text not null,
-              -- old value of field
-              old     text not null,
-              -- new value of field
-              new     text not null
-            );
+              -- hash of the blob storing the longer of the old and new values of the field
+              base    blob not null,
+              -- 1 when the blob stores the old value and 0 when it stores the new value
+              base_is_old integer not null,
+              -- edits that turn the blob's value into the other value
+              delta   blob not null
+            )
+        """)
+        self.db.execute("""
+            create table if not exists blobs (
+              -- sha1 of the value
+              hash    blob primary key,
+              -- value, compressed when that makes it smaller
+              data    blob not null
+            ) without rowid
         """)
 
     def _create_indices(self):
-        self.db.executescript("""
-            create index if not exists ix_changelog_ts on changelog (ts);
-        """)
+        # Each index ends with ts, followed implicitly by id, so that pages selected by any of them are
+        # read in order from the index
+        self.db.execute("create index if not exists ix_changelog_ts on changelog (ts)")
+        self.db.execute("create index if not exists ix_changelog_nid_ts on changelog (nid, ts)")
+        self.db.execute("create index if not exists ix_changelog_init_ts on changelog (init_ts, ts)")
+        self.db.execute("create index if not exists ix_changelog_op_ts on changelog (op, ts)")
+
+
+def row_key(row):
+    """Key of a row returned by ChangeLog.page, used to read the pages before or after it"""
+    return row[3], row[0]
+
+
+def _where(query, before=None, after=None):
+    """Returns the where clause of the changes selected by the ChangeLogQuery and the page keys, and its args"""
+    clauses = []
+    args = []
+    if query is not None:
+        for column, value in (("nid", query.nid), ("fld", query.fld), ("op", query.op),
+                              ("init_ts", query.init_ts)):
+            if value is not None:
+                clauses.append("c.{} = ?".format(column))
+                args.append(value)
+        if query.start_ts is not None:
+            clauses.append("c.ts >= ?")
+            args.append(query.start_ts)
+        if query.end_ts is not None:
+            clauses.append("c.ts < ?")
+            args.append(query.end_ts)
+    # The range on ts alone lets SQLite seek within the index to the start of the page
+    if before is not None:
+        ts, change_id = before
+        clauses.append("c.ts <= ? and (c.ts < ? or c.id < ?)")
+        args.extend([ts, ts, change_id])
+    if after is not None:
+        ts, change_id = after
+        clauses.append("c.ts >= ? and (c.ts > ? or c.id > ?)")
+        args.extend([ts, ts, change_id])
+    if not clauses:
+        return "", args
+    return "where " + " and ".join(clauses), args
+
+
+def _decode(data, base_is_old, delta):
+    return decode_change(decode_blob(data), base_is_old, delta)
+
+
+def insert_changes(db, rows):
+    """
+    Inserts (id, op, init_ts, ts, nid, fld, old, new) rows into the change log, storing the values compactly.
+    The database assigns the id of rows where it is None.
+    """
+    blobs = {}
+    changes = []
+    for change_id, op, init_ts, ts, nid, fld, old, new in rows:
+        base, base_is_old, delta = encode_change(old, new)
+        key = value_hash(base)
+        if key not in blobs:
+            blobs[key] = encode_blob(base)
+        changes.append((change_id, op, init_ts, ts, nid, fld, key, int(base_is_old), delta))
+    db.executemany("insert or ignore into blobs (hash, data) values (?,?)", list(blobs.items()))
+    db.executemany("""
+        insert into changelog (id, op, init_ts, ts, nid, fld, base, base_is_old, delta)
+        values (?,?,?,?,?,?,?,?,?)
+    """, changes)
+
+
+class ChangeLogWriter:
+    """
+    Writes rows to the change log on a background thread with its own connection.  Rows are buffered and
+    committed together once max_batch rows are waiting, max_delay seconds have passed since the first of
+    them, or flush is called.  Once writing fails, nothing more is written and the first error is raised by
+    every later call to write, flush or close.
+    """
+
+    def __init__(self, db_path, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.error = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, args=(db_path,), name="ChangeLogWriter", daemon=True)
+        self._thread.start()
+
+    def write(self, rows):
+        """Queues (id, op, init_ts, ts, nid, fld, old, new) rows to be written, as for insert_changes"""
+        self._raise_error()
+        if rows:
+            self._queue.put(rows)
+
+    def flush(self):
+        """Waits until all the rows queued so far are committed"""
+        flushed = threading.Event()
+        self._queue.put(flushed)
+        flushed.wait()
+        self._raise_error()
+
+    def close(self):
+        """Commits the queued rows and stops the thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def _run(self, db_path):
+        db = None
+        rows = []
+        deadline = None
+        try:
+            db = DB(db_path, timeout=BUSY_TIMEOUT)
+            # Commits in WAL mode are durable once the database is checkpointed rather than synced each time
+            db.execute("pragma synchronous = normal")
+        except Exception as e:
+            self.error = e
+        while True:
+            try:
+                item = self._queue.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = ()
+            if isinstance(item, list):
+                if self.error is not None:
+                    # Nothing is written once writing fails, so the rows are dropped and the first error kept
+                    continue
+                if not rows:
+                    deadline = time.monotonic() + self.max_delay
+                rows.extend(item)
+                if len(rows) < self.max_batch:
+                    continue
+            if rows:
+                try:
+                    insert_changes(db, rows)
+                    db.commit()
+                except Exception as e:
+                    self.error = e
+                    try:
+                        db.rollback()
+                    except Exception:
+                        pass
+                rows = []
+                deadline = None
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is None:
+                break
+        if db is not None:
+            db.close()
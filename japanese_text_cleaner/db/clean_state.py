@@ -0,0 +1,85 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+
+from .notes import CHUNK_SIZE
+from .sqlite import DB
+
+
+class CleanState:
+    """
+    Tracks which fields of notes were found clean, so later scans can skip them until the notes are modified.
+    Each field is recorded with the name and version of the cleaner that found it clean and the note's mod
+    time when it was checked.  Kept in a database next to the change log.
+    """
+
+    def __init__(self, db_path=None):
+        if db_path is None:
+            base_path = os.path.dirname(os.path.abspath(__file__))
+            db_path = os.path.join(base_path, "..", "user_files", "clean_state.db")
+        self.db = DB(db_path)
+        self.db.setAutocommit(True)
+        self._create_tables()
+        self.db.setAutocommit(False)
+
+    def close(self):
+        self.db.close()
+
+    def clean_mods(self, cleaner, nids, chunk_size=CHUNK_SIZE):
+        """
+        Returns (nid, field name) => mod time of the note when the field was found clean by this version of
+        the cleaner, for the fields of the notes that were.
+        """
+        mods = {}
+        version = str(cleaner.version)
+        for start in range(0, len(nids), chunk_size):
+            chunk = nids[start:start + chunk_size]
+            for nid, fld, mod in self.db.all(
+                    "select nid, fld, mod from clean_fields where cleaner = ? and version = ? and nid in ({})".format(
+                        ",".join("?" * len(chunk))), cleaner.name, version, *chunk):
+                mods[(nid, fld)] = mod
+        return mods
+
+    def record_clean(self, cleaner, scanned):
+        """Records the fields that the cleaner left unchanged, given (NoteField, CleanOutcome) pairs"""
+        version = str(cleaner.version)
+        self.db.executemany("""
+            insert or replace into clean_fields (nid, fld, cleaner, version, mod)
+            values (?,?,?,?,?)
+        """, [(note_field.nid, note_field.field, cleaner.name, version, note_field.mod)
+              for note_field, (result, error, _) in scanned if error is None and not result.changed])
+        self.db.commit()
+
+    def clear(self):
+        """Forgets all the fields found clean, so that the next scans check every note again"""
+        self.db.execute("delete from clean_fields")
+        self.db.commit()
+
+    def _create_tables(self):
+        self.db.executescript("""
+            create table if not exists clean_fields (
+              -- note id
+              nid     integer not null,
+              -- field name
+              fld     text not null,
+              -- name of the cleaner that found the field clean
+              cleaner text not null,
+              -- version of the cleaner that found the field clean
+              version text not null,
+              -- mod time of the note when the field was found clean
+              mod     integer not null,
+              primary key (nid, fld, cleaner)
+            ) without rowid;
+        """)
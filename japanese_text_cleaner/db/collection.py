@@ -0,0 +1,142 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import html
+import json
+import re
+from collections import OrderedDict
+
+from .notes import CHUNK_SIZE, FIELD_SEPARATOR
+
+# Patterns Anki uses to strip html from fields for the caches of the sort field and first field checksum
+_COMMENT_RE = re.compile(r"(?s)<!--.*?-->")
+_STYLE_RE = re.compile(r"(?si)<style.*?>.*?</style>")
+_SCRIPT_RE = re.compile(r"(?si)<script.*?>.*?</script>")
+_TAG_RE = re.compile(r"(?s)<.*?>")
+_IMG_RE = re.compile(r"(?i)<img[^>]+src=[\"']?([^\"'>]+)[\"']?[^>]*>")
+
+
+class CollectionModels:
+    """
+    Note types read straight from a collection's database, with the methods of the collection's
+    ModelManager that field_indices uses.  Reads the models column of the col table written by older
+    versions of Anki, or the notetypes and fields tables written by newer ones.
+    """
+
+    def __init__(self, db):
+        if db.scalar("select count(*) from sqlite_master where type = 'table' and name = 'fields'"):
+            names = dict(db.all("select id, name from notetypes"))
+            sort_indices = {}
+            if "config" in [row[1] for row in db.all("pragma table_info(notetypes)")]:
+                sort_indices = {ntid: _sort_field_index(config)
+                                for ntid, config in db.all("select id, config from notetypes")}
+            models = OrderedDict()
+            for ntid, index, name in db.all("select ntid, ord, name from fields order by ntid, ord"):
+                model = models.setdefault(ntid, {"id": ntid, "name": names.get(ntid, ""), "flds": [],
+                                                 "sortf": sort_indices.get(ntid, 0)})
+                model["flds"].append({"name": name, "ord": index})
+            self.models = list(models.values())
+        else:
+            self.models = list(json.loads(db.scalar("select models from col")).values())
+
+    def all(self):
+        return self.models
+
+    def get(self, mid):
+        for model in self.models:
+            if model["id"] == mid:
+                return model
+        return None
+
+    def fieldMap(self, model):
+        return {f["name"]: (f["ord"], f) for f in model["flds"]}
+
+    def sort_index(self, mid):
+        """Index of the field Anki sorts the note type by, which is the first field unless known otherwise"""
+        model = self.get(mid)
+        return model.get("sortf", 0) if model is not None else 0
+
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, pos
+
+
+def _sort_field_index(config):
+    """
+    Reads sort_field_idx, field 2 of the protobuf NotetypeConfig stored in the notetypes table, which is
+    left out when it is the default of 0
+    """
+    data = bytes(config or b"")
+    pos = 0
+    while pos < len(data):
+        key, pos = _read_varint(data, pos)
+        field_number, wire_type = key >> 3, key & 7
+        if wire_type == 0:
+            value, pos = _read_varint(data, pos)
+            if field_number == 2:
+                return value
+        elif wire_type == 1:
+            pos += 8
+        elif wire_type == 2:
+            length, pos = _read_varint(data, pos)
+            pos += length
+        elif wire_type == 5:
+            pos += 4
+        else:
+            raise ValueError("Unexpected protobuf wire type {} in note type config".format(wire_type))
+    return 0
+
+
+def strip_html_media(text):
+    """Strips the html from a field like Anki does for its caches, keeping the file names of images"""
+    text = _IMG_RE.sub(" \\1 ", text)
+    for regex in (_COMMENT_RE, _STYLE_RE, _SCRIPT_RE, _TAG_RE):
+        text = regex.sub("", text)
+    return html.unescape(text.replace("&nbsp;", " "))
+
+
+def field_checksum(text):
+    """Checksum of the first field that Anki uses to find duplicates"""
+    return int(hashlib.sha1(strip_html_media(text).encode("utf-8")).hexdigest()[:8], 16)
+
+
+def update_sort_fields(db, models, nids, chunk_size=CHUNK_SIZE):
+    """
+    Updates Anki's caches of the sort field and first field checksum of the notes from their fields, as
+    Anki does when a note is saved, so that the notes sort and are checked for duplicates correctly
+    """
+    updates = []
+    for start in range(0, len(nids), chunk_size):
+        chunk = nids[start:start + chunk_size]
+        for nid, mid, flds in db.all(
+                "select id, mid, flds from notes where id in ({})".format(",".join("?" * len(chunk))),
+                *chunk):
+            fields = flds.split(FIELD_SEPARATOR)
+            sort_index = min(models.sort_index(mid), len(fields) - 1)
+            updates.append((strip_html_media(fields[sort_index]), field_checksum(fields[0]), nid))
+    db.executemany("update notes set sfld = ?, csum = ? where id = ?", updates)
+
+
+def mark_collection_modified(db, mod):
+    """Stamps the collection with the modification time in ms, so that the changes are synced"""
+    db.execute("update col set mod = ?", mod)
@@ -0,0 +1,138 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compact encoding of the old and new values of changes.  The longer value is stored as a content-addressed
+blob, so identical values are only stored once, and the shorter value as a delta against it.  Blobs and
+deltas are compressed when that makes them smaller.
+"""
+
+import difflib
+import hashlib
+import json
+import zlib
+
+# Values of at least this many bytes are compressed
+COMPRESS_MIN_BYTES = 128
+
+_RAW = b"r"
+_ZLIB = b"z"
+
+
+def encode_bytes(data):
+    """Returns the data tagged with how it is stored, compressed when at least COMPRESS_MIN_BYTES and smaller"""
+    if len(data) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data)
+        if len(compressed) < len(data):
+            return _ZLIB + compressed
+    return _RAW + data
+
+
+def decode_bytes(encoded):
+    encoded = bytes(encoded)
+    if encoded[:1] == _ZLIB:
+        return zlib.decompress(encoded[1:])
+    return encoded[1:]
+
+
+def value_hash(text):
+    """Key of the blob storing the text"""
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+def _common_length(base, other, limit, at_end):
+    # Binary search comparing slices, which is much faster than comparing character by character in Python
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if (base[len(base) - mid:] == other[len(other) - mid:]) if at_end else (base[:mid] == other[:mid]):
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _trim(base, other):
+    """Returns the lengths of the common prefix and suffix of base and other, which do not overlap"""
+    limit = min(len(base), len(other))
+    prefix = _common_length(base, other, limit, at_end=False)
+    suffix = _common_length(base, other, limit - prefix, at_end=True)
+    return prefix, suffix
+
+
+def _edit(offset, base, other):
+    prefix, suffix = _trim(base, other)
+    return [offset + prefix, len(base) - prefix - suffix, other[prefix:len(other) - suffix]]
+
+
+def make_delta(base, other):
+    """
+    Returns the [offset, length, inserted] edits that turn base into other.  Lines are matched first and
+    each changed line then becomes a single edit spanning its first to last differing character, which
+    keeps making a delta fast while the small edits made by the cleaners still give small deltas.
+    """
+    prefix, suffix = _trim(base, other)
+    base_lines = base[prefix:len(base) - suffix].splitlines(True)
+    other_lines = other[prefix:len(other) - suffix].splitlines(True)
+    delta = []
+    base_offsets = [prefix]
+    for line in base_lines:
+        base_offsets.append(base_offsets[-1] + len(line))
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, base_lines, other_lines,
+                                                       autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        if i2 - i1 == j2 - j1:
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                if base_lines[i] != other_lines[j]:
+                    delta.append(_edit(base_offsets[i], base_lines[i], other_lines[j]))
+        else:
+            delta.append(_edit(base_offsets[i1], "".join(base_lines[i1:i2]), "".join(other_lines[j1:j2])))
+    return delta
+
+
+def apply_delta(base, delta):
+    result = []
+    pos = 0
+    for offset, length, inserted in delta:
+        result.append(base[pos:offset])
+        result.append(inserted)
+        pos = offset + length
+    result.append(base[pos:])
+    return "".join(result)
+
+
+def encode_change(old, new):
+    """
+    Returns (base, base_is_old, encoded delta) for the change, where base is the longer of the values and the
+    delta turns it into the other.
+    """
+    base_is_old = len(old) >= len(new)
+    base, other = (old, new) if base_is_old else (new, old)
+    delta = json.dumps(make_delta(base, other), ensure_ascii=False, separators=(",", ":"))
+    return base, base_is_old, encode_bytes(delta.encode("utf-8"))
+
+
+def decode_change(base, base_is_old, encoded_delta):
+    """Returns (old, new) for the change"""
+    other = apply_delta(base, json.loads(decode_bytes(encoded_delta).decode("utf-8")))
+    return (base, other) if base_is_old else (other, base)
+
+
+def encode_blob(text):
+    return encode_bytes(text.encode("utf-8"))
+
+
+def decode_blob(encoded):
+    return decode_bytes(encoded).decode("utf-8")
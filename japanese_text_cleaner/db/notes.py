@@ -0,0 +1,140 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import namedtuple
+
+# Content of a single field of a note, along with the note's type and modification time
+NoteField = namedtuple("NoteField", ["nid", "mid", "field", "content", "mod"])
+
+# Change of a single field of a note from the old content to the new content
+NoteChange = namedtuple("NoteChange", ["nid", "field", "old", "new"])
+
+# Separates the fields within the flds column of the notes table
+FIELD_SEPARATOR = "\x1f"
+
+# Number of note ids in each query, well under SQLite's limit of 999 host parameters
+CHUNK_SIZE = 500
+
+
+def field_indices(models, field_names):
+    """
+    Returns mid => ((field name, index), ...) of the named fields for each note type having any of them,
+    with the fields in the order given.
+    """
+    indices = {}
+    for model in models.all():
+        field_map = models.fieldMap(model)
+        fields = tuple((name, field_map[name][0]) for name in field_names if name in field_map)
+        if fields:
+            indices[model["id"]] = fields
+    return indices
+
+
+def note_type_ids(db, nids, chunk_size=CHUNK_SIZE):
+    """Returns the distinct mids of the notes, in the order they are first seen"""
+    mids = []
+    seen = set()
+    for start in range(0, len(nids), chunk_size):
+        chunk = nids[start:start + chunk_size]
+        for mid in db.list("select distinct mid from notes where id in ({})".format(",".join("?" * len(chunk))),
+                           *chunk):
+            if mid not in seen:
+                seen.add(mid)
+                mids.append(mid)
+    return mids
+
+
+def fetch_note_fields(db, nids, indices, chunk_size=CHUNK_SIZE):
+    """
+    Reads the fields from each of the notes in bulk, reading each note once.  indices maps
+    mid => ((field name, index), ...) of the fields for each note type having them, as returned by
+    field_indices.  Returns a NoteField for each field of each of the notes, ordered by note in the same
+    order as nids and then by field in the order of indices.  Notes of other types, and nids with no note,
+    are skipped.
+    """
+    rows = {}
+    for start in range(0, len(nids), chunk_size):
+        chunk = nids[start:start + chunk_size]
+        for nid, mid, flds, mod in db.all(
+                "select id, mid, flds, mod from notes where id in ({})".format(",".join("?" * len(chunk))),
+                *chunk):
+            fields = indices.get(mid)
+            if fields is not None:
+                values = flds.split(FIELD_SEPARATOR)
+                rows[nid] = [NoteField(nid=nid, mid=mid, field=name, content=values[index], mod=mod)
+                             for name, index in fields]
+    return [note_field for nid in nids if nid in rows for note_field in rows[nid]]
+
+
+def fetch_note_mods(db, nids, indices, chunk_size=CHUNK_SIZE):
+    """
+    Returns nid => (mid, mod time) for each of the notes having the fields, without reading the fields.
+    indices maps mid => fields, as returned by field_indices.
+    """
+    mods = {}
+    for start in range(0, len(nids), chunk_size):
+        chunk = nids[start:start + chunk_size]
+        for nid, mid, mod in db.all(
+                "select id, mid, mod from notes where id in ({})".format(",".join("?" * len(chunk))),
+                *chunk):
+            if mid in indices:
+                mods[nid] = (mid, mod)
+    return mods
+
+
+class NoteChangedError(Exception):
+    """Thrown when a note's field no longer has the content a change was computed from"""
+    pass
+
+
+def update_note_fields(db, changes, indices, mod, usn, chunk_size=CHUNK_SIZE):
+    """
+    Sets fields of the notes, given a NoteChange(nid, field, old, new) for each changed field and
+    mid => ((field name, index), ...) for each note type, as returned by field_indices.  All the changed
+    fields of a note are written together.  The notes are stamped with mod and usn like Note.flush does.
+
+    The current fields of all the notes are checked before any note is updated, raising NoteChangedError if
+    any note no longer has the old content or no longer exists.  The caller is responsible for committing
+    the updates, as with Note.flush.  Anki's caches of the sort field and checksum are not updated.
+    """
+    changes_by_nid = {}
+    for change in changes:
+        changes_by_nid.setdefault(change.nid, []).append(change)
+    nids = list(changes_by_nid)
+    field_index = {mid: dict(fields) for mid, fields in indices.items()}
+    updates = []
+    for start in range(0, len(nids), chunk_size):
+        chunk = nids[start:start + chunk_size]
+        for nid, mid, flds in db.all(
+                "select id, mid, flds from notes where id in ({})".format(",".join("?" * len(chunk))),
+                *chunk):
+            fields = flds.split(FIELD_SEPARATOR)
+            note_index = field_index.get(mid, {})
+            for change in changes_by_nid[nid]:
+                index = note_index.get(change.field)
+                if index is None or fields[index] != change.old:
+                    raise NoteChangedError("nid {} was modified since it was checked".format(nid))
+                fields[index] = change.new
+            updates.append((FIELD_SEPARATOR.join(fields), mod, usn, nid))
+    if len(updates) != len(nids):
+        raise NoteChangedError("{} of the notes were deleted since they were checked".format(
+            len(nids) - len(updates)))
+    db.executemany("update notes set flds = ?, mod = ?, usn = ? where id = ?", updates)
+
+
+def note_ids(db, mids):
+    """Returns the ids of all the notes of the note types, in order"""
+    if not mids:
+        return []
+    return db.list("select id from notes where mid in ({}) order by id".format(",".join("?" * len(mids))), *mids)
@@ -0,0 +1,98 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict, namedtuple
+
+from .change_log import ChangeLogEntry
+from .notes import NoteChange, fetch_note_fields, field_indices, update_note_fields
+
+# Op the reverts are recorded as in the change log
+REVERT_OP = "revert"
+
+# Field whose current content is not the content it was last changed to in the changes being reverted.
+# current is None when the note was deleted or no longer has the field.  When the field was edited between
+# two of the changes being reverted, expected is the content left by the earlier one and current is the
+# content the later one started from.
+RevertConflict = namedtuple("RevertConflict", ["nid", "field", "expected", "current"])
+
+
+class RevertPlan:
+    """
+    Changes that restore the fields changed by the changes selected from the change log to their content
+    before those changes, along with the fields that can't be restored because they were modified since.
+    Each field is restored to its old content in the earliest of the selected changes to it.
+    """
+
+    def __init__(self, changes, conflicts, indices):
+        # NoteChange from the field's current content to its restored content
+        self.changes = changes
+        self.conflicts = conflicts
+        # mid => ((field name, index), ...) of the changed fields, as returned by field_indices
+        self.indices = indices
+
+    def nids(self):
+        """Ids of the notes to be updated, in order"""
+        return list(OrderedDict.fromkeys(change.nid for change in self.changes))
+
+
+def plan_revert(db, models, changelog, query):
+    """
+    Returns a RevertPlan for the changes selected from the change log by the ChangeLogQuery.  The fields of
+    all the changed notes are read in bulk and compared with the content they were last changed to, with
+    any field that differs, or that was edited between the selected changes to it, reported as a conflict
+    and left as is.
+    """
+    # (nid, field) => [content before the first change, content after the last change].  Each change must
+    # start from the content the previous selected change left, otherwise the field was edited between them
+    # by changes that aren't selected or weren't logged, and reverting would lose those edits.
+    values = OrderedDict()
+    broken = OrderedDict()
+    for _, _, nid, fld, old, new in changelog.iter_changes(query):
+        key = (nid, fld)
+        value = values.get(key)
+        if value is None:
+            values[key] = [old, new]
+        else:
+            if old != value[1] and key not in broken:
+                broken[key] = RevertConflict(nid=nid, field=fld, expected=value[1], current=old)
+            value[1] = new
+
+    indices = field_indices(models, list(OrderedDict.fromkeys(fld for _, fld in values)))
+    nids = list(OrderedDict.fromkeys(nid for nid, _ in values))
+    current = {(note_field.nid, note_field.field): note_field.content
+               for note_field in fetch_note_fields(db, nids, indices)}
+
+    changes = []
+    conflicts = []
+    for (nid, fld), (old, new) in values.items():
+        content = current.get((nid, fld))
+        if (nid, fld) in broken:
+            conflicts.append(broken[(nid, fld)])
+        elif content != new:
+            conflicts.append(RevertConflict(nid=nid, field=fld, expected=new, current=content))
+        elif old != new:
+            changes.append(NoteChange(nid=nid, field=fld, old=new, new=old))
+    return RevertPlan(changes, conflicts, indices)
+
+
+def apply_revert(db, changelog, plan, init_ts, usn):
+    """
+    Updates the notes with the plan's changes and records them in the change log as REVERT_OP, waiting until
+    they are committed to the change log.  Raises NoteChangedError without updating any note if any was
+    modified since the plan was made.  The caller is responsible for committing the updates.
+    """
+    update_note_fields(db, plan.changes, plan.indices, mod=init_ts // 1000, usn=usn)
+    changelog.record_and_commit_changes(REVERT_OP, init_ts, [
+        ChangeLogEntry(ts=init_ts, nid=change.nid, fld=change.field, old=change.old, new=change.new)
+        for change in plan.changes])
@@ -0,0 +1,69 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sqlite3
+
+
+class DB:
+    """
+    Thin wrapper around a sqlite3 connection with the same methods as anki.db.DB, so code written
+    against the collection's database can also run against a plain SQLite file outside of Anki.
+    """
+
+    def __init__(self, path, timeout=0):
+        self._db = sqlite3.connect(path, timeout=timeout)
+        self.mod = False
+
+    def execute(self, sql, *args, **kwargs):
+        if sql.lstrip()[:6].lower() in ("insert", "update", "delete"):
+            self.mod = True
+        return self._db.execute(sql, kwargs or args)
+
+    def executemany(self, sql, data):
+        self.mod = True
+        self._db.executemany(sql, data)
+
+    def executescript(self, sql):
+        self.mod = True
+        self._db.executescript(sql)
+
+    def scalar(self, *args, **kwargs):
+        res = self.execute(*args, **kwargs).fetchone()
+        if res:
+            return res[0]
+        return None
+
+    def all(self, *args, **kwargs):
+        return self.execute(*args, **kwargs).fetchall()
+
+    def first(self, *args, **kwargs):
+        cursor = self.execute(*args, **kwargs)
+        res = cursor.fetchone()
+        cursor.close()
+        return res
+
+    def list(self, *args, **kwargs):
+        return [row[0] for row in self.execute(*args, **kwargs)]
+
+    def commit(self):
+        self._db.commit()
+
+    def rollback(self):
+        self._db.rollback()
+
+    def setAutocommit(self, autocommit):
+        self._db.isolation_level = None if autocommit else ""
+
+    def close(self):
+        self._db.close()
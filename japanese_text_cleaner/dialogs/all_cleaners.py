@@ -0,0 +1,28 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from ..text.pipeline import ALL_CLEANERS
+from .base import TextCleanerDialogBase
+
+
+class JapaneseAllCleanersFixerDialog(TextCleanerDialogBase):
+    """Dialog that runs all Japanese text cleaners in a single pass"""
+
+    def __init__(self, browser, nids):
+        super().__init__(browser, nids,
+                         "Check the fields of each note type below to look for spacing and redundant furigana",
+                         "Check Spacing and Furigana in Selected Notes")
+        self.op = "clean_all"
+        self.cleaner = ALL_CLEANERS
+        self.checkpoint_name = "fix japanese text"
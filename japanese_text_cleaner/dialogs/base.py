@@ -15,43 +15,25 @@
 import os
 import time
 import traceback
-from collections import namedtuple
+from collections import OrderedDict
 
-from aqt.qt import (QComboBox, QDialog, QDialogButtonBox, QFileDialog, QFontDatabase, QHBoxLayout, QLabel,
-                    QPlainTextEdit, QStandardPaths, Qt, QVBoxLayout)
-from aqt.utils import askUser
+from aqt.qt import (QCheckBox, QDialog, QDialogButtonBox, QFileDialog, QFontDatabase, QHBoxLayout, QLabel,
+                    QPlainTextEdit, QProgressBar, QSplitter, QStandardPaths, Qt, QTimer, QTreeWidget, QTreeWidgetItem,
+                    QVBoxLayout)
+from aqt.utils import askUser, showWarning
 
 from ..db.change_log import ChangeLog, ChangeLogEntry
-from ..text.exceptions import TextProcessingError
-
-DIFF_PRE = """<html>
-<head>
-<style>
-p {
-    font-family: "Lucida Console", Monaco, monospace;
-}
-ins {
-    background-color: lightgreen;
-    text-decoration: none;
-}
-del {
-    background-color: lightpink;
-    text-decoration: none;
-}
-</style>
-</head>
-<body>"""
-
-DIFF_POST = """</body>
-</html>
-"""
-
-NoteChange = namedtuple("NoteChange", ["nid", "old", "new"])
-
-
-class NoteFixError(Exception):
-    """Thrown when unexpected error occurs while fixing notes"""
-    pass
+from ..db.clean_state import CleanState
+from ..db.notes import NoteChange, note_type_ids, update_note_fields
+from ..diff_report import DiffReportWriter
+from ..progress import Progress
+from ..scan import CHUNK_SIZE, Rescan, ScanSummary
+from ..text.parallel import default_workers, forks_processes
+from .results import ScanResultsModel, results_table
+from .worker import CleanWorker
+
+# Interval of the checks for a failure to write the change log
+CHANGELOG_CHECK_MS = 1000
 
 
 class TextCleanerDialogBase(QDialog):
@@ -64,6 +46,15 @@ class TextCleanerDialogBase(QDialog):
         self.description = description
         self.title = title
         self.changelog = ChangeLog()
+        self.clean_state = CleanState()
+        self.scan = None
+        self.worker = None
+        # DiffReportWriter of the diff being saved, closed by reject if the dialog is closed first
+        self.diff_report = None
+        # Checks whether the change log's background writer failed to write the changes of a fix
+        self.changelog_timer = QTimer(self)
+        self.changelog_timer.setInterval(CHANGELOG_CHECK_MS)
+        self.changelog_timer.timeout.connect(self._check_changelog)
         self._setup_ui()
 
     def _setup_ui(self):
@@ -74,7 +65,9 @@ class TextCleanerDialogBase(QDialog):
         vbox = QVBoxLayout()
         vbox.addLayout(self._ui_top_row())
         vbox.addLayout(self._ui_field_select_row())
-        vbox.addWidget(self._ui_log())
+        vbox.addWidget(self._ui_summary())
+        vbox.addWidget(self._ui_results())
+        vbox.addLayout(self._ui_progress_row())
         vbox.addLayout(self._ui_bottom_row())
 
         self.setLayout(vbox)
@@ -87,26 +80,71 @@ class TextCleanerDialogBase(QDialog):
     def _ui_field_select_row(self):
         hbox = QHBoxLayout()
         hbox.setAlignment(Qt.AlignLeft)
-        hbox.addWidget(QLabel("Field:"))
-
-        model = self.browser.mw.col.getNote(self.nids[0]).model()
-        field_names = self.browser.mw.col.models.fieldNames(model)
-
-        self.field_selection = QComboBox()
-        self.field_selection.addItems(field_names)
+        hbox.addWidget(QLabel("Fields:"))
+
+        # Fields are chosen separately for each type of note in the selection, starting with the first field
+        col = self.browser.mw.col
+        self.field_selection = QTreeWidget()
+        self.field_selection.setHeaderHidden(True)
+        self.field_selection.setMaximumHeight(120)
+        for mid in note_type_ids(col.db, self.nids):
+            model = col.models.get(mid)
+            if model is None:
+                continue
+            model_item = QTreeWidgetItem(self.field_selection, [model["name"]])
+            model_item.setData(0, Qt.UserRole, mid)
+            for fld in model["flds"]:
+                field_item = QTreeWidgetItem(model_item, [fld["name"]])
+                field_item.setData(0, Qt.UserRole, fld["ord"])
+                field_item.setFlags(field_item.flags() | Qt.ItemIsUserCheckable)
+                field_item.setCheckState(0, Qt.Checked if fld["ord"] == 0 else Qt.Unchecked)
+            model_item.setExpanded(True)
         hbox.addWidget(self.field_selection)
 
+        self.parallel_checkbox = QCheckBox("Use multiple processes")
+        self.parallel_checkbox.setToolTip("Clean large selections of notes using all CPU cores")
+        # Left unchecked and hidden where worker processes would start another instance of Anki
+        self.parallel_checkbox.setVisible(forks_processes())
+        hbox.addWidget(self.parallel_checkbox)
+
         return hbox
 
-    def _ui_log(self):
+    def _ui_summary(self):
+        self.summary = QLabel()
+        return self.summary
+
+    def _ui_results(self):
+        font = QFontDatabase.systemFont(QFontDatabase.FixedFont)
+
+        # Notes that need to be updated, with the full text of the selected note shown below them
+        self.results = ScanResultsModel(self)
+        self.details = QPlainTextEdit()
+        self.details.setReadOnly(True)
+        self.details.setFont(font)
+        table = results_table(self.results, self.details.setPlainText)
+        table.setFont(font)
+
         self.log = QPlainTextEdit()
         self.log.setTabChangesFocus(False)
         self.log.setReadOnly(True)
-
-        font = QFontDatabase.systemFont(QFontDatabase.FixedFont)
         font.setPointSize(self.log.font().pointSize() - 2)
         self.log.setFont(font)
-        return self.log
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(table)
+        splitter.addWidget(self.details)
+        splitter.addWidget(self.log)
+        splitter.setSizes([300, 100, 100])
+        return splitter
+
+    def _ui_progress_row(self):
+        hbox = QHBoxLayout()
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setTextVisible(False)
+        hbox.addWidget(self.progress_bar)
+        self.progress_label = QLabel()
+        hbox.addWidget(self.progress_label)
+        return hbox
 
     def _ui_bottom_row(self):
         hbox = QHBoxLayout()
@@ -114,238 +152,282 @@ class TextCleanerDialogBase(QDialog):
         buttons = QDialogButtonBox(Qt.Horizontal, self)
 
         # Button to check if content needs to be changed
-        check_btn = buttons.addButton("&Check",
-                                      QDialogButtonBox.ActionRole)
-        check_btn.setToolTip("Check")
-        check_btn.clicked.connect(lambda _: self.onCheck())
+        self.check_btn = buttons.addButton("&Check",
+                                           QDialogButtonBox.ActionRole)
+        self.check_btn.setToolTip("Check")
+        self.check_btn.clicked.connect(lambda _: self.onCheck())
 
         # Button to generate diff of proposed content changes
-        diff_btn = buttons.addButton("&Diff",
-                                     QDialogButtonBox.ActionRole)
-        diff_btn.setToolTip("Show diff")
-        diff_btn.clicked.connect(lambda _: self.onDiff())
+        self.diff_btn = buttons.addButton("&Diff",
+                                          QDialogButtonBox.ActionRole)
+        self.diff_btn.setToolTip("Show diff")
+        self.diff_btn.clicked.connect(lambda _: self.onDiff())
 
         # Button to make the proposed changes
-        fix_btn = buttons.addButton("&Fix",
-                                    QDialogButtonBox.ActionRole)
-        fix_btn.setToolTip("Fix")
-        fix_btn.clicked.connect(lambda _: self.onFix())
+        self.fix_btn = buttons.addButton("&Fix",
+                                         QDialogButtonBox.ActionRole)
+        self.fix_btn.setToolTip("Fix")
+        self.fix_btn.clicked.connect(lambda _: self.onFix())
+
+        # Button to stop checking notes
+        self.cancel_btn = buttons.addButton("C&ancel",
+                                            QDialogButtonBox.ActionRole)
+        self.cancel_btn.setToolTip("Stop checking notes")
+        self.cancel_btn.setEnabled(False)
+        self.cancel_btn.clicked.connect(lambda _: self.onCancel())
 
         # Button to close this dialog
         close_btn = buttons.addButton("&Close",
                                       QDialogButtonBox.RejectRole)
-        close_btn.clicked.connect(self.close)
+        close_btn.clicked.connect(self.reject)
 
         hbox.addWidget(buttons)
         return hbox
 
-    def clean_content(self, content, output_html_diff=False):
-        raise NotImplementedError("clean_content")
-
-    def onCheck(self):
-        """Checks which notes need to be updated for the selected field"""
-        append_to_log = self.log.appendPlainText
-
+    def selected_field_indices(self):
+        """Returns mid => ((field name, index), ...) of the fields checked for each type of note"""
+        indices = {}
+        for i in range(self.field_selection.topLevelItemCount()):
+            model_item = self.field_selection.topLevelItem(i)
+            fields = []
+            for j in range(model_item.childCount()):
+                field_item = model_item.child(j)
+                if field_item.checkState(0) == Qt.Checked:
+                    fields.append((field_item.text(0), field_item.data(0, Qt.UserRole)))
+            if fields:
+                indices[model_item.data(0, Qt.UserRole)] = tuple(fields)
+        return indices
+
+    def scan_fields(self, indices, on_chunk, on_done, on_stopped=None):
+        """
+        Cleans the fields of the selected notes in a background worker, given mid => ((field name, index), ...)
+        for each type of note.  Each note is read once for all of its fields.  The last scan is kept, so only
+        notes modified since it was made need to be read and cleaned again.  on_chunk is called with each
+        list of (NoteField, CleanOutcome) pairs as they become available, starting with those reused from
+        the last scan.  on_done is called with the NoteScan once all the fields are cleaned.  on_stopped
+        is called instead if the scan is cancelled or fails.  Fields found clean since their notes were last
+        modified are skipped, and the fields found clean by this scan are recorded.
+        """
+        col = self.browser.mw.col
+        workers = default_workers() if self.parallel_checkbox.isChecked() else 1
+        rescan = Rescan(col.db, self.scan, self.nids, indices, self.cleaner, self.clean_state)
+        if rescan.skipped:
+            self.log.appendPlainText("Skipped {} fields found clean since their notes were last modified, "
+                                     "including all the fields of {} notes".format(rescan.skipped,
+                                                                                   rescan.skipped_notes))
+        if rescan.reused:
+            self.log.appendPlainText("Reused results for {} fields of notes not modified since last checked".format(
+                len(rescan.reused)))
+            on_chunk(rescan.reused)
+
+        progress = Progress(len(rescan.pending), unit="fields")
+        self._show_progress(progress)
+        self.worker = CleanWorker(rescan, workers, CHUNK_SIZE * workers, parent=self)
+        self.worker.chunk_cleaned.connect(lambda chunk: self._on_chunk_cleaned(progress, chunk, on_chunk))
+        self.worker.finished.connect(lambda: self._on_scan_finished(rescan, on_done, on_stopped))
+        self._set_running(True)
+        self.worker.start()
+
+    def _on_chunk_cleaned(self, progress, chunk, on_chunk):
+        progress.update(len(chunk))
+        self._show_progress(progress)
         try:
-            self.log.clear()
-            nids = self.nids
-            field_name = self.field_selection.currentText()
-
-            checked = 0
-            need_clean = 0
-            failed_notes = []
-            for nid in nids:
-                note = self.browser.mw.col.getNote(nid)
-                if field_name in note:
-                    content = note[field_name]
-                    try:
-                        cleaned_content = self.clean_content(content)
-                        if content != cleaned_content:
-                            append_to_log("Need to update note for nid {}:".format(nid))
-                            append_to_log("{}\n=>\n{}\n".format(content, cleaned_content))
-                            need_clean += 1
-                    except TextProcessingError as e:
-                        failed_notes.append((nid, content, str(e)))
-                    checked += 1
-            if failed_notes:
-                append_to_log("Found {} notes that failed to be processed:".format(len(failed_notes)))
-                for nid, _, exc in failed_notes:
-                    append_to_log("{}: {}\n".format(nid, exc))
-            append_to_log("Checked {} notes".format(checked))
-            append_to_log("Found {} notes ({:.0f}%) need to be updated".format(
-                need_clean, 0 if not checked else 100.0 * need_clean / checked))
-            if failed_notes:
-                append_to_log("Found {} notes that failed to be processed".format(len(failed_notes)))
+            on_chunk(chunk)
+        except Exception:
+            self.log.appendPlainText("Failed while checking notes:\n{}".format(traceback.format_exc()))
 
+    def _on_scan_finished(self, rescan, on_done, on_stopped):
+        worker = self.worker
+        self.worker = None
+        self._set_running(False)
+        try:
+            self.clean_state.record_clean(self.cleaner, rescan.cleaned)
+        except Exception:
+            self.log.appendPlainText("Failed to record the fields found clean:\n{}".format(traceback.format_exc()))
+        try:
+            if worker.error is not None or len(rescan.cleaned) < len(rescan.pending):
+                if worker.error is not None:
+                    self.log.appendPlainText("Failed while checking notes:\n{}".format(worker.error))
+                else:
+                    self.log.appendPlainText("Cancelled after checking {} of {} fields".format(
+                        len(rescan.cleaned), len(rescan.pending)))
+                if on_stopped is not None:
+                    on_stopped()
+            else:
+                self.scan = rescan.finish()
+                on_done(self.scan)
         except Exception:
-            append_to_log("Failed while checking notes:\n{}".format(traceback.format_exc()))
+            self.log.appendPlainText("Failed while checking notes:\n{}".format(traceback.format_exc()))
+
+    def _show_progress(self, progress):
+        self.progress_bar.setMaximum(max(progress.total, 1))
+        self.progress_bar.setValue(progress.done if progress.total else 1)
+        self.progress_label.setText(str(progress))
+
+    def _set_running(self, running):
+        for widget in (self.check_btn, self.diff_btn, self.fix_btn, self.field_selection, self.parallel_checkbox):
+            widget.setEnabled(not running)
+        self.cancel_btn.setEnabled(running)
+
+    def onCancel(self):
+        """Stops cleaning notes once the chunk being cleaned is done"""
+        if self.worker is not None:
+            self.log.appendPlainText("Cancelling")
+            self.worker.cancel()
+
+    def _start(self, on_done, on_chunk=None, on_stopped=None):
+        """
+        Clears the results and scans the selected fields, listing the fields in the results as they are
+        cleaned.  on_chunk is also called with each chunk of fields when given.  Returns False without
+        scanning when no fields are selected.
+        """
+        indices = self.selected_field_indices()
+        self.log.clear()
+        self.summary.clear()
+        self.details.clear()
+        self.results.clear()
+
+        def add_chunk(chunk):
+            self.results.add(chunk)
+            if on_chunk is not None:
+                on_chunk(chunk)
+
+        if not indices:
+            self.log.appendPlainText("Select at least one field to check")
+            return False
+        self.scan_fields(indices, add_chunk, on_done, on_stopped)
+        return True
+
+    def _show_summary(self, scan):
+        """Shows counts of the fields in the scan.  Returns the number that need to be updated."""
+        summary = ScanSummary(scan)
+        self.summary.setText(str(summary))
+        return summary.need_clean
 
-        # Ensure QPlainTextEdit refreshes (not clear why this is necessary)
-        self.log.repaint()
+    def onCheck(self):
+        """Checks which notes need to be updated for the selected fields"""
+        try:
+            self._start(self._show_summary)
+        except Exception:
+            self.log.appendPlainText("Failed while checking notes:\n{}".format(traceback.format_exc()))
 
     def onDiff(self):
-        """Produces HTML diff of the updates that would be made"""
-        append_to_log = self.log.appendPlainText
-
-        lines = []
+        """Writes an HTML diff of the updates that would be made, as the notes are checked"""
         try:
-            self.log.clear()
-            nids = self.nids
-            field_name = self.field_selection.currentText()
-
-            cnt = 0
-            need_clean = 0
-            failed_notes = []
-            for nid in nids:
-                note = self.browser.mw.col.getNote(nid)
-                if field_name in note:
-                    content = note[field_name]
-                    try:
-                        cleaned_content = self.clean_content(content, output_html_diff=True)
-                        if content != cleaned_content:
-                            lines.append((nid, cleaned_content))
-                            need_clean += 1
-                    except TextProcessingError as e:
-                        failed_notes.append((nid, content, str(e)))
-                    cnt += 1
-            if failed_notes:
-                append_to_log("Found {} notes that failed to be processed:".format(len(failed_notes)))
-                for nid, _, exc in failed_notes:
-                    append_to_log("{}: {}\n".format(nid, exc))
-            append_to_log("Checked {} notes. Found {} notes need updating.".format(
-                cnt, need_clean))
-            if failed_notes:
-                append_to_log("Found {} notes that failed to be processed".format(len(failed_notes)))
-
-            if len(lines) > 0:
-                ext = ".html"
-                default_path = QStandardPaths.writableLocation(QStandardPaths.DocumentsLocation)
-                path = os.path.join(default_path, f"diff{ext}")
-
-                options = QFileDialog.Options()
-
-                # native doesn't seem to works
-                options |= QFileDialog.DontUseNativeDialog
-
-                # we'll confirm ourselves
-                options |= QFileDialog.DontConfirmOverwrite
-
-                result = QFileDialog.getSaveFileName(
-                    self, "Save HTML diff", path, f"HTML (*{ext})",
-                    options=options)
-
-                if not isinstance(result, tuple):
-                    raise Exception("Expected a tuple from save dialog")
-                file = result[0]
-                if file:
-                    do_save = True
-                    if not file.lower().endswith(ext):
-                        file += ext
-                    if os.path.exists(file):
-                        if not askUser("{} already exists. Are you sure you want to overwrite it?".format(file),
-                                       parent=self):
-                            do_save = False
-                    if do_save:
-                        append_to_log("Saving to {}".format(file))
-                        with open(file, "w", encoding="utf-8") as outf:
-                            outf.write(DIFF_PRE)
-                            for nid, line in lines:
-                                outf.write("<p>nid {}:</p>\n".format(nid))
-                                outf.write("<p>{}</p>\n".format(line))
-                            outf.write(DIFF_POST)
-                        append_to_log("Done")
-
-            # Ensure QPlainTextEdit refreshes (not clear why this is necessary)
-            self.log.repaint()
-
+            path = self._ask_diff_path()
+            if not path:
+                return
+            report = self.diff_report = DiffReportWriter(path)
+
+            def write_chunk(chunk):
+                for (nid, _, field, _, _), (result, error, _) in chunk:
+                    if error is None and result.changed:
+                        report.add(nid, field, result)
+
+            def finish(scan=None):
+                self.diff_report = None
+                report.close()
+                if scan is not None:
+                    self._show_summary(scan)
+                self.log.appendPlainText("Saved diff of {} fields in {} pages to {}".format(
+                    report.count, len(report.page_counts), path))
+
+            if self._start(finish, write_chunk, finish):
+                self.log.appendPlainText("Saving to {}".format(path))
+            else:
+                # Nothing is checked, so the report written is empty
+                self.diff_report = None
+                report.close()
         except Exception:
-            append_to_log("Failed while checking notes:\n{}".format(traceback.format_exc()))
+            self.log.appendPlainText("Failed while checking notes:\n{}".format(traceback.format_exc()))
+
+    def _ask_diff_path(self):
+        """Asks where to save the diff, returning None if the user cancels"""
+        ext = ".html"
+        default_path = QStandardPaths.writableLocation(QStandardPaths.DocumentsLocation)
+        path = os.path.join(default_path, f"diff{ext}")
+
+        options = QFileDialog.Options()
+
+        # native doesn't seem to works
+        options |= QFileDialog.DontUseNativeDialog
+
+        # we'll confirm ourselves
+        options |= QFileDialog.DontConfirmOverwrite
+
+        result = QFileDialog.getSaveFileName(
+            self, "Save HTML diff", path, f"HTML (*{ext})",
+            options=options)
+
+        if not isinstance(result, tuple):
+            raise Exception("Expected a tuple from save dialog")
+        file = result[0]
+        if not file:
+            return None
+        if not file.lower().endswith(ext):
+            file += ext
+        if os.path.exists(file):
+            if not askUser("{} already exists. Are you sure you want to overwrite it?".format(file),
+                           parent=self):
+                return None
+        return file
 
     def onFix(self):
         """Updates the selected notes where the content needs to be updated"""
+        try:
+            if self._start(self._finish_fix):
+                self.log.appendPlainText("Checking how many notes need to be updated")
+        except Exception:
+            self.log.appendPlainText("Failed while checking notes:\n{}".format(traceback.format_exc()))
+
+    def _finish_fix(self, scan):
         append_to_log = self.log.appendPlainText
 
         try:
-            self.log.clear()
-            nids = self.nids
-            field_name = self.field_selection.currentText()
-
-            append_to_log("Checking how many notes need to be updated")
-            checked = 0
+            checked = scan.note_count
+            self._show_summary(scan)
             note_changes = []
-            failed_notes = []
-            for nid in nids:
-                note = self.browser.mw.col.getNote(nid)
-                if field_name in note:
-                    content = note[field_name]
-                    try:
-                        cleaned_content = self.clean_content(content)
-                        if content != cleaned_content:
-                            note_changes.append(NoteChange(
-                                nid=nid, old=content, new=cleaned_content))
-                    except TextProcessingError as e:
-                        failed_notes.append((nid, content, str(e)))
-                    checked += 1
-
-            if failed_notes:
-                append_to_log("Found {} notes that failed to be processed:".format(len(failed_notes)))
-                for nid, _, exc in failed_notes:
-                    append_to_log("{}: {}\n".format(nid, exc))
-
-            append_to_log("{} of {} notes will be updated".format(len(note_changes), checked))
-
-            if failed_notes:
-                append_to_log("Found {} notes that failed to be processed.".format(len(failed_notes)))
-
-            self.log.repaint()
-
-            if askUser("{} of {} notes will be updated.  Are you sure you want to do this?".format(
-                    len(note_changes), checked), parent=self):
+            for (nid, _, field, content, _), (result, error, _) in scan:
+                if error is None and result.changed:
+                    note_changes.append(NoteChange(
+                        nid=nid, field=field, old=content, new=result.cleaned))
+            nids = list(OrderedDict.fromkeys(note_change.nid for note_change in note_changes))
+
+            append_to_log("{} fields of {} of {} notes will be updated".format(len(note_changes), len(nids), checked))
+
+            if askUser("{} fields of {} of {} notes will be updated.  Are you sure you want to do this?".format(
+                    len(note_changes), len(nids), checked), parent=self):
 
                 append_to_log("Beginning update")
 
                 self.browser.mw.checkpoint("{} ({} {})".format(
-                    self.checkpoint_name, len(note_changes),
-                    "notes" if len(note_changes) > 1 else "note"))
+                    self.checkpoint_name, len(nids),
+                    "notes" if len(nids) > 1 else "note"))
                 self.browser.model.beginReset()
 
                 cleaned = 0
                 try:
+                    col = self.browser.mw.col
                     init_ts = int(time.time() * 1000)
-                    for note_change in note_changes:
-                        note = self.browser.mw.col.getNote(note_change.nid)
-                        content = note[field_name]
-
-                        # content should not have changed
-                        if content != note_change.old:
-                            # this should never happen
-                            raise NoteFixError("nid {} old and new content do not match".format(
-                                note_change.nid))
-
-                        cleaned_content = note_change.new
-
-                        append_to_log("Updating note for nid {}:".format(nid))
-                        append_to_log("{}\n=>\n{}\n".format(content, cleaned_content))
-
-                        ts = int(time.time() * 1000)
 
-                        note[field_name] = cleaned_content
-                        note.flush()
+                    # All the notes are updated within the checkpoint's transaction, so undo reverts them
+                    update_note_fields(col.db, note_changes, scan.indices, mod=init_ts // 1000, usn=col.usn())
+                    col.updateFieldCache(nids)
+                    col.genCards(nids)
+                    cleaned = len(nids)
 
-                        self.changelog.record_change(
-                            self.op, init_ts,
-                            ChangeLogEntry(
-                                ts=ts, nid=nid, fld=field_name,
-                                old=content, new=cleaned_content))
+                    # Written by the change log's background writer, so the update doesn't wait on the change log
+                    self.changelog.record_changes(self.op, init_ts, [
+                        ChangeLogEntry(ts=init_ts, nid=note_change.nid, fld=note_change.field,
+                                       old=note_change.old, new=note_change.new)
+                        for note_change in note_changes])
+                    self.changelog_timer.start()
 
-                        cleaned += 1
-
-                    append_to_log("Updated {} notes ({:.0f}%)".format(
-                        cleaned, 0 if not checked else 100.0 * cleaned / checked))
+                    append_to_log("Updated {} fields of {} notes ({:.0f}%)".format(
+                        len(note_changes), cleaned, 0 if not checked else 100.0 * cleaned / checked))
 
                 finally:
                     if cleaned:
-                        self.changelog.commit_changes()
                         self.browser.mw.requireReset()
                     self.browser.model.endReset()
 
@@ -353,11 +435,40 @@ class TextCleanerDialogBase(QDialog):
                 append_to_log("User aborted update")
 
         except Exception:
-            append_to_log("Failed while checking notes:\n{}".format(traceback.format_exc()))
-
-        # Ensure QPlainTextEdit refreshes (not clear why this is necessary)
-        self.log.repaint()
-
-    def close(self):
-        self.changelog.close()
-        super().close()
+            append_to_log("Failed while fixing notes:\n{}".format(traceback.format_exc()))
+
+    def reject(self):
+        # Called for the Close button, Escape and the window's close button alike, so the worker is always
+        # stopped before the dialog is destroyed, which Qt requires of a running QThread
+        if self.worker is not None:
+            worker = self.worker
+            self.worker = None
+            worker.chunk_cleaned.disconnect()
+            worker.finished.disconnect()
+            worker.cancel()
+            worker.wait()
+        if self.diff_report is not None:
+            # Saves the diff of the fields checked so far, since the scan's callbacks were disconnected
+            report = self.diff_report
+            self.diff_report = None
+            try:
+                report.close()
+            except Exception:
+                showWarning("Failed while saving the diff:\n{}".format(traceback.format_exc()), parent=self.browser)
+        self.changelog_timer.stop()
+        try:
+            self.changelog.close()
+        except Exception:
+            # The dialog still closes, with the changes that weren't logged reported
+            showWarning("Failed while writing the change log, so some of the changes made are missing from "
+                        "it:\n{}".format(traceback.format_exc()), parent=self.browser)
+        self.clean_state.close()
+        super().reject()
+
+    def _check_changelog(self):
+        error = self.changelog.write_error()
+        if error is not None:
+            self.changelog_timer.stop()
+            self.log.appendPlainText(
+                "Failed while writing the change log, so changes made from now on are not logged:\n{}".format(
+                    "".join(traceback.format_exception(type(error), error, error.__traceback__))))
@@ -12,16 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import csv
-import datetime
 import os
+import time
 import traceback
 
-from aqt.qt import (QDialog, QDialogButtonBox, QFileDialog, QFontDatabase, QHBoxLayout, QLabel, QPlainTextEdit,
-                    QStandardPaths, Qt, QVBoxLayout)
+from aqt.qt import (QComboBox, QDialog, QDialogButtonBox, QFileDialog, QFontDatabase, QHBoxLayout, QLabel, QLineEdit,
+                    QPlainTextEdit, QPushButton, QSplitter, QStandardPaths, Qt, QVBoxLayout)
 from aqt.utils import askUser, tooltip
 
-from ..db.change_log import ChangeLog
+from ..db.change_log import ChangeLog, ChangeLogQuery
+from ..db.revert import REVERT_OP, apply_revert, plan_revert
+from ..export import EXPORT_EXTENSIONS, export_changes, export_format
+from ..results import parse_time
+from ..text import CLEANERS
+from .results import ChangeLogModel, results_table
+
+# Conflicts listed in the log when reverting, with the rest only counted
+MAX_CONFLICTS_LOGGED = 100
+
+# Names of the formats of EXPORT_EXTENSIONS shown in the save dialog
+EXPORT_NAMES = ["CSV", "CSV, gzip", "JSON Lines", "JSON Lines, gzip"]
 
 
 class ChangeLogDialog(QDialog):
@@ -31,85 +41,264 @@ class ChangeLogDialog(QDialog):
         super().__init__(parent=browser)
         self.browser = browser
         self.changelog = ChangeLog()
-        self.display_limit = 500
+        self.model = ChangeLogModel(self.changelog, self)
         self._setup_ui()
+        self._update_counts()
 
     def _setup_ui(self):
         self.setWindowTitle("View Log")
-        self.setMinimumWidth(600)
+        self.setMinimumWidth(800)
         self.setMinimumHeight(400)
 
         vbox = QVBoxLayout()
-        vbox.addLayout(self._ui_top_row())
+        vbox.addLayout(self._ui_filter_row())
         vbox.addWidget(self._ui_log())
+        vbox.addLayout(self._ui_page_row())
         vbox.addLayout(self._ui_bottom_row())
 
         self.setLayout(vbox)
 
-        self.fillLog()
-
-    def _ui_top_row(self):
+    def _ui_filter_row(self):
         hbox = QHBoxLayout()
-        hbox.addWidget(QLabel("Last {} updates".format(self.display_limit)))
+
+        self.nid_filter = QLineEdit()
+        self.nid_filter.setPlaceholderText("nid")
+        self.field_filter = QLineEdit()
+        self.field_filter.setPlaceholderText("Field")
+        self.op_filter = QComboBox()
+        self.op_filter.setEditable(True)
+        self.op_filter.addItems([""] + list(CLEANERS) + [REVERT_OP])
+        self.op_filter.lineEdit().setPlaceholderText("Op")
+        self.batch_filter = QLineEdit()
+        self.batch_filter.setPlaceholderText("Batch")
+        self.start_filter = QLineEdit()
+        self.start_filter.setPlaceholderText("From (UTC)")
+        self.start_filter.setToolTip("Changes made from this time, such as 2019-07-10 or 2019-07-10T18:30")
+        self.end_filter = QLineEdit()
+        self.end_filter.setPlaceholderText("Until (UTC)")
+        self.end_filter.setToolTip("Changes made before this time, such as 2019-07-11 or 2019-07-10T19:00")
+
+        for widget in (self.nid_filter, self.field_filter, self.batch_filter, self.start_filter, self.end_filter):
+            widget.returnPressed.connect(self.onFilter)
+            hbox.addWidget(widget)
+        hbox.insertWidget(2, self.op_filter)
+
+        filter_btn = QPushButton("&Filter")
+        filter_btn.clicked.connect(lambda _: self.onFilter())
+        hbox.addWidget(filter_btn)
+
+        clear_btn = QPushButton("C&lear")
+        clear_btn.clicked.connect(lambda _: self.onClearFilter())
+        hbox.addWidget(clear_btn)
         return hbox
 
     def _ui_log(self):
+        font = QFontDatabase.systemFont(QFontDatabase.FixedFont)
+
+        # Changes with the full old and new values of the selected change shown below them
+        self.details = QPlainTextEdit()
+        self.details.setReadOnly(True)
+        self.details.setFont(font)
+        self.table = results_table(self.model, self.details.setPlainText)
+        self.table.setFont(font)
+
         self.log = QPlainTextEdit()
         self.log.setTabChangesFocus(False)
         self.log.setReadOnly(True)
-        font = QFontDatabase.systemFont(QFontDatabase.FixedFont)
         font.setPointSize(self.log.font().pointSize() - 2)
         self.log.setFont(font)
-        return self.log
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.table)
+        splitter.addWidget(self.details)
+        splitter.addWidget(self.log)
+        splitter.setSizes([300, 100, 50])
+        return splitter
+
+    def _ui_page_row(self):
+        hbox = QHBoxLayout()
+        self.count_label = QLabel()
+        hbox.addWidget(self.count_label)
+        hbox.addStretch()
+
+        self.newest_btn = QPushButton("Newest")
+        self.newest_btn.clicked.connect(lambda _: self._show_page(self.model.newest))
+        self.newer_btn = QPushButton("< &Newer")
+        self.newer_btn.clicked.connect(lambda _: self._show_page(self.model.newer))
+        self.page_label = QLabel()
+        self.older_btn = QPushButton("&Older >")
+        self.older_btn.clicked.connect(lambda _: self._show_page(self.model.older))
+        for widget in (self.newest_btn, self.newer_btn, self.page_label, self.older_btn):
+            hbox.addWidget(widget)
+        return hbox
 
     def _ui_bottom_row(self):
         hbox = QHBoxLayout()
         buttons = QDialogButtonBox(Qt.Horizontal, self)
 
-        # Button to export changelog to a CSV file
-        export_btn = buttons.addButton("&Export full history",
+        # Button to show the batch of changes that the selected change was made in
+        batch_btn = buttons.addButton("Show &batch",
+                                      QDialogButtonBox.ActionRole)
+        batch_btn.setToolTip("Show all the changes made along with the selected change")
+        batch_btn.clicked.connect(lambda _: self.onShowBatch())
+
+        # Button to revert the changes shown by the filters
+        revert_btn = buttons.addButton("&Revert...",
                                        QDialogButtonBox.ActionRole)
-        export_btn.setToolTip("Export full history to CSV")
+        revert_btn.setToolTip("Restore the fields changed by the changes shown to their content before them")
+        revert_btn.clicked.connect(lambda _: self.onRevert())
+
+        # Button to export changelog to a CSV or JSON Lines file
+        export_btn = buttons.addButton("&Export...",
+                                       QDialogButtonBox.ActionRole)
+        export_btn.setToolTip("Export the changes shown by the filters, or the full history when there are none, "
+                              "to CSV or JSON Lines")
         export_btn.clicked.connect(lambda _: self.onExport())
 
         # Button to close this dialog
         close_btn = buttons.addButton("&Close",
                                       QDialogButtonBox.RejectRole)
-        close_btn.clicked.connect(self.close)
+        close_btn.clicked.connect(self.reject)
 
         hbox.addWidget(buttons)
         return hbox
 
-    def fillLog(self):
+    def _query(self):
+        """Returns the ChangeLogQuery for the filters entered, or None when there are none"""
+        def text(widget):
+            return widget.text().strip() or None
+
+        def number(widget, name):
+            value = text(widget)
+            if value is None:
+                return None
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError("{} must be a number, got {!r}".format(name, value))
+
+        def time(widget):
+            value = text(widget)
+            return parse_time(value) if value is not None else None
+
+        query = ChangeLogQuery(nid=number(self.nid_filter, "nid"), fld=text(self.field_filter),
+                               op=self.op_filter.currentText().strip() or None,
+                               init_ts=number(self.batch_filter, "Batch"),
+                               start_ts=time(self.start_filter), end_ts=time(self.end_filter))
+        return query if any(value is not None for value in query) else None
+
+    def onFilter(self):
+        try:
+            query = self._query()
+        except ValueError as e:
+            tooltip(str(e), parent=self)
+            return
+        self.model.set_query(query)
+        self._update_counts()
+
+    def onClearFilter(self):
+        self._clear_filters()
+        self.onFilter()
+
+    def _clear_filters(self):
+        for widget in (self.nid_filter, self.field_filter, self.batch_filter, self.start_filter, self.end_filter):
+            widget.clear()
+        self.op_filter.setCurrentIndex(0)
+
+    def onShowBatch(self):
+        index = self.table.currentIndex()
+        if not index.isValid():
+            tooltip("Select a change first", parent=self)
+            return
+        init_ts = self.model.rows[index.row()][2]
+        self._clear_filters()
+        self.batch_filter.setText(str(init_ts))
+        self.onFilter()
+
+    def onRevert(self):
         append_to_log = self.log.appendPlainText
-        self.has_records = False
-        for rec in reversed(self.changelog.db.all("""
-                select op, ts, nid, fld, old, new from changelog
-                order by ts desc
-                limit {}
-                """.format(self.display_limit))):
-            self.has_records = True
-            op, ts, nid, fld, old, new = rec
-            dt = datetime.datetime.utcfromtimestamp(ts / 1000)
-            ts_formatted = dt.strftime("%Y-%m-%dT%H:%M:%S")
-
-            append_to_log("""{} [{}] Change {} of nid {}:\n{}\n=>\n{}\n""".format(
-                ts_formatted, op, fld, nid, old, new))
-
-        # Ensure QPlainTextEdit refreshes (not clear why this is necessary)
-        self.log.repaint()
+
+        query = self.model.query
+        if query is None:
+            tooltip("Filter the changes to revert first, such as with Show batch", parent=self)
+            return
+
+        try:
+            col = self.browser.mw.col
+            plan = plan_revert(col.db, col.models, self.changelog, query)
+            for conflict in plan.conflicts[:MAX_CONFLICTS_LOGGED]:
+                append_to_log("Skipping {} of nid {}, which was {} since it was changed".format(
+                    conflict.field, conflict.nid, "deleted" if conflict.current is None else "modified"))
+            if len(plan.conflicts) > MAX_CONFLICTS_LOGGED:
+                append_to_log("Skipping {} more fields".format(len(plan.conflicts) - MAX_CONFLICTS_LOGGED))
+
+            nids = plan.nids()
+            if not nids:
+                tooltip("Nothing to revert", parent=self)
+                return
+
+            message = "{} fields of {} notes will be reverted".format(len(plan.changes), len(nids))
+            if plan.conflicts:
+                message += ", skipping {} fields modified since".format(len(plan.conflicts))
+            append_to_log(message)
+            if not askUser("{}.  Are you sure you want to do this?".format(message), parent=self):
+                append_to_log("User aborted revert")
+                return
+
+            self.browser.mw.checkpoint("Revert ({} {})".format(len(nids), "notes" if len(nids) > 1 else "note"))
+            self.browser.model.beginReset()
+            try:
+                # All the notes are updated within the checkpoint's transaction, so undo reverts them
+                init_ts = int(time.time() * 1000)
+                apply_revert(col.db, self.changelog, plan, init_ts, usn=col.usn())
+                col.updateFieldCache(nids)
+                col.genCards(nids)
+            finally:
+                self.browser.mw.requireReset()
+                self.browser.model.endReset()
+
+            append_to_log("Reverted {} fields of {} notes as batch {}".format(len(plan.changes), len(nids), init_ts))
+            self.model.newest()
+            self._update_counts()
+        except Exception:
+            append_to_log("Failed while reverting:\n{}".format(traceback.format_exc()))
+
+    def reject(self):
+        # Called for the Close button, Escape and the window's close button alike.  Stops the change log's
+        # writer, which reverts start.  Any failure to write was already reported by the revert.
+        try:
+            self.changelog.close()
+        except Exception:
+            pass
+        super().reject()
+
+    def _show_page(self, load_page):
+        load_page()
+        self._update_page()
+
+    def _update_counts(self):
+        self.count_label.setText("{} updates".format(self.changelog.count(self.model.query)))
+        self._update_page()
+
+    def _update_page(self):
+        self.details.clear()
+        self.page_label.setText("Page {}".format(self.model.pager.page_number))
+        self.newest_btn.setEnabled(self.model.pager.has_newer)
+        self.newer_btn.setEnabled(self.model.pager.has_newer)
+        self.older_btn.setEnabled(self.model.pager.has_older)
 
     def onExport(self):
         append_to_log = self.log.appendPlainText
 
-        if not self.has_records:
-            tooltip("Log is empty")
+        # Exports the changes shown by the filters, or the full history when there are none
+        query = self.model.query
+        if not self.model.rows:
+            tooltip("Log is empty" if query is None else "No changes match the filters")
             return
 
         try:
-            ext = ".csv"
             default_path = QStandardPaths.writableLocation(QStandardPaths.DocumentsLocation)
-            path = os.path.join(default_path, f"changes{ext}")
+            path = os.path.join(default_path, "changes.csv")
 
             options = QFileDialog.Options()
 
@@ -119,41 +308,31 @@ class ChangeLogDialog(QDialog):
             # we'll confirm ourselves
             options |= QFileDialog.DontConfirmOverwrite
 
+            name_filters = [(name, extension) for name, (extension, _) in zip(EXPORT_NAMES, EXPORT_EXTENSIONS)]
             result = QFileDialog.getSaveFileName(
-                self, "Save CSV", path, f"CSV (*{ext})",
+                self, "Export Changes", path,
+                ";;".join("{} (*{})".format(name, extension) for name, extension in name_filters),
                 options=options)
 
             if not isinstance(result, tuple):
                 raise Exception("Expected a tuple from save dialog")
-            file = result[0]
+            file, selected_filter = result
             if file:
                 do_save = True
-                if not file.lower().endswith(ext):
-                    file += ext
+                try:
+                    export_format(file)
+                except ValueError:
+                    # Adds the extension of the format selected in the dialog
+                    file += next((extension for name, extension in name_filters
+                                  if selected_filter.startswith(name + " (")), ".csv")
                 if os.path.exists(file):
                     if not askUser("{} already exists. Are you sure you want to overwrite it?".format(file),
                                    parent=self):
                         do_save = False
                 if do_save:
-                    append_to_log("Saving to {}".format(file))
-                    with open(file, "w", encoding="utf-8") as outf:
-                        field_names = ["ts", "op", "nid", "fld", "old", "new"]
-                        writer = csv.DictWriter(outf, fieldnames=field_names)
-                        writer.writeheader()
-                        for rec in self.changelog.db.all("""
-                                select op, ts, nid, fld, old, new from changelog
-                                order by ts asc
-                                """):
-                            op, ts, nid, fld, old, new = rec
-                            writer.writerow({
-                                "op": op,
-                                "ts": ts,
-                                "nid": nid,
-                                "fld": fld,
-                                "old": old,
-                                "new": new
-                            })
-
-                    append_to_log("Done")
+                    append_to_log("Saving {} to {}".format(
+                        "full history" if query is None else "filtered changes", file))
+                    count = export_changes(self.changelog, file, query)
+                    append_to_log("Done, saved {} changes".format(count))
         except Exception:
-            append_to_log("Failed while writing CSV:\n{}".format(traceback.format_exc()))
+            append_to_log("Failed while exporting:\n{}".format(traceback.format_exc()))
@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from ..text.furigana import clean_redundant_furigana
+from ..text.pipeline import FURIGANA
 from .base import TextCleanerDialogBase
 
 
@@ -21,10 +21,8 @@ class JapaneseRedundantFuriganaFixerDialog(TextCleanerDialogBase):
 
     def __init__(self, browser, nids):
         super().__init__(browser, nids,
-                         "Choose the field below to check for redundancy",
+                         "Check the fields of each note type below to look for redundant furigana",
                          "Check Redundant Furigana in Selected Notes")
         self.op = "clean_furigana"
+        self.cleaner = FURIGANA
         self.checkpoint_name = "fix japanese furigana"
-
-    def clean_content(self, content, output_html_diff=False):
-        return clean_redundant_furigana(content, output_html_diff)
@@ -0,0 +1,180 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+from aqt.qt import QAbstractItemView, QAbstractTableModel, QHeaderView, QModelIndex, Qt, QTableView
+
+from ..db.change_log import PAGE_SIZE, row_key
+from ..results import PREVIEW_CHARS, KeysetPager, one_line_preview
+
+
+class ScanResultsModel(QAbstractTableModel):
+    """
+    Table of the note fields that need to be updated or failed to be processed.  Rows refer to the scan's
+    (NoteField, CleanOutcome) pairs, so the text for a row is only rendered when the row is shown.
+    """
+
+    HEADERS = ["nid", "Field", "Change"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows = []
+        self.endResetModel()
+
+    def add(self, scanned):
+        """Adds the fields from the (NoteField, CleanOutcome) pairs that need updating or failed"""
+        rows = [(note_field, outcome) for note_field, outcome in scanned
+                if outcome.error is not None or outcome.result.changed]
+        if rows:
+            self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        note_field, outcome = self.rows[index.row()]
+        if index.column() == 0:
+            return str(note_field.nid)
+        elif index.column() == 1:
+            return note_field.field
+        if outcome.error is not None:
+            return one_line_preview("Failed: {}".format(outcome.error))
+        return one_line_preview(outcome.result.text_diff())
+
+    def details(self, row):
+        """Full text shown for the row when it is selected"""
+        note_field, outcome = self.rows[row]
+        if outcome.error is not None:
+            return "{} of nid {} failed to be processed: {}\n\n{}".format(
+                note_field.field, note_field.nid, outcome.error, note_field.content)
+        return "{} of nid {}:\n{}\n=>\n{}".format(
+            note_field.field, note_field.nid, note_field.content, outcome.result.cleaned)
+
+
+class ChangeLogModel(QAbstractTableModel):
+    """
+    Table of a page of the changes selected from the change log, most recent first.  Pages are read with
+    keyset pagination so they load quickly however large the change log is, with the full old and new
+    values read only for the selected row.
+    """
+
+    HEADERS = ["Time", "Op", "nid", "Field", "Change"]
+
+    def __init__(self, changelog, parent=None):
+        super().__init__(parent)
+        self.changelog = changelog
+        self.query = None
+        self.pager = KeysetPager(
+            lambda before, after, limit: changelog.page(self.query, before=before, after=after, limit=limit,
+                                                        preview_chars=PREVIEW_CHARS),
+            row_key, page_size=PAGE_SIZE)
+        self.pager.newest()
+
+    @property
+    def rows(self):
+        return self.pager.rows
+
+    def set_query(self, query):
+        """Shows the newest page of the changes selected by the ChangeLogQuery"""
+        self.query = query
+        self._load(self.pager.newest)
+
+    def newest(self):
+        self._load(self.pager.newest)
+
+    def older(self):
+        self._load(self.pager.older)
+
+    def newer(self):
+        self._load(self.pager.newer)
+
+    def _load(self, load_page):
+        self.beginResetModel()
+        try:
+            load_page()
+        finally:
+            self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        _, op, _, ts, nid, fld, old, new = self.rows[index.row()]
+        column = index.column()
+        if column == 0:
+            return format_ts(ts)
+        elif column == 1:
+            return op
+        elif column == 2:
+            return str(nid)
+        elif column == 3:
+            return fld
+        return one_line_preview("{} => {}".format(one_line_preview(old), one_line_preview(new)))
+
+    def details(self, row):
+        """Full text shown for the row when it is selected"""
+        change_id, op, init_ts, ts, nid, fld, _, _ = self.rows[row]
+        old, new = self.changelog.get_values(change_id)
+        return "{} [{} batch {}] Change {} of nid {}:\n{}\n=>\n{}".format(
+            format_ts(ts), op, init_ts, fld, nid, old, new)
+
+
+def format_ts(ts):
+    """Formats a change log timestamp in ms"""
+    return datetime.datetime.utcfromtimestamp(ts / 1000).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def results_table(model, on_select):
+    """
+    Returns a QTableView for the model.  Rows have a fixed height so that only the rows scrolled into
+    view are rendered.  on_select is called with the model's details for a row when it is selected.
+    """
+    table = QTableView()
+    table.setModel(model)
+    table.setSelectionBehavior(QAbstractItemView.SelectRows)
+    table.setSelectionMode(QAbstractItemView.SingleSelection)
+    table.setWordWrap(False)
+    table.verticalHeader().hide()
+    table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+    table.horizontalHeader().setStretchLastSection(True)
+    table.selectionModel().currentRowChanged.connect(
+        lambda current, _: on_select(model.details(current.row()) if current.isValid() else ""))
+    return table
@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from ..text.spacing import clean_spaces
+from ..text.pipeline import SPACING
 from .base import TextCleanerDialogBase
 
 
@@ -21,10 +21,8 @@ class JapaneseSpacingFixerDialog(TextCleanerDialogBase):
 
     def __init__(self, browser, nids):
         super().__init__(browser, nids,
-                         "Choose the field below to check for spacing",
+                         "Check the fields of each note type below to look for spacing",
                          "Check Spacing in Selected Notes")
         self.op = "clean_spaces"
+        self.cleaner = SPACING
         self.checkpoint_name = "fix japanese spacing"
-
-    def clean_content(self, content, output_html_diff=False):
-        return clean_spaces(content, output_html_diff)
@@ -0,0 +1,52 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import traceback
+
+from aqt.qt import QThread, pyqtSignal
+
+
+class CleanWorker(QThread):
+    """
+    Cleans the pending notes of a Rescan in chunks off the main thread.  The notes are read from the
+    collection before the worker starts, so the worker never touches the collection.  Each cleaned chunk
+    is sent to the main thread with the chunk_cleaned signal.
+    """
+
+    chunk_cleaned = pyqtSignal(object)
+
+    def __init__(self, rescan, workers, chunk_size, parent=None):
+        super().__init__(parent)
+        self.rescan = rescan
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cancelled = False
+        self.error = None
+
+    def cancel(self):
+        """Stops the worker once the chunk being cleaned is done"""
+        self.cancelled = True
+
+    def run(self):
+        chunks = self.rescan.clean_chunks(self.workers, self.chunk_size)
+        try:
+            for chunk in chunks:
+                self.chunk_cleaned.emit(chunk)
+                if self.cancelled:
+                    break
+        except Exception:
+            self.error = traceback.format_exc()
+        finally:
+            # Shuts down any worker processes when stopping early
+            chunks.close()
@@ -0,0 +1,130 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import html
+import os
+import re
+from urllib.parse import quote
+
+DIFF_PRE = """<html>
+<head>
+<meta charset="utf-8">
+<style>
+p {
+    font-family: "Lucida Console", Monaco, monospace;
+}
+ins {
+    background-color: lightgreen;
+    text-decoration: none;
+}
+del {
+    background-color: lightpink;
+    text-decoration: none;
+}
+</style>
+</head>
+<body>"""
+
+DIFF_POST = """</body>
+</html>
+"""
+
+# Number of fields in each page of a diff report
+PAGE_SIZE = 1000
+
+_PAGE_NAME_RE = re.compile(r"page_\d{4,}\.html")
+
+
+class DiffReportWriter:
+    """
+    Writes the HTML diffs of note fields to disk as they are added, split into pages of page_size fields.
+    The index page is written to path once the report is closed, with a link to each page and the number
+    of fields on it.  The pages are written to a directory next to the index page, from which any pages of
+    an earlier report are removed.
+    """
+
+    def __init__(self, path, page_size=PAGE_SIZE):
+        self.path = path
+        self.page_size = page_size
+        stem = os.path.splitext(os.path.basename(path))[0]
+        self.pages_dir_name = "{}_pages".format(stem)
+        self.pages_dir = os.path.join(os.path.dirname(path), self.pages_dir_name)
+        self.page_counts = []
+        self.count = 0
+        self._page = None
+        self._remove_old_pages()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def page_name(self, page_number):
+        return "page_{:04d}.html".format(page_number)
+
+    def add(self, nid, field, result):
+        """Writes the diff of the CleanResult of the note's field"""
+        if self._page is not None and self.page_counts[-1] == self.page_size:
+            self._finish_page(has_next=True)
+        if self._page is None:
+            self._start_page()
+        self._page.write("<p>nid {} {}:</p>\n".format(nid, html.escape(field)))
+        self._page.write("<p>{}</p>\n".format(result.html_diff()))
+        self.page_counts[-1] += 1
+        self.count += 1
+
+    def close(self):
+        """Finishes the last page and writes the index page"""
+        if self._page is not None:
+            self._finish_page(has_next=False)
+        with open(self.path, "w", encoding="utf-8") as outf:
+            outf.write(DIFF_PRE)
+            outf.write("<p>{} fields need updating</p>\n".format(self.count))
+            for page_number, count in enumerate(self.page_counts, 1):
+                outf.write('<p><a href="{}/{}">Page {}</a>: {} fields</p>\n'.format(
+                    quote(self.pages_dir_name), self.page_name(page_number), page_number, count))
+            outf.write(DIFF_POST)
+
+    def _remove_old_pages(self):
+        # A shorter report written to the same path would otherwise leave the later pages of the earlier one
+        if os.path.isdir(self.pages_dir):
+            for name in os.listdir(self.pages_dir):
+                if _PAGE_NAME_RE.fullmatch(name):
+                    os.remove(os.path.join(self.pages_dir, name))
+
+    def _start_page(self):
+        os.makedirs(self.pages_dir, exist_ok=True)
+        self.page_counts.append(0)
+        self._page = open(os.path.join(self.pages_dir, self.page_name(len(self.page_counts))), "w",
+                          encoding="utf-8")
+        self._page.write(DIFF_PRE)
+        self._page.write(self._navigation(has_next=False))
+
+    def _finish_page(self, has_next):
+        self._page.write(self._navigation(has_next))
+        self._page.write(DIFF_POST)
+        self._page.close()
+        self._page = None
+
+    def _navigation(self, has_next):
+        # Links to the index and the neighboring pages.  Whether there is a next page is only known
+        # once the page is finished, so only the links at the bottom of the page include it.
+        page_number = len(self.page_counts)
+        links = ['<a href="../{}">Index</a>'.format(quote(os.path.basename(self.path)))]
+        if page_number > 1:
+            links.append('<a href="{}">Previous</a>'.format(self.page_name(page_number - 1)))
+        if has_next:
+            links.append('<a href="{}">Next</a>'.format(self.page_name(page_number + 1)))
+        return "<p>Page {}: {}</p>\n".format(page_number, " | ".join(links))
@@ -0,0 +1,76 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Exports changes from the change log to CSV or JSON Lines files, optionally compressed with gzip.  The
+changes are streamed from the database to the file, so exporting years of history takes no more memory
+than exporting a single batch.
+"""
+
+import csv
+import gzip
+import json
+
+# Columns of CSV exports and keys of JSON Lines exports
+EXPORT_FIELDS = ["ts", "op", "nid", "fld", "old", "new"]
+
+# Extension => (format, gzip compressed) of each kind of export
+EXPORT_EXTENSIONS = [
+    (".csv", ("csv", False)),
+    (".csv.gz", ("csv", True)),
+    (".jsonl", ("jsonl", False)),
+    (".jsonl.gz", ("jsonl", True)),
+]
+
+
+def export_format(path):
+    """Returns (format, gzip compressed) for the path's extension, raising ValueError if it isn't known"""
+    lower_path = path.lower()
+    for extension, export in EXPORT_EXTENSIONS:
+        if lower_path.endswith(extension):
+            return export
+    raise ValueError("Expected a file ending with one of {}, got {}".format(
+        ", ".join(extension for extension, _ in EXPORT_EXTENSIONS), path))
+
+
+def export_changes(changelog, path, query=None):
+    """
+    Writes the changes selected by the ChangeLogQuery, or all of them, to the file in the order they were
+    made, in the format given by its extension.  Returns the number of changes written.
+    """
+    export, compressed = export_format(path)
+    write = _write_csv if export == "csv" else _write_jsonl
+    opener = gzip.open if compressed else open
+    with opener(path, "wt", encoding="utf-8", newline="") as outf:
+        return write(outf, changelog.iter_changes(query))
+
+
+def _write_csv(outf, changes):
+    writer = csv.writer(outf)
+    writer.writerow(EXPORT_FIELDS)
+    count = 0
+    for op, ts, nid, fld, old, new in changes:
+        writer.writerow([ts, op, nid, fld, old, new])
+        count += 1
+    return count
+
+
+def _write_jsonl(outf, changes):
+    count = 0
+    for op, ts, nid, fld, old, new in changes:
+        outf.write(json.dumps({"ts": ts, "op": op, "nid": nid, "fld": fld, "old": old, "new": new},
+                              ensure_ascii=False))
+        outf.write("\n")
+        count += 1
+    return count
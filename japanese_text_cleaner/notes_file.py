@@ -0,0 +1,68 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import itertools
+from collections import namedtuple
+
+# Header of a notes file exported from Anki as plain text: the "#key:value" lines at the top of the file, the
+# delimiter between fields and the names of the columns when the header gives them
+NotesFileHeader = namedtuple("NotesFileHeader", ["lines", "delimiter", "columns"])
+
+# Delimiters by the names Anki uses for them in the "#separator:" header line
+SEPARATORS = {"tab": "\t", "comma": ",", "semicolon": ";", "space": " ", "pipe": "|", "colon": ":"}
+
+
+def read_notes_file(inf, default_delimiter="\t"):
+    """
+    Reads the header of a notes file exported from Anki as plain text, such as with Export -> Notes in
+    Plain Text.  inf must be opened with newline="".  Returns the NotesFileHeader and an iterator over the
+    rows of fields, which reads the rest of the file as it goes.
+    """
+    lines = []
+    line = inf.readline()
+    while line.startswith("#"):
+        lines.append(line)
+        line = inf.readline()
+    settings = dict(header_line[1:].rstrip("\r\n").split(":", 1) for header_line in lines if ":" in header_line)
+    separator = settings.get("separator")
+    delimiter = SEPARATORS.get(separator, separator if separator and len(separator) == 1 else default_delimiter)
+    columns = settings["columns"].split(delimiter) if "columns" in settings else None
+    rows = csv.reader(itertools.chain([line] if line else [], inf), delimiter=delimiter)
+    return NotesFileHeader(lines, delimiter, columns), rows
+
+
+def column_indices(header, fields):
+    """
+    Returns the index of each of the fields, given either as the name of a column listed in the header or as
+    a column number counting from 1.  Raises ValueError for any other field.
+    """
+    indices = []
+    for field in fields:
+        if header.columns is not None and field in header.columns:
+            indices.append(header.columns.index(field))
+        elif field.isdigit() and int(field) > 0:
+            indices.append(int(field) - 1)
+        else:
+            raise ValueError("{} is not a column of the file".format(field))
+    return indices
+
+
+def write_notes_file(outf, header):
+    """
+    Writes the header lines to a notes file opened with newline="", returning a csv writer for the rows that
+    uses the same delimiter.
+    """
+    outf.writelines(header.lines)
+    return csv.writer(outf, delimiter=header.delimiter, lineterminator="\n")
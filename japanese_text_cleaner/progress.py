@@ -0,0 +1,69 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+
+
+class Progress:
+    """
+    Tracks progress through a number of notes, estimating the rate and the time remaining.  unit names
+    what is counted when shown.  total is None when the number is not known up front.
+    """
+
+    def __init__(self, total, unit="notes", clock=time.monotonic):
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.clock = clock
+        self.start = clock()
+        self.elapsed = 0.0
+
+    def update(self, count):
+        """Records that count more notes are done"""
+        self.done += count
+        self.elapsed = self.clock() - self.start
+
+    @property
+    def rate(self):
+        """Notes per second so far, or None before any notes are done"""
+        if not self.done or not self.elapsed:
+            return None
+        return self.done / self.elapsed
+
+    @property
+    def remaining(self):
+        """Estimated seconds until all the notes are done, or None when there is no estimate yet"""
+        rate = self.rate
+        if rate is None or self.total is None:
+            return None
+        return (self.total - self.done) / rate
+
+    def __str__(self):
+        if self.total is None:
+            msg = "{} {}".format(self.done, self.unit)
+        else:
+            msg = "{} of {} {}".format(self.done, self.total, self.unit)
+        if self.rate is not None:
+            msg += " ({:.0f} {}/sec".format(self.rate, self.unit)
+            if self.remaining is not None:
+                msg += ", {} remaining".format(_format_seconds(self.remaining))
+            msg += ")"
+        return msg
+
+
+def _format_seconds(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return "{}s".format(seconds)
+    return "{}m {:02d}s".format(seconds // 60, seconds % 60)
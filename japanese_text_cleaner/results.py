@@ -0,0 +1,88 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+
+# Number of characters shown for a row of a results table
+PREVIEW_CHARS = 200
+
+
+def one_line_preview(text, limit=PREVIEW_CHARS):
+    """Shortens the text to a single line of at most limit characters for display in a table row"""
+    if len(text) > limit:
+        text = text[:limit - 1] + "…"
+    return text.replace("\r", "").replace("\n", "⏎")
+
+
+class KeysetPager:
+    """
+    Pages through rows ordered newest first using keyset pagination, so loading a page takes the same time
+    however many pages come before it.  fetch_page(before, after, limit) returns up to limit rows, newest
+    first, that are the newest rows older than the row key before, the oldest rows newer than the row key
+    after, or else the newest rows.  row_key returns the key of a row.
+    """
+
+    def __init__(self, fetch_page, row_key, page_size=500):
+        self.fetch_page = fetch_page
+        self.row_key = row_key
+        self.page_size = page_size
+        self.rows = []
+        self.page_number = 0
+        self.has_newer = False
+        self.has_older = False
+
+    def newest(self):
+        """Loads the page of the newest rows"""
+        rows = self.fetch_page(None, None, self.page_size + 1)
+        self.rows = rows[:self.page_size]
+        self.page_number = 1
+        self.has_newer = False
+        self.has_older = len(rows) > self.page_size
+
+    def older(self):
+        """Loads the page after the current one, returning whether there was one"""
+        if not self.has_older:
+            return False
+        rows = self.fetch_page(self.row_key(self.rows[-1]), None, self.page_size + 1)
+        self.rows = rows[:self.page_size]
+        self.page_number += 1
+        self.has_newer = True
+        self.has_older = len(rows) > self.page_size
+        return True
+
+    def newer(self):
+        """Loads the page before the current one, returning whether there was one"""
+        if not self.has_newer:
+            return False
+        rows = self.fetch_page(None, self.row_key(self.rows[0]), self.page_size + 1)
+        self.rows = rows[-self.page_size:]
+        self.page_number -= 1
+        self.has_newer = len(rows) > self.page_size
+        self.has_older = True
+        return True
+
+
+def parse_time(text):
+    """
+    Parses a UTC time entered as YYYY-MM-DD, optionally followed by THH:MM or THH:MM:SS, into a timestamp
+    in ms, as shown by the change log.  Raises ValueError if the text is not in one of these formats.
+    """
+    text = text.strip()
+    for time_format in ("%Y-%m-%d", "%Y-%m-%dT%H:%M", "%Y-%m-%dT%H:%M:%S"):
+        try:
+            parsed = datetime.datetime.strptime(text, time_format)
+        except ValueError:
+            continue
+        return int(parsed.replace(tzinfo=datetime.timezone.utc).timestamp() * 1000)
+    raise ValueError("Expected a time like 2019-07-10 or 2019-07-10T18:30, got {!r}".format(text))
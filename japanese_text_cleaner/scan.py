@@ -0,0 +1,195 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from .db.notes import fetch_note_fields, fetch_note_mods
+from .text.batch import clean_many
+from .text.parallel import MIN_PARALLEL_CHARS
+
+# Number of notes cleaned at a time between checks for cancellation and progress updates
+CHUNK_SIZE = 1000
+
+
+class NoteScan:
+    """
+    Outcome of cleaning fields of some notes.  Holds a (NoteField, CleanOutcome) pair for each field
+    of each note having the fields, grouped by note in the order the notes were selected.
+    """
+
+    def __init__(self, cleaner_name, indices, scanned):
+        self.cleaner_name = cleaner_name
+        self.indices = indices
+        self.scanned = OrderedDict()
+        for note_field, outcome in scanned:
+            self.scanned.setdefault(note_field.nid, []).append((note_field, outcome))
+
+    def __iter__(self):
+        return (pair for pairs in self.scanned.values() for pair in pairs)
+
+    def __len__(self):
+        return sum(len(pairs) for pairs in self.scanned.values())
+
+    @property
+    def note_count(self):
+        return len(self.scanned)
+
+    def matches(self, cleaner, indices):
+        """Whether the scan was made for the same fields of the same note types with the same cleaner"""
+        return cleaner.name == self.cleaner_name and indices == self.indices
+
+
+class Rescan:
+    """
+    Brings a previous scan of the notes up to date in steps, so that cleaning the notes can happen apart
+    from reading them.  Only notes whose mod time changed since the previous scan are read and cleaned
+    again.  The whole selection is read when there is no previous scan or it was made for different
+    fields or a different cleaner.  indices maps mid => ((field name, index), ...) of the fields to clean
+    for each note type, as returned by field_indices.
+
+    When given a CleanState, fields found clean since their notes were last modified are skipped, and notes
+    with all of their fields found clean are not read at all.
+    """
+
+    def __init__(self, db, scan, nids, indices, cleaner, clean_state=None):
+        self.nids = nids
+        self.indices = indices
+        self.cleaner = cleaner
+        self.cleaned = []
+        self.reused = []
+        self.skipped = 0
+        self.skipped_notes = 0
+        self.scan = scan if scan is not None and scan.matches(cleaner, indices) else None
+        if self.scan is None and clean_state is None:
+            self.mods = None
+            self.pending = fetch_note_fields(db, nids, indices)
+        else:
+            self.mods = fetch_note_mods(db, nids, indices)
+            clean = clean_state.clean_mods(cleaner, list(self.mods)) if clean_state is not None else {}
+            stale = []
+            for nid in nids:
+                if nid not in self.mods:
+                    continue
+                mid, mod = self.mods[nid]
+                previous = self.scan.scanned.get(nid) if self.scan is not None else None
+                if previous is not None and previous[0][0].mod == mod:
+                    self.reused.extend(previous)
+                    continue
+                known_clean = sum(1 for name, _ in indices[mid] if clean.get((nid, name)) == mod)
+                self.skipped += known_clean
+                if known_clean == len(indices[mid]):
+                    self.skipped_notes += 1
+                else:
+                    stale.append(nid)
+            self.pending = [note_field for note_field in fetch_note_fields(db, stale, indices)
+                            if clean.get((note_field.nid, note_field.field)) != note_field.mod]
+
+    def clean_chunks(self, workers=1, chunk_size=CHUNK_SIZE, min_parallel_chars=MIN_PARALLEL_CHARS):
+        """
+        Cleans the pending fields, yielding a list of (NoteField, CleanOutcome) pairs for each chunk.
+        When using multiple workers, the same pool of processes is used for all the chunks.  The workers
+        are only used when the pending fields hold at least min_parallel_chars characters in all, since a
+        chunk of short fields rarely holds enough on its own.
+        """
+        if sum(len(note_field.content) for note_field in self.pending[len(self.cleaned):]) < min_parallel_chars:
+            workers = 1
+        # The pool is started once for all the chunks, so each is cleaned by the workers however small
+        chunks = clean_note_fields((self.pending[start:start + chunk_size]
+                                    for start in range(len(self.cleaned), len(self.pending), chunk_size)),
+                                   self.cleaner, workers, min_parallel_chars=0)
+        try:
+            for chunk in chunks:
+                self.cleaned.extend(chunk)
+                yield chunk
+        finally:
+            chunks.close()
+
+    def finish(self):
+        """Returns the NoteScan once all the pending fields are cleaned"""
+        if len(self.cleaned) != len(self.pending):
+            raise ValueError("Only {} of {} fields were cleaned".format(len(self.cleaned), len(self.pending)))
+        if self.scan is not None and not self.cleaned and len(self.reused) == len(self.scan):
+            return self.scan
+        scanned = OrderedDict()
+        for note_field, outcome in self.reused + self.cleaned:
+            scanned.setdefault(note_field.nid, []).append((note_field, outcome))
+        return NoteScan(self.cleaner.name, self.indices,
+                        (pair for nid in self.nids for pair in scanned.get(nid, ())))
+
+
+def clean_note_fields(chunks, cleaner, workers=1, min_parallel_chars=MIN_PARALLEL_CHARS):
+    """
+    Cleans each list of NoteFields from chunks, yielding a list of (NoteField, CleanOutcome) pairs for each.
+    Chunks are only read as they are needed, so they can be streamed.  When using multiple workers, the same
+    pool of processes is used for all the chunks holding at least min_parallel_chars characters.
+    """
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for note_fields in chunks:
+            outcomes = clean_many([note_field.content for note_field in note_fields], cleaner,
+                                  workers=workers, executor=executor, min_parallel_chars=min_parallel_chars)
+            yield list(zip(note_fields, outcomes))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+class ScanSummary:
+    """Counts of the outcomes of cleaning fields, added a chunk of (NoteField, CleanOutcome) pairs at a time"""
+
+    def __init__(self, scanned=()):
+        self.nids = set()
+        self.checked = 0
+        self.rejected = 0
+        self.failed = 0
+        self.need_clean = 0
+        self.add(scanned)
+
+    def add(self, scanned):
+        for note_field, (result, error, fast_rejected) in scanned:
+            self.nids.add(note_field.nid)
+            self.checked += 1
+            if fast_rejected:
+                self.rejected += 1
+            elif error is not None:
+                self.failed += 1
+            elif result.changed:
+                self.need_clean += 1
+
+    def __str__(self):
+        summary = "Checked {} fields of {} notes ({} skipped by fast check). Found {} fields ({:.0f}%) need to be " \
+                  "updated.".format(self.checked, len(self.nids), self.rejected, self.need_clean,
+                                    0 if not self.checked else 100.0 * self.need_clean / self.checked)
+        if self.failed:
+            summary += " Found {} fields that failed to be processed.".format(self.failed)
+        return summary
+
+
+def scan_notes(db, nids, indices, cleaner, workers=1, clean_state=None):
+    """Reads the fields from each of the notes and cleans them, returning a NoteScan"""
+    return rescan_notes(db, None, nids, indices, cleaner, workers, clean_state)[0]
+
+
+def rescan_notes(db, scan, nids, indices, cleaner, workers=1, clean_state=None):
+    """
+    Brings a previous scan of the notes up to date, recording the fields found clean in clean_state when given.
+    Returns the NoteScan and the number of fields cleaned.
+    """
+    rescan = Rescan(db, scan, nids, indices, cleaner, clean_state)
+    for _ in rescan.clean_chunks(workers):
+        pass
+    if clean_state is not None:
+        clean_state.record_clean(cleaner, rescan.cleaned)
+    return rescan.finish(), len(rescan.cleaned)
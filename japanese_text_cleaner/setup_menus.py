@@ -15,6 +15,7 @@
 from anki.hooks import addHook
 from aqt.utils import tooltip
 
+from .dialogs.all_cleaners import JapaneseAllCleanersFixerDialog
 from .dialogs.change_log import ChangeLogDialog
 from .dialogs.furigana import JapaneseRedundantFuriganaFixerDialog
 from .dialogs.spacing import JapaneseSpacingFixerDialog
@@ -42,6 +43,9 @@ def setup_menus(browser):
     action = submenu.addAction("Furigana Fixer")
     action.triggered.connect(
         lambda _: open_dialog(browser, JapaneseRedundantFuriganaFixerDialog))
+    action = submenu.addAction("All Fixers")
+    action.triggered.connect(
+        lambda _: open_dialog(browser, JapaneseAllCleanersFixerDialog))
     action = submenu.addAction("View Log")
     action.triggered.connect(
         lambda _: open_changelog_dialog(browser))
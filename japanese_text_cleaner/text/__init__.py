@@ -11,3 +11,5 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+
+from .pipeline import ALL_CLEANERS, CLEANERS, FURIGANA, SPACING, CleanerPipeline  # noqa: F401
@@ -0,0 +1,94 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict, namedtuple
+
+from .edits import CleanResult
+from .parallel import MIN_PARALLEL_CHARS, clean_parallel
+
+# Outcome of cleaning some content.  Either result is the CleanResult or error is the
+# TextProcessingError raised while cleaning it.  rejected is True when the cleaner's fast-reject
+# predicate determined the content could not change, so it was never fully processed.
+CleanOutcome = namedtuple("CleanOutcome", ["result", "error", "rejected"])
+
+
+class CleanCache:
+    """Bounded LRU cache of clean outcomes keyed on the cleaner and content"""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        outcome = self._entries.get(key)
+        if outcome is not None:
+            self._entries.move_to_end(key)
+        return outcome
+
+    def put(self, key, outcome):
+        self._entries[key] = outcome
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+# Cache shared by all callers that don't provide their own
+DEFAULT_CACHE = CleanCache()
+
+
+def clean_many(contents, cleaner, sanity_checks=True, cache=None, workers=1, executor=None,
+               min_parallel_chars=MIN_PARALLEL_CHARS):
+    """
+    Cleans each of the contents with the cleaner.  Returns a list of CleanOutcome in the
+    same order as the contents.
+
+    Content the cleaner's may_change predicate rejects is returned unchanged without being
+    processed.  Identical contents are only cleaned once.  Outcomes, including errors, are also
+    kept in a bounded LRU cache so content repeated across calls doesn't need to be cleaned again.
+    The remaining contents are cleaned by clean_parallel using up to workers processes, optionally
+    from an existing executor, once they hold at least min_parallel_chars characters.
+    """
+    # Read twice, so any iterable can be passed
+    contents = list(contents)
+    if cache is None:
+        cache = DEFAULT_CACHE
+    outcomes_by_content = {}
+    pending = []
+    for content in contents:
+        if content in outcomes_by_content or not cleaner.may_change(content):
+            continue
+        outcome = cache.get((cleaner.name, content))
+        outcomes_by_content[content] = outcome
+        if outcome is None:
+            pending.append(content)
+
+    for content, (result, error) in zip(pending, clean_parallel(
+            pending, cleaner, sanity_checks, workers, min_parallel_chars, executor)):
+        outcome = CleanOutcome(result, error, False)
+        cache.put((cleaner.name, content), outcome)
+        outcomes_by_content[content] = outcome
+
+    outcomes = []
+    for content in contents:
+        outcome = outcomes_by_content.get(content)
+        if outcome is None:
+            outcome = CleanOutcome(CleanResult(content, []), None, True)
+        outcomes.append(outcome)
+    return outcomes
@@ -0,0 +1,46 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+class Cleaner:
+    """
+    Base class for text cleaners.  A cleaner can be run on its own or chained with other
+    cleaners in a CleanerPipeline.
+    """
+
+    # Identifies the cleaner.  This is also the operation recorded in the change log.
+    name = None
+
+    # Incremented whenever the cleaner changes what it cleans, so that fields found clean by an earlier
+    # version are checked again.
+    version = 1
+
+    def may_change(self, content):
+        """
+        Cheaply determines whether cleaning could change the content.  If this returns False then
+        cleaning is guaranteed to leave the content unchanged, so it can be skipped entirely.  The
+        content is not validated in that case.
+        """
+        return True
+
+    def clean(self, src, sanity_checks=True):
+        """Cleans the content of a field, returning a CleanResult"""
+        raise NotImplementedError("clean")
+
+    def line_edits(self, tokens, sanity_checks=True):
+        """Returns the edits that clean a single line, given the list of its tokens"""
+        raise NotImplementedError("line_edits")
+
+    def __repr__(self):
+        return "<{} {}>".format(type(self).__name__, self.name)
@@ -0,0 +1,137 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import namedtuple
+
+from .html import del_tag, ins_tag
+
+# Replaces the deleted text found at offset within the source with the inserted text.
+# Either deleted or inserted may be empty.
+Edit = namedtuple("Edit", ["offset", "deleted", "inserted"])
+
+
+class CleanResult:
+    """
+    Result of cleaning some source content, represented as a list of edits to the source.
+    The edits are sorted by offset and do not overlap.  The cleaned content and the diffs
+    are derived from the edits only when needed.
+    """
+
+    def __init__(self, src, edits):
+        self.src = src
+        self.edits = edits
+        self._cleaned = None
+
+    @property
+    def changed(self):
+        return bool(self.edits)
+
+    @property
+    def cleaned(self):
+        if self._cleaned is None:
+            self._cleaned = apply_edits(self.src, self.edits)
+        return self._cleaned
+
+    def html_diff(self):
+        """Cleaned content with deleted text in del tags and inserted text in ins tags"""
+        return self._render(del_tag, ins_tag)
+
+    def text_diff(self):
+        """Cleaned content with deleted text marked as [-text-] and inserted text as {+text+}"""
+        return self._render("[-{}-]".format, "{{+{}+}}".format)
+
+    def _render(self, render_deleted, render_inserted):
+        result = []
+        pos = 0
+        for offset, deleted, inserted in self.edits:
+            result.append(self.src[pos:offset])
+            if deleted:
+                result.append(render_deleted(deleted))
+            if inserted:
+                result.append(render_inserted(inserted))
+            pos = offset + len(deleted)
+        result.append(self.src[pos:])
+        return "".join(result)
+
+    def __repr__(self):
+        return "CleanResult({!r}, {!r})".format(self.src, self.edits)
+
+
+def apply_edits(src, edits):
+    """Applies the sorted, non-overlapping edits to src"""
+    if not edits:
+        return src
+    result = []
+    pos = 0
+    for offset, deleted, inserted in edits:
+        result.append(src[pos:offset])
+        result.append(inserted)
+        pos = offset + len(deleted)
+    result.append(src[pos:])
+    return "".join(result)
+
+
+def shift_edits(edits, delta):
+    """Moves the edits by delta, such as from offsets within a line to offsets within a field"""
+    return [Edit(offset + delta, deleted, inserted) for offset, deleted, inserted in edits]
+
+
+def compose_edits(src, first, second):
+    """
+    Composes edits so that applying the result to src is the same as applying first and then
+    applying second to that result.  Edits in second that touch text changed by first are merged
+    with those edits.  Other edits are kept as they are.
+    """
+    if not first:
+        return second
+    if not second:
+        return first
+    intermediate = apply_edits(src, first)
+
+    # Spans of each edit within the intermediate text, ordered by start.  Edits from first
+    # span the text they inserted and edits from second span the text they deleted.
+    spans = []
+    delta = 0
+    for edit in first:
+        start = edit.offset + delta
+        spans.append((start, start + len(edit.inserted), 0, edit))
+        delta += len(edit.inserted) - len(edit.deleted)
+    for edit in second:
+        spans.append((edit.offset, edit.offset + len(edit.deleted), 1, edit))
+    spans.sort(key=lambda span: (span[0], span[2]))
+
+    # Group the spans that overlap or touch each other
+    groups = []
+    for span in spans:
+        if groups and span[0] <= groups[-1][1]:
+            groups[-1][1] = max(groups[-1][1], span[1])
+            groups[-1][2].append(span)
+        else:
+            groups.append([span[0], span[1], [span]])
+
+    result = []
+    delta = 0
+    for start, end, group in groups:
+        first_edits = [edit for _, _, stage, edit in group if stage == 0]
+        second_edits = [edit for _, _, stage, edit in group if stage == 1]
+        group_delta = sum(len(edit.inserted) - len(edit.deleted) for edit in first_edits)
+        if not second_edits:
+            result.extend(first_edits)
+        else:
+            src_start = start - delta
+            src_end = end - delta - group_delta
+            inserted = apply_edits(intermediate[start:end], shift_edits(second_edits, -start))
+            result.append(Edit(src_start, src[src_start:src_end], inserted))
+        delta += group_delta
+    return result
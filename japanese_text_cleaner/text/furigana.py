@@ -12,145 +12,200 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import re
-
+from .cleaner import Cleaner
+from .edits import CleanResult, Edit, shift_edits
 from .exceptions import JapaneseReadingFormattingError, TextProcessingUnexpectedError
-from .html import del_tag, ins_tag
-from .split import formatting_aware_split
-from .validation import (valiate_no_spaces_chunk, validate_all_spaces_chunk, validate_chunk_is_html_tag,
-                         validate_japanese_reading_formatting)
+from .split import HTML, SPACES, TEXT, iter_tokens
+from .validation import valiate_no_spaces_chunk, validate_all_spaces_chunk, validate_chunk_is_html_tag
 
 
-def clean_redundant_furigana(src, output_html_diff=False):
+def clean_redundant_furigana(src, sanity_checks=True):
     """
     Cleans redundant furigana from the beginning and end of text.  Any kana at the beginning
     or end of square brackets that match the kana at the beginning or end of the corresponding
     expression that precedes it wll be removed.  The text is adjusted so the square brackets
     correspond to the correct expression after trimming.
+
+    This operates line by line, since a reading only ever belongs to an expression on the same line.
+
+    A JapaneseReadingFormattingError is raised for lines with mismatched brackets.  Setting
+    sanity_checks to False skips the internal checks that guard against programmatic bugs.
     """
-    validate_japanese_reading_formatting(src)
+    return CleanResult(src, furigana_edits(src, sanity_checks)).cleaned
+
+
+def furigana_edits(src, sanity_checks=True):
+    """Returns the edits clean_redundant_furigana makes to src"""
+    edits = []
+    line_offset = 0
+    for line in src.split("\n"):
+        line_edits = furigana_edits_from_tokens(iter_tokens(line, validate=True), sanity_checks)
+        if line_edits:
+            edits.extend(shift_edits(line_edits, line_offset))
+        line_offset += len(line) + 1
+    return edits
+
+
+class FuriganaCleaner(Cleaner):
+    """Cleans redundant furigana from Japanese text.  See clean_redundant_furigana."""
+
+    name = "clean_furigana"
+
+    # Version 1 skipped content with mismatched brackets instead of failing it and cleaned the whole field
+    # at once rather than line by line
+    version = 2
+
+    def may_change(self, content):
+        # Only readings are ever trimmed.  Content with a stray "]" must still be cleaned so that it fails
+        # validation.
+        return "[" in content or "]" in content
 
-    cleaned = []
-    for tt, chunk in formatting_aware_split(src):
-        if not chunk:
-            continue
+    def clean(self, src, sanity_checks=True):
+        return CleanResult(src, furigana_edits(src, sanity_checks))
 
-        if tt == "text":
+    def line_edits(self, tokens, sanity_checks=True):
+        return furigana_edits_from_tokens(tokens, sanity_checks)
+
+
+def furigana_edits_from_tokens(tokens, sanity_checks=True):
+    """Returns the edits that clean redundant furigana, given the tokens for some text"""
+    edits = []
+    offset = 0
+    for tt, chunk in tokens:
+        if tt == TEXT:
             # A chunk with no spaces or html tags.
 
-            valiate_no_spaces_chunk(chunk)
+            if sanity_checks:
+                valiate_no_spaces_chunk(chunk)
 
             new_chunk = _trim_redundant_furigana_from_chunk(chunk)
-            if output_html_diff and chunk != new_chunk:
-                cleaned.append(del_tag(chunk))
-                cleaned.append(ins_tag(new_chunk))
-            else:
-                cleaned.append(new_chunk)
-        elif tt == "html":
-            # a chunk that is an html tag. append this as is.
-            validate_chunk_is_html_tag(chunk)
-            cleaned.append(chunk)
-        elif tt == "spaces":
+            if chunk != new_chunk:
+                edits.append(Edit(offset, chunk, new_chunk))
+        elif tt == HTML:
+            # a chunk that is an html tag. keep this as is.
+            if sanity_checks:
+                validate_chunk_is_html_tag(chunk)
+        elif tt == SPACES:
             # A chunk with only spaces.
-            validate_all_spaces_chunk(chunk)
-            cleaned.append(chunk)
+            if sanity_checks:
+                validate_all_spaces_chunk(chunk)
         else:
             raise TextProcessingUnexpectedError("Unexpected type {}".format(tt))
 
-    return "".join(cleaned)
-
-
-def _trim_redundant_furigana_middle(src):
-    m = re.match(r"""^
-        ([^\[\]]+)
-        \[
-            ([^\[\]]+)
-        \]
-    $""", src, re.VERBOSE)
-    if m:
-        expression, furigana = m.group(1), m.group(2)
-        expression_chars = set(expression)
-        furigana_chars = set(furigana)
-        common_chars = expression_chars.intersection(furigana_chars)
-        if common_chars:
-            pattern = "([" + "".join(common_chars) + "]+)"
-            expression_split = re.split(pattern, expression)
-            furigana_split = re.split(pattern, furigana)
-            if len(expression_split) == len(furigana_split):
-                result = ""
-                success = True
-                for i, chunks in enumerate(zip(expression_split, furigana_split)):
-                    exp_chunk, furi_chunk = chunks
-                    if i % 2 == 0:
-                        # no common chars, so build the reading
-                        if result:
-                            result += " "
-                        result += exp_chunk
-                        result += "["
-                        result += furi_chunk
-                        result += "]"
-                    else:
-                        if exp_chunk == furi_chunk:
-                            # same string, so no reading necessary
-                            result += exp_chunk
-                        else:
-                            success = False
-                            break
-                if success:
-                    return result
-                else:
-                    return src
-            else:
-                return src
+        offset += len(chunk)
+
+    return edits
+
+
+def _trim_redundant_furigana_middle(expression, furigana):
+    """Trims redundant furigana in the middle of an expression, returning the expression with its reading"""
+    if expression:
+        aligned = _align_common_kana(expression, furigana)
+        if aligned is not None:
+            return aligned
+    return expression + "[" + furigana + "]"
+
+
+def _parse_reading(src):
+    """
+    Parses text with a single reading into its expression, furigana, and any extra text following
+    the reading.  Returns None if the text is not of this form.
+    """
+    open_pos = src.find("[")
+    close_pos = src.find("]")
+    if open_pos < 1 or close_pos < open_pos + 2:
+        return None
+    if src.find("[", open_pos + 1) >= 0 or src.find("]", close_pos + 1) >= 0:
+        return None
+    return src[:open_pos], src[open_pos + 1:close_pos], src[close_pos + 1:]
+
+
+def _align_common_kana(expression, furigana):
+    """
+    Aligns the expression and furigana on the characters they have in common, which can be
+    written without a reading.  For example, 世の中[よのなか] is aligned on の to produce
+    世[よ]の 中[なか].  The runs of common characters must be identical and appear in the same
+    order in both.  Returns None if there are no common characters or they can't be aligned.
+    """
+    common = set(expression).intersection(furigana)
+    if not common:
+        return None
+    expression_runs = _split_common_runs(expression, common)
+    furigana_runs = _split_common_runs(furigana, common)
+    if len(expression_runs) != len(furigana_runs):
+        return None
+    result = []
+    for i in range(len(expression_runs)):
+        exp_chunk = expression_runs[i]
+        furi_chunk = furigana_runs[i]
+        if i % 2 == 0:
+            # no common chars, so build the reading
+            if result:
+                result.append(" ")
+            result.append(exp_chunk)
+            result.append("[")
+            result.append(furi_chunk)
+            result.append("]")
+        elif exp_chunk == furi_chunk:
+            # same string, so no reading necessary
+            result.append(exp_chunk)
         else:
-            # No common characters between expression and furigana, no nothing to do.
-            return src
-    else:
-        return src
+            return None
+    return "".join(result)
+
+
+def _split_common_runs(s, common):
+    """
+    Splits the string into runs alternating between characters not in common and characters
+    in common.  The first and last runs are never of common characters, so they may be empty.
+    """
+    runs = []
+    start = 0
+    in_common = False
+    for i, c in enumerate(s):
+        if (c in common) != in_common:
+            runs.append(s[start:i])
+            start = i
+            in_common = not in_common
+    runs.append(s[start:])
+    if in_common:
+        runs.append("")
+    return runs
 
 
 def _trim_redundant_furigana_from_chunk(src):
     """Trims redundant furigana from an entire chunk"""
-    m = re.match(r"""^
-        ([^\[\]]+)
-        \[
-            ([^\[\]]+)
-        \]
-        ([^\[\]]*)
-    $""", src, re.VERBOSE)
-    if m:
-        expression, furigana, extra = m.group(1), m.group(2), m.group(3)
+    parsed = _parse_reading(src)
+    if parsed:
+        expression, furigana, extra = parsed
+        limit = min(len(expression), len(furigana))
         trim_start_len = 0
-        trim_end_len = 0
-        while expression[:(trim_start_len + 1)] == furigana[:(trim_start_len + 1)]:
+        while trim_start_len < limit and expression[trim_start_len] == furigana[trim_start_len]:
             trim_start_len += 1
-        while expression[-(trim_end_len + 1):] == furigana[-(trim_end_len + 1):]:
+        trim_end_len = 0
+        while trim_end_len < limit and expression[-1 - trim_end_len] == furigana[-1 - trim_end_len]:
             trim_end_len += 1
         if trim_start_len or trim_end_len:
             beginning = ""
             if trim_start_len:
                 beginning += expression[:trim_start_len]
                 beginning += " "
-            middle = ""
-            if trim_end_len:
-                middle += expression[trim_start_len:-trim_end_len]
-            else:
-                middle += expression[trim_start_len:]
-            middle += "["
             if trim_end_len:
+                middle = expression[trim_start_len:-trim_end_len]
                 reading = furigana[trim_start_len:-trim_end_len]
             else:
+                middle = expression[trim_start_len:]
                 reading = furigana[trim_start_len:]
             if not reading:
                 raise JapaneseReadingFormattingError("Bad formatting found within: {}".format(src))
-            middle += reading
-            middle += "]"
             end = ""
             if trim_end_len:
                 end += expression[-trim_end_len:]
             end += extra
-            return beginning + _trim_redundant_furigana_middle(middle) + end
+            return beginning + _trim_redundant_furigana_middle(middle, reading) + end
+        elif not extra:
+            return _trim_redundant_furigana_middle(expression, furigana)
         else:
-            return _trim_redundant_furigana_middle(src)
+            return src
     else:
         return src
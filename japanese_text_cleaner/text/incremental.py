@@ -0,0 +1,55 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from .batch import CleanCache
+from .exceptions import TextProcessingError, TextProcessingUnexpectedError
+
+# Number of cleaned lines kept for fields being edited
+LINE_CACHE_SIZE = 2000
+
+
+class IncrementalCleaner:
+    """
+    Cleans fields as they are edited.  Each line of a field is cleaned on its own, which gives the same result
+    as cleaning the whole field since the cleaners all work line by line, and the cleaned lines are kept in a
+    small LRU cache.  Cleaning a field again after an edit therefore only processes the lines that were
+    edited.  Lines that fail to be processed, such as with furigana that is still being typed, are left as
+    they are.
+    """
+
+    def __init__(self, cleaner, cache_size=LINE_CACHE_SIZE):
+        self.cleaner = cleaner
+        self.cache = CleanCache(cache_size)
+
+    def clean(self, content):
+        """Returns the cleaned content, which is content itself when nothing needs to change"""
+        if not self.cleaner.may_change(content):
+            return content
+        lines = content.split("\n")
+        cleaned = [self._clean_line(line) for line in lines]
+        if cleaned == lines:
+            return content
+        return "\n".join(cleaned)
+
+    def _clean_line(self, line):
+        cleaned = self.cache.get(line)
+        if cleaned is None:
+            if not self.cleaner.may_change(line):
+                return line
+            try:
+                cleaned = self.cleaner.clean(line).cleaned
+            except (TextProcessingError, TextProcessingUnexpectedError):
+                cleaned = line
+            self.cache.put(line, cleaned)
+        return cleaned
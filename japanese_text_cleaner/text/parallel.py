@@ -0,0 +1,113 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from .exceptions import TextProcessingError
+
+# Below this many characters of content, starting worker processes costs more than it saves,
+# so the content is cleaned in this process instead.
+MIN_PARALLEL_CHARS = 200000
+
+# Chunks sent to workers hold at least this many characters so the cost of sending them to the
+# worker is small compared to the cost of cleaning them.
+MIN_CHUNK_CHARS = 20000
+
+# Content is split into about this many chunks per worker so that workers finishing early can
+# pick up more work.
+CHUNKS_PER_WORKER = 4
+
+
+def default_workers():
+    """Number of worker processes to use, leaving a core free for the UI"""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def forks_processes():
+    """
+    Whether worker processes are started by forking this process.  Otherwise, as on macOS and Windows, each
+    worker starts sys.executable afresh, which in packaged builds of Anki is Anki itself rather than Python,
+    so worker processes can't be used from within Anki.
+    """
+    # The first of the start methods is the platform's default
+    method = multiprocessing.get_start_method(allow_none=True) or multiprocessing.get_all_start_methods()[0]
+    return method == "fork"
+
+
+def chunk_contents(contents, chunk_chars):
+    """
+    Splits the contents into consecutive chunks of roughly chunk_chars characters each.  A chunk of
+    short fields holds many contents, while a long field may fill a chunk on its own.
+    """
+    chunks = []
+    chunk = []
+    size = 0
+    for content in contents:
+        chunk.append(content)
+        size += len(content)
+        if size >= chunk_chars:
+            chunks.append(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def clean_chunk(contents, cleaner, sanity_checks=True):
+    """
+    Cleans each of the contents, returning a (result, error) pair for each.  Either result is the
+    CleanResult or error is the TextProcessingError raised while cleaning the content.
+    """
+    cleaned = []
+    for content in contents:
+        try:
+            cleaned.append((cleaner.clean(content, sanity_checks), None))
+        except TextProcessingError as e:
+            cleaned.append((None, e))
+    return cleaned
+
+
+def clean_parallel(contents, cleaner, sanity_checks=True, workers=None, min_parallel_chars=MIN_PARALLEL_CHARS,
+                   executor=None):
+    """
+    Cleans each of the contents using a pool of worker processes.  Returns a (result, error) pair
+    for each of the contents in the same order as the contents, exactly as clean_chunk would.
+
+    The contents are cleaned in this process instead when only one worker is requested or when
+    there is too little content for the workers to pay off.  An executor can be passed to reuse
+    the same pool of processes across calls.  Otherwise a pool is started for this call.
+    """
+    if workers is None:
+        workers = default_workers()
+    total_chars = sum(len(content) for content in contents)
+    if workers <= 1 or not contents or total_chars < min_parallel_chars:
+        return clean_chunk(contents, cleaner, sanity_checks)
+
+    chunks = chunk_contents(contents, max(MIN_CHUNK_CHARS, total_chars // (workers * CHUNKS_PER_WORKER)))
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            return _clean_chunks(executor, chunks, cleaner, sanity_checks)
+    return _clean_chunks(executor, chunks, cleaner, sanity_checks)
+
+
+def _clean_chunks(executor, chunks, cleaner, sanity_checks):
+    cleaned = []
+    # map yields the chunks in the order they were submitted, regardless of which finishes first
+    for chunk_cleaned in executor.map(clean_chunk, chunks, repeat(cleaner), repeat(sanity_checks)):
+        cleaned.extend(chunk_cleaned)
+    return cleaned
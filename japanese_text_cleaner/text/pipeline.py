@@ -0,0 +1,79 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+
+from .cleaner import Cleaner
+from .edits import CleanResult, apply_edits, compose_edits, shift_edits
+from .furigana import FuriganaCleaner
+from .spacing import SpacingCleaner
+from .split import iter_tokens
+
+
+class CleanerPipeline(Cleaner):
+    """
+    Chains several cleaners so they run in one pass over the content.
+
+    The pipeline operates line by line.  Each line is tokenized once and the tokens are handed to
+    each cleaner in turn.  A line is only tokenized again when a cleaner actually changes it, so
+    that the next cleaner sees the updated line.  The result is the same as applying each cleaner
+    in order to each line separately.
+    """
+
+    def __init__(self, cleaners, name=None):
+        self.cleaners = tuple(cleaners)
+        self.name = name or "+".join(c.name for c in self.cleaners)
+        self.version = "+".join(str(c.version) for c in self.cleaners)
+
+    def may_change(self, content):
+        return any(cleaner.may_change(content) for cleaner in self.cleaners)
+
+    def clean(self, src, sanity_checks=True):
+        edits = []
+        line_offset = 0
+        for line in src.split("\n"):
+            line_edits = self._line_edits(line, list(iter_tokens(line, validate=True)), sanity_checks)
+            if line_edits:
+                edits.extend(shift_edits(line_edits, line_offset))
+            line_offset += len(line) + 1
+        return CleanResult(src, edits)
+
+    def line_edits(self, tokens, sanity_checks=True):
+        return self._line_edits("".join(chunk for _, chunk in tokens), tokens, sanity_checks)
+
+    def _line_edits(self, line, tokens, sanity_checks):
+        edits = []
+        current = line
+        for cleaner in self.cleaners:
+            if tokens is None:
+                # The previous cleaner changed the line, so it needs to be tokenized again.
+                tokens = list(iter_tokens(current, validate=True))
+            cleaner_edits = cleaner.line_edits(tokens, sanity_checks)
+            if cleaner_edits:
+                # Edits are relative to the line as the previous cleaners left it, so they are
+                # composed with the previous edits to make them relative to the original line.
+                edits = compose_edits(line, edits, cleaner_edits)
+                current = apply_edits(current, cleaner_edits)
+                tokens = None
+        return edits
+
+
+SPACING = SpacingCleaner()
+FURIGANA = FuriganaCleaner()
+
+# Furigana is cleaned first since trimming a reading can leave spaces before it unnecessary.
+ALL_CLEANERS = CleanerPipeline([FURIGANA, SPACING], name="clean_all")
+
+# All available cleaners by name
+CLEANERS = OrderedDict((c.name, c) for c in [SPACING, FURIGANA, ALL_CLEANERS])
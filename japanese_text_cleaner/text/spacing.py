@@ -14,14 +14,15 @@
 
 import re
 
+from .cleaner import Cleaner
+from .edits import CleanResult, Edit, shift_edits
 from .exceptions import TextProcessingUnexpectedError
-from .html import del_tag
-from .split import formatting_aware_split
-from .validation import (valiate_no_spaces_chunk, validate_all_spaces_chunk, validate_chunk_is_html_tag,
-                         validate_japanese_reading_formatting)
+from .split import HTML, SPACES, TEXT, iter_tokens
+from .validation import (has_mismatched_brackets, valiate_no_spaces_chunk, validate_all_spaces_chunk,
+                         validate_chunk_is_html_tag)
 
 
-def clean_spaces(src, output_html_diff=False):
+def clean_spaces(src, sanity_checks=True):
     """
     Cleans extraneous spaces from Japanese text, with special handling for the furigana syntax
     that the Japanese Support plugin (https://ankiweb.net/shared/info/3918629684) uses.
@@ -31,89 +32,117 @@ def clean_spaces(src, output_html_diff=False):
     * Removes spaces at the beginning of the line
     * Removes spaces at the end of the line
     * Removes spaces within the line that do not correspond to furigana
+
+    A JapaneseReadingFormattingError is raised for lines with mismatched brackets.  Setting
+    sanity_checks to False skips the internal checks that guard against programmatic bugs.
     """
-    return "\n".join(_clean_spaces_from_line(s, output_html_diff) for s in src.split("\n"))
+    return CleanResult(src, spacing_edits(src, sanity_checks)).cleaned
+
+
+def spacing_edits(src, sanity_checks=True):
+    """Returns the edits clean_spaces makes to src"""
+    edits = []
+    line_offset = 0
+    for line in src.split("\n"):
+        # Materialized since spaces need to know whether furigana follows them.
+        line_edits = spacing_edits_from_tokens(list(iter_tokens(line, validate=True)), sanity_checks)
+        if line_edits:
+            edits.extend(shift_edits(line_edits, line_offset))
+        line_offset += len(line) + 1
+    return edits
+
+
+class SpacingCleaner(Cleaner):
+    """Cleans extraneous spaces from Japanese text.  See clean_spaces."""
+
+    name = "clean_spaces"
+
+    # Version 1 skipped content with mismatched brackets instead of failing it
+    version = 2
+
+    def may_change(self, content):
+        # Only spaces are ever removed, though content with mismatched brackets must still be cleaned so
+        # that it fails validation
+        return " " in content or has_mismatched_brackets(content)
+
+    def clean(self, src, sanity_checks=True):
+        return CleanResult(src, spacing_edits(src, sanity_checks))
 
+    def line_edits(self, tokens, sanity_checks=True):
+        return spacing_edits_from_tokens(tokens, sanity_checks)
 
-def _clean_spaces_from_line(src, output_html_diff):
-    cleaned = []
 
-    validate_japanese_reading_formatting(src)
+_READING_RE = re.compile(r"\[[^\[\]]+\]")
 
-    split = formatting_aware_split(src)
+
+def spacing_edits_from_tokens(split, sanity_checks=True):
+    """Returns the edits that clean extraneous spaces from a single line, given the list of tokens for the line"""
+    edits = []
+
+    furigana_ahead = _furigana_before_next_spaces(split)
 
     text_content_len = 0
+    offset = 0
 
     # Split the line into chunks alternating between all spaces and no spaces.  Chunks at even indices
     # will have no spaces.  Chunks at odd indices will have only spaces.
     for i, parts in enumerate(split):
         tt, chunk = parts
-        if not chunk:
-            continue
-
-        if tt == "text":
+        if tt == TEXT:
             # A chunk with no spaces or html tags.
-            valiate_no_spaces_chunk(chunk)
+            if sanity_checks:
+                valiate_no_spaces_chunk(chunk)
 
             text_content_len += len(chunk)
-
-            cleaned.append(chunk)
-        elif tt == "html":
-            # a chunk that is an html tag. append this as is.  this may have spaces
+        elif tt == HTML:
+            # a chunk that is an html tag. keep this as is.  this may have spaces
             # but we obviously want these preserved.
-            validate_chunk_is_html_tag(chunk)
-            cleaned.append(chunk)
-        elif tt == "spaces":
+            if sanity_checks:
+                validate_chunk_is_html_tag(chunk)
+        elif tt == SPACES:
             # A chunk with only spaces.  We need to determine whether we can remove some.
-            # To determine this we need to look ahead for furigana.
+            # This depends on whether furigana follows before the next set of spaces.
 
-            validate_all_spaces_chunk(chunk)
+            if sanity_checks:
+                validate_all_spaces_chunk(chunk)
 
             if not text_content_len:
                 # Leading spaces at the beginning of a line, so drop. Even if we have furigana,
                 # leading spaces are not necessary. For furigana, spaces are only necessary
                 # within the line.
-                if output_html_diff:
-                    cleaned.append(del_tag(chunk))
+                edits.append(Edit(offset, chunk, ""))
+            elif furigana_ahead[i]:
+                # There is furigana after these spaces, so we need to keep one space.
+                if len(chunk) >= 2:
+                    # Drop all but the last space.
+                    edits.append(Edit(offset, chunk[:-1], ""))
+                # else we need this space, so keep it as is.
             else:
-                # Check for furigana. If there is then we need to keep one space.
-                next_chunk = None
-
-                # Look ahead for a chunk of characters that have square brackets
-                # indicating furigana.  When we encounter spaces we stop because
-                # any furigana corresponding to this set of spaces would have been
-                # found before the next set of spaces.
-                j = i + 1
-                while j < len(split):
-                    if split[j][0] == "text":
-                        if split[j][1] and re.search(r"\[[^\[\]]+\]", split[j][1]):
-                            # we found some furigana
-                            next_chunk = split[j][1]
-                            break
-                        # else either no text or no furigana, so we keep looking either way
-                    elif split[j][0] == "html":
-                        # ignore html tags
-                        pass
-                    elif split[j][0] == "spaces":
-                        if split[j][1]:
-                            # chunk with spaces only. no furigana following previous spaces then.
-                            break
-                    j += 1
-
-                if next_chunk:
-                    if len(chunk) >= 2:
-                        # Drop all but the last space.
-                        if output_html_diff:
-                            cleaned.append(del_tag(chunk[:-1]))
-                        cleaned.append(chunk[-1])
-                    else:
-                        # We need this space, so append as is.
-                        cleaned.append(chunk)
-                else:
-                    # There is no furigana after these spaces, so spaces aren't needed.
-                    if output_html_diff:
-                        cleaned.append(del_tag(chunk))
+                # There is no furigana after these spaces, so spaces aren't needed.
+                edits.append(Edit(offset, chunk, ""))
         else:
             raise TextProcessingUnexpectedError("Unexpected type {}".format(tt))
 
-    return "".join(cleaned)
+        offset += len(chunk)
+
+    return edits
+
+
+def _furigana_before_next_spaces(split):
+    """
+    Determines for each chunk whether a text chunk with furigana follows it before the next
+    chunk of spaces.  Any furigana corresponding to a set of spaces must be found before the
+    next set of spaces.  This is computed in a single reverse pass so that each set of spaces
+    can be decided in constant time rather than by scanning ahead.
+    """
+    result = [False] * len(split)
+    found = False
+    for i in range(len(split) - 1, -1, -1):
+        tt, chunk = split[i]
+        result[i] = found
+        if tt == SPACES:
+            found = False
+        elif tt == TEXT and not found:
+            # html tags are ignored
+            found = "[" in chunk and _READING_RE.search(chunk) is not None
+    return result
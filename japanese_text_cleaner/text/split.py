@@ -13,51 +13,66 @@
 # limitations under the License.
 
 import re
+from collections import namedtuple
 
+from .validation import validate_japanese_reading_formatting
 
-def formatting_aware_split(content):
+# A token produced by iter_tokens.  The type is one of TEXT, HTML or SPACES.
+Token = namedtuple("Token", ["type", "text"])
+
+TEXT = "text"
+HTML = "html"
+SPACES = "spaces"
+
+# html tag (this will capture spaces within the angle brackets by design)
+_HTML_TAG = r"<[a-zA-Z][a-zA-Z0-9]*\b[^>]*>|</[a-zA-Z][a-zA-Z0-9]*>"
+
+_TOKEN_RE = re.compile(
+    # A text chunk made up of japanese readings (these capture spaces within the square brackets
+    # by design) and runs of any other characters that cannot begin an html tag or spaces.  A "<"
+    # that does not begin an html tag is just text, as is any bracket that is not part of a reading.
+    # Matching all of these in one group means consecutive text never needs to be merged afterwards.
+    # Stray brackets are captured separately so that bracket balancing can be checked without
+    # another pass over the content.
+    r"(?P<text>(?:\[[^\[\]]+\]|[^ \[\]<]+|(?!" + _HTML_TAG + r")<|(?P<bracket>[\[\]]))+)|"
+    r"(?P<html>" + _HTML_TAG + r")|"
+    # spaces (this captures any other spaces not captured by previous cases)
+    r"(?P<spaces> +)")
+
+
+def iter_tokens(content, validate=False):
     """
-    Split the line into a sequence of chunks, while being aware of formatting such as HTML
-    tags and Japanese readings.
+    Lazily splits the line into a sequence of tokens in a single pass, while being aware of
+    formatting such as HTML tags and Japanese readings.
 
-    Result is a list of tuples, where for each tuple the first value is a type and the
-    second value is a string.
+    If validate is true then a JapaneseReadingFormattingError is raised for content with
+    mismatched brackets, as validate_japanese_reading_formatting would.  Brackets that are part
+    of a reading are known to be balanced, so only the rare content with brackets elsewhere
+    needs to be checked further.
 
-    The type can be:
-    - "text":   A chunk of text with no html tags and no spaces except
-                for within square brackets (a Japanese reading)
-    - "html":   A chunk that is an html tag.
-    - "spaces": A chunk with only spaces.
+    Each token is a Token tuple of (type, text), where the type can be:
+    - TEXT:   A chunk of text with no html tags and no spaces except
+              for within square brackets (a Japanese reading)
+    - HTML:   A chunk that is an html tag.
+    - SPACES: A chunk with only spaces.
+
+    Tokens are never empty and consecutive tokens never both have type TEXT.
     """
+    needs_check = validate
+    for m in _TOKEN_RE.finditer(content):
+        tt = m.lastgroup
+        chunk = m.group()
+        if needs_check and (m.group("bracket") or (tt == HTML and ("[" in chunk or "]" in chunk))):
+            validate_japanese_reading_formatting(content)
+            needs_check = False
+        yield Token(tt, chunk)
+
 
-    split = re.split(
-        # japanese reading (this will capture spaces within the square brackets by design).
-        # This along with the non-capture case are considered text chunks that can be
-        # merged together.
-        r"(\[[^\[\]]+\])|"
-        # html tag (this will capture spaces within the angle brackets by design)
-        r"(<[a-zA-Z][a-zA-Z0-9]*\b[^>]*>|</[a-zA-Z][a-zA-Z0-9]*>)|"
-        # spaces (this captures any other spaces not captured by previous cases)
-        r"( +)", content)
-
-    result = []
-    for i, chunk in enumerate(split):
-        if not chunk:
-            continue
-        if i % 4 in (0, 1):
-            # No match, so a chunk with no spaces, no html tags, no reading,
-            # or, Group 1 match, so a Japanese reading.
-
-            # Merge all consecutive text chunks together.
-            if result and result[-1][0] == "text":
-                result[-1] = ("text", result[-1][1] + chunk)
-            else:
-                result.append(("text", chunk))
-        elif i % 4 == 2:
-            # Group 2: HTML tag
-            result.append(("html", chunk))
-        else:
-            # Group 3: Spaces
-            result.append(("spaces", chunk))
-
-    return result
+def formatting_aware_split(content):
+    """
+    Split the line into a list of chunks, while being aware of formatting such as HTML
+    tags and Japanese readings.
+
+    Result is a list of (type, string) tuples as produced by iter_tokens.
+    """
+    return list(iter_tokens(content))
@@ -12,8 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import re
+
 from .exceptions import JapaneseReadingFormattingError, TextProcessingUnexpectedError
 
+# Matches content where brackets alternate between "[" and "]", starting with "[" and ending with "]".
+_BALANCED_BRACKETS_RE = re.compile(r"[^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*")
+
 
 def validate_japanese_reading_formatting(line):
     """
@@ -23,30 +28,29 @@ def validate_japanese_reading_formatting(line):
     * Spaces within brackets
     """
 
-    level = 0
-    for c in line:
-        if c == "[":
-            level += 1
-        elif c == "]":
-            level -= 1
+    if not _BALANCED_BRACKETS_RE.fullmatch(line):
+        raise JapaneseReadingFormattingError("Detected mismatched brackets: {}".format(line))
 
-        if level < 0 or level > 1:
-            raise JapaneseReadingFormattingError("Detected mismatched brackets: {}".format(line))
 
-    if level != 0:
-        raise JapaneseReadingFormattingError("Detected mismatched brackets: {}".format(line))
+def has_mismatched_brackets(content):
+    """Cheaply determines whether validate_japanese_reading_formatting would reject any line of the content"""
+    if "[" not in content and "]" not in content:
+        return False
+    return any(not _BALANCED_BRACKETS_RE.fullmatch(line) for line in content.split("\n"))
 
 
 def validate_all_spaces_chunk(chunk):
     """Validates the chunk of text is all spaces"""
     # Sanity check. Make sure there are not spaces.
-    if not all(" " == c for c in chunk):
+    if chunk.count(" ") != len(chunk):
         raise TextProcessingUnexpectedError(
             "Found non-spaces in a chunk where only spaces were expected: {}".format(chunk))
 
 
 def valiate_no_spaces_chunk(chunk):
     """Validates the chunk of text has no spaces except within brackets"""
+    if " " not in chunk:
+        return
     level = 0
     for c in chunk:
         if c == "[":
@@ -10,6 +10,7 @@ TEMP_DIR=`mktemp -d`
 echo Using temp dir $TEMP_DIR
 cp manifest.json $TEMP_DIR
 cp japanese_text_cleaner/*.py $TEMP_DIR
+cp japanese_text_cleaner/config.json japanese_text_cleaner/config.md $TEMP_DIR
 mkdir $TEMP_DIR/db
 cp japanese_text_cleaner/db/*.py $TEMP_DIR/db
 mkdir $TEMP_DIR/dialogs
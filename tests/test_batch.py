@@ -0,0 +1,116 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from japanese_text_cleaner.text.batch import CleanCache, clean_many
+from japanese_text_cleaner.text.cleaner import Cleaner
+from japanese_text_cleaner.text.exceptions import JapaneseReadingFormattingError
+from japanese_text_cleaner.text.pipeline import ALL_CLEANERS, FURIGANA, SPACING
+
+
+class CountingCleaner(Cleaner):
+    """Wraps a cleaner and counts how many times it cleans content, keeping the content it cleans"""
+
+    def __init__(self, cleaner):
+        self.cleaner = cleaner
+        self.name = cleaner.name
+        self.count = 0
+        self.cleaned = []
+
+    def may_change(self, content):
+        return self.cleaner.may_change(content)
+
+    def clean(self, src, sanity_checks=True):
+        self.count += 1
+        self.cleaned.append(src)
+        return self.cleaner.clean(src, sanity_checks)
+
+
+class TestCleanMany:
+
+    def test_order(self):
+        outcomes = clean_many(["a b", "c[ d", "e  f[g]"], SPACING, cache=CleanCache())
+        assert outcomes[0].result.cleaned == "ab"
+        assert outcomes[0].error is None
+        assert outcomes[1].result is None
+        assert isinstance(outcomes[1].error, JapaneseReadingFormattingError)
+        assert outcomes[2].result.cleaned == "e f[g]"
+
+    def test_generator(self):
+        outcomes = clean_many((content for content in ["a  b", "c"]), SPACING, cache=CleanCache())
+        assert [outcome.result.cleaned for outcome in outcomes] == ["ab", "c"]
+
+    def test_duplicates_collapsed(self):
+        cleaner = CountingCleaner(SPACING)
+        outcomes = clean_many(["a b", "c d", "a b", "a b"], cleaner, cache=CleanCache())
+        assert [o.result.cleaned for o in outcomes] == ["ab", "cd", "ab", "ab"]
+        assert cleaner.count == 2
+
+    def test_cache(self):
+        cache = CleanCache()
+        cleaner = CountingCleaner(SPACING)
+        clean_many(["a b", "c[ d"], cleaner, cache=cache)
+        outcomes = clean_many(["c[ d", "a b", "e f"], cleaner, cache=cache)
+        assert [o.result and o.result.cleaned for o in outcomes] == [None, "ab", "ef"]
+        assert isinstance(outcomes[0].error, JapaneseReadingFormattingError)
+        assert cleaner.count == 3
+
+        # Keyed on the cleaner as well as the content
+        assert clean_many(["a b"], FURIGANA, cache=cache)[0].result.cleaned == "a b"
+
+    def test_cache_bounded(self):
+        cache = CleanCache(maxsize=2)
+        cleaner = CountingCleaner(SPACING)
+        clean_many(["a b", "c d"], cleaner, cache=cache)
+        clean_many(["a b", "e f"], cleaner, cache=cache)
+        assert len(cache) == 2
+        assert cleaner.count == 3
+
+        # "c d" was least recently used so it was evicted
+        clean_many(["a b", "e f"], cleaner, cache=cache)
+        assert cleaner.count == 3
+        clean_many(["c d"], cleaner, cache=cache)
+        assert cleaner.count == 4
+
+    def test_fast_reject(self):
+        cleaner = CountingCleaner(SPACING)
+        outcomes = clean_many(["abc", "a[b]", "a b"], cleaner, cache=CleanCache())
+        assert [o.rejected for o in outcomes] == [True, True, False]
+        assert [o.result.cleaned for o in outcomes] == ["abc", "a[b]", "ab"]
+        assert not outcomes[0].result.changed
+        assert cleaner.count == 1
+
+    def test_mismatched_brackets_not_rejected(self):
+        for cleaner, content in ((SPACING, "漢字[かんじ"), (FURIGANA, "漢字]かんじ"), (ALL_CLEANERS, "漢字[かんじ")):
+            outcome, = clean_many([content], cleaner, cache=CleanCache())
+            assert not outcome.rejected
+            assert isinstance(outcome.error, JapaneseReadingFormattingError)
+
+
+class TestMayChange:
+
+    def test_spacing(self):
+        assert not SPACING.may_change("abc[def]")
+        assert SPACING.may_change("abc def")
+        assert SPACING.may_change("漢字[かんじ")
+        assert SPACING.may_change("[a]\n漢字]かんじ")
+
+    def test_furigana(self):
+        assert not FURIGANA.may_change("abc def")
+        assert FURIGANA.may_change("abc[def]")
+        assert FURIGANA.may_change("漢字]かんじ")
+
+    def test_pipeline(self):
+        assert not ALL_CLEANERS.may_change("abc")
+        assert ALL_CLEANERS.may_change("abc def")
+        assert ALL_CLEANERS.may_change("abc[def]")
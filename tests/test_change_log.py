@@ -0,0 +1,285 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+import time
+
+import pytest
+
+from japanese_text_cleaner.db import change_log
+from japanese_text_cleaner.db.change_log import (SCHEMA_VERSION, ChangeLog, ChangeLogEntry, ChangeLogQuery,
+                                                 ChangeLogWriter, _where, row_key)
+from japanese_text_cleaner.db.sqlite import DB
+
+
+def _entries(count):
+    return [ChangeLogEntry(ts=1000 + i, nid=i, fld="Reading", old="old {}".format(i), new="new {}".format(i))
+            for i in range(count)]
+
+
+class TestChangeLog:
+
+    def test_record_and_commit(self, tmpdir):
+        path = str(tmpdir.join("changelog.db"))
+        changelog = ChangeLog(path)
+        changelog.record_and_commit_changes("clean_spaces", 1000, _entries(3))
+        changelog.close()
+
+        changelog = ChangeLog(path)
+        assert changelog.count() == 3
+        assert changelog.db.list("select id from changelog order by id") == [1, 2, 3]
+        assert list(changelog.iter_changes()) == [
+            ("clean_spaces", 1000, 0, "Reading", "old 0", "new 0"),
+            ("clean_spaces", 1001, 1, "Reading", "old 1", "new 1"),
+            ("clean_spaces", 1002, 2, "Reading", "old 2", "new 2"),
+        ]
+        assert changelog.db.scalar("pragma journal_mode") == "wal"
+        changelog.close()
+
+    def test_page(self, tmpdir):
+        changelog = ChangeLog(str(tmpdir.join("changelog.db")))
+        changelog.record_and_commit_changes("clean_spaces", 1000, _entries(5))
+        assert changelog.page(limit=2, preview_chars=3) == [
+            (5, "clean_spaces", 1000, 1004, 4, "Reading", "old ", "new "),
+            (4, "clean_spaces", 1000, 1003, 3, "Reading", "old ", "new "),
+        ]
+        assert changelog.get_values(4) == ("old 3", "new 3")
+        changelog.close()
+
+    def test_keyset_pages(self, tmpdir):
+        changelog = ChangeLog(str(tmpdir.join("changelog.db")))
+        # Changes made in the same ms are ordered by id
+        changelog.record_and_commit_changes("clean_spaces", 1000, [
+            ChangeLogEntry(ts=1000 + i // 2, nid=i, fld="Reading", old="old", new="new") for i in range(7)])
+        ids = [row[0] for row in changelog.page()]
+        assert ids == [7, 6, 5, 4, 3, 2, 1]
+
+        first = changelog.page(limit=3)
+        assert [row[0] for row in first] == [7, 6, 5]
+        second = changelog.page(before=row_key(first[-1]), limit=3)
+        assert [row[0] for row in second] == [4, 3, 2]
+        assert [row[0] for row in changelog.page(before=row_key(second[-1]), limit=3)] == [1]
+        assert [row[0] for row in changelog.page(after=row_key(second[0]), limit=3)] == [7, 6, 5]
+        assert [row[0] for row in changelog.page(after=row_key(second[0]), limit=2)] == [6, 5]
+        changelog.close()
+
+    def test_query(self, tmpdir):
+        changelog = ChangeLog(str(tmpdir.join("changelog.db")))
+        changelog.record_and_commit_changes("clean_spaces", 1000, [
+            ChangeLogEntry(ts=1000, nid=1, fld="Reading", old="a", new="b"),
+            ChangeLogEntry(ts=1001, nid=2, fld="Expression", old="c", new="d"),
+        ])
+        changelog.record_and_commit_changes("clean_furigana", 2000, [
+            ChangeLogEntry(ts=2000, nid=1, fld="Reading", old="b", new="e"),
+            ChangeLogEntry(ts=2001, nid=3, fld="Reading", old="f", new="g"),
+        ])
+
+        def ids(query):
+            return [row[0] for row in changelog.page(query)]
+
+        assert ids(ChangeLogQuery(nid=1)) == [3, 1]
+        assert ids(ChangeLogQuery(fld="Expression")) == [2]
+        assert ids(ChangeLogQuery(op="clean_furigana")) == [4, 3]
+        assert ids(ChangeLogQuery(init_ts=1000)) == [2, 1]
+        assert ids(ChangeLogQuery(start_ts=1001, end_ts=2001)) == [3, 2]
+        assert ids(ChangeLogQuery(nid=1, op="clean_spaces")) == [1]
+        assert ids(ChangeLogQuery(nid=99)) == []
+        assert changelog.count(ChangeLogQuery(fld="Reading")) == 3
+        assert [change[4:] for change in changelog.iter_changes(ChangeLogQuery(nid=1))] == [("a", "b"), ("b", "e")]
+        changelog.close()
+
+    def test_queries_use_indices(self, tmpdir):
+        changelog = ChangeLog(str(tmpdir.join("changelog.db")))
+        for query, index in [
+            (None, "ix_changelog_ts"),
+            (ChangeLogQuery(start_ts=1000), "ix_changelog_ts"),
+            (ChangeLogQuery(nid=1), "ix_changelog_nid_ts"),
+            (ChangeLogQuery(init_ts=1000), "ix_changelog_init_ts"),
+            (ChangeLogQuery(op="clean_spaces"), "ix_changelog_op_ts"),
+        ]:
+            where, args = _where(query, before=(1000, 1))
+            plan = " ".join(row[-1] for row in changelog.db.all("""
+                explain query plan
+                select c.id from changelog c join blobs b on b.hash = c.base
+                {} order by c.ts desc, c.id desc limit 10
+                """.format(where), *args))
+            assert index in plan
+            assert "TEMP B-TREE" not in plan
+        changelog.close()
+
+    def test_upgrade_adds_indices(self, tmpdir):
+        path = str(tmpdir.join("changelog.db"))
+        changelog = ChangeLog(path)
+        changelog.record_and_commit_changes("clean_spaces", 1000, _entries(3))
+        changelog.db.execute("drop index ix_changelog_nid_ts")
+        changelog.db.execute("pragma user_version = 1")
+        changelog.db.commit()
+        changelog.close()
+
+        changelog = ChangeLog(path)
+        assert changelog.db.scalar("pragma user_version") == SCHEMA_VERSION
+        assert changelog.db.scalar("select count(*) from sqlite_master where name = 'ix_changelog_nid_ts'") == 1
+        assert changelog.count() == 3
+        changelog.close()
+
+    def test_concurrent_change_logs(self, tmpdir):
+        path = str(tmpdir.join("changelog.db"))
+        ChangeLog(path).close()
+        changelogs = [ChangeLog(path) for _ in range(3)]
+
+        def record(changelog):
+            for _ in range(20):
+                changelog.record_and_commit_changes("clean_spaces", 1000, _entries(50))
+
+        threads = [threading.Thread(target=record, args=(changelog,)) for changelog in changelogs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for changelog in changelogs:
+            changelog.close()
+
+        changelog = ChangeLog(path)
+        assert changelog.count() == 3000
+        assert changelog.db.scalar("select count(distinct id) from changelog") == 3000
+        changelog.close()
+
+    def test_close_commits(self, tmpdir):
+        path = str(tmpdir.join("changelog.db"))
+        changelog = ChangeLog(path)
+        changelog.record_changes("clean_spaces", 1000, _entries(3))
+        changelog.close()
+        changelog = ChangeLog(path)
+        assert changelog.count() == 3
+        changelog.close()
+
+    def test_dedup_blobs(self, tmpdir):
+        changelog = ChangeLog(str(tmpdir.join("changelog.db")))
+        entries = [ChangeLogEntry(ts=1000, nid=nid, fld="Reading", old="一 [いち] です", new="一[いち]です")
+                   for nid in range(10)]
+        changelog.record_and_commit_changes("clean_spaces", 1000, entries)
+        assert changelog.db.scalar("select count(*) from blobs") == 1
+        assert changelog.get_values(5) == ("一 [いち] です", "一[いち]です")
+        changelog.close()
+
+    def test_migrate(self, tmpdir):
+        path = str(tmpdir.join("changelog.db"))
+        db = DB(path)
+        db.executescript("""
+            create table changelog (id integer primary key, op text not null, init_ts integer not null,
+                                    ts integer not null, nid integer not null, fld text not null,
+                                    old text not null, new text not null);
+            create index ix_changelog_ts on changelog (ts);
+        """)
+        rows = [(i, "clean_spaces", 1000, 1000 + i, i, "Reading", "old {}".format(i) * 50, "new {}".format(i))
+                for i in range(2500)]
+        db.executemany("insert into changelog values (?,?,?,?,?,?,?,?)", rows)
+        db.commit()
+        db.close()
+
+        changelog = ChangeLog(path)
+        assert changelog.db.scalar("pragma user_version") == SCHEMA_VERSION
+        assert changelog.count() == 2500
+        assert list(changelog.iter_changes()) == [
+            (op, ts, nid, fld, old, new) for _, op, _, ts, nid, fld, old, new in rows]
+        assert changelog.get_values(7) == ("old 7" * 50, "new 7")
+        changelog.record_and_commit_changes("clean_spaces", 5000, _entries(1))
+        assert changelog.db.scalar("select max(id) from changelog") == 2500
+        changelog.close()
+
+    def test_write_error(self, tmpdir):
+        changelog = ChangeLog(str(tmpdir.join("changelog.db")))
+        changelog.record_and_commit_changes("clean_spaces", 1000, _entries(1))
+        assert changelog.write_error() is None
+        changelog.db.execute("drop table blobs")
+        changelog.db.commit()
+        changelog.record_changes("clean_spaces", 2000, _entries(1))
+        deadline = time.monotonic() + 5
+        while changelog.write_error() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert changelog.write_error() is not None
+
+        # The error is raised by the first close only, so callers can still finish closing
+        with pytest.raises(Exception):
+            changelog.close()
+        changelog.close()
+
+
+class TestChangeLogWriter:
+
+    def _rows(self, count):
+        return [(None, "clean_spaces", 1000) + tuple(entry) for entry in _entries(count)]
+
+    def test_commits_batch(self, tmpdir):
+        path = str(tmpdir.join("changelog.db"))
+        changelog = ChangeLog(path)
+        writer = ChangeLogWriter(path, max_batch=10, max_delay=60)
+        writer.write(self._rows(4))
+        writer.write(self._rows(6))
+        deadline = time.monotonic() + 5
+        while changelog.count() < 10 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert changelog.count() == 10
+        writer.close()
+        changelog.close()
+
+    def test_commits_after_delay(self, tmpdir):
+        path = str(tmpdir.join("changelog.db"))
+        changelog = ChangeLog(path)
+        writer = ChangeLogWriter(path, max_batch=1000, max_delay=0.05)
+        writer.write(self._rows(3))
+        deadline = time.monotonic() + 5
+        while changelog.count() < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert changelog.count() == 3
+        writer.close()
+        changelog.close()
+
+    def test_error(self, tmpdir):
+        path = str(tmpdir.join("changelog.db"))
+        changelog = ChangeLog(path)
+        changelog.db.executescript("drop table changelog")
+        writer = ChangeLogWriter(path)
+        writer.write(self._rows(1))
+        with pytest.raises(Exception):
+            writer.flush()
+        with pytest.raises(Exception):
+            writer.write(self._rows(1))
+        with pytest.raises(Exception):
+            writer.close()
+        changelog.close()
+
+    def test_stops_writing_after_error(self, tmpdir, monkeypatch):
+        path = str(tmpdir.join("changelog.db"))
+        changelog = ChangeLog(path)
+        failing = threading.Event()
+        calls = []
+
+        def insert_changes(db, rows):
+            # Fails the first batch only once the second is queued behind it
+            calls.append(rows)
+            failing.wait(5)
+            raise ValueError("batch {}".format(len(calls)))
+
+        monkeypatch.setattr(change_log, "insert_changes", insert_changes)
+        writer = ChangeLogWriter(path, max_batch=1)
+        writer.write(self._rows(1))
+        writer.write(self._rows(1))
+        failing.set()
+        with pytest.raises(ValueError, match="batch 1"):
+            writer.flush()
+        assert len(calls) == 1
+        with pytest.raises(ValueError, match="batch 1"):
+            writer.close()
+        changelog.close()
@@ -52,13 +52,31 @@ class TestCleanSpaces:
         # mismatch in number of b chars
         assert clean_redundant_furigana("abbbc[dbbe]") == "abbbc[dbbe]"
 
+        # common characters that are special within regular expressions
+        assert clean_redundant_furigana("a^b[c^d]") == "a[c]^ b[d]"
+        assert clean_redundant_furigana("a-\\b[c-\\d]") == "a[c]-\\ b[d]"
+
+        # each line is cleaned on its own, with the newline preserved
+        assert clean_redundant_furigana("axbyc[dxeyf]\n<b>z</b>") == "a[d]x b[e]y c[f]\n<b>z</b>"
+        assert clean_redundant_furigana("の\n世の中[よのなか]") == "の\n世[よ]の 中[なか]"
+
     def test_bad_formatting(self):
         with pytest.raises(JapaneseReadingFormattingError):
             # We should not be left with nothing left in the reading.
             clean_redundant_furigana("abczzzz[abc]def")
 
+        with pytest.raises(JapaneseReadingFormattingError):
+            # Reading is identical to the expression.
+            clean_redundant_furigana("かな[かな]")
+
     def test_html(self):
         assert clean_redundant_furigana("<b>abc defi[ghi]</b>") == "<b>abc def[gh]i</b>"
         assert clean_redundant_furigana("<b>abc</b> <b>defi[ghi]</b>") == "<b>abc</b> <b>def[gh]i</b>"
         assert clean_redundant_furigana("<span class=\"foo\">abc</span> <span class=\"bar\">defi[ghi]</span>") \
             == "<span class=\"foo\">abc</span> <span class=\"bar\">def[gh]i</span>"
+
+    def test_without_sanity_checks(self):
+        assert clean_redundant_furigana("abc  gdef[ghi]z", sanity_checks=False) == "abc  g def[hi]z"
+
+        with pytest.raises(JapaneseReadingFormattingError):
+            clean_redundant_furigana("abc  gdef[ghi]]", sanity_checks=False)
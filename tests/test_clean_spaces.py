@@ -69,3 +69,18 @@ class TestCleanSpaces:
         assert clean_spaces("""blah <a src="foo"> bar[bee]</a>   """) == """blah<a src="foo"> bar[bee]</a>"""
         assert clean_spaces("  abc   <a href=\"foo\">def</a>[ghi]  \n  <b>mn</b>[aa]  op[qrs]  tuv[wy]  ") \
             == "abc <a href=\"foo\">def</a>[ghi]\n<b>mn</b>[aa] op[qrs] tuv[wy]"
+
+    def test_furigana_after_html(self):
+        assert clean_spaces("abc  <b><i></i>def[ghi]</b>  jk <br> lm") == "abc <b><i></i>def[ghi]</b>jk<br>lm"
+        assert clean_spaces("abc <br> <b>def[ghi]</b>") == "abc<br> <b>def[ghi]</b>"
+
+    def test_long_line(self):
+        assert clean_spaces(" 杯[はい],   <b>杯[さかずき]</b>  " * 2000) \
+            == ("杯[はい], <b>杯[さかずき]</b> " * 2000)[:-1]
+
+    def test_without_sanity_checks(self):
+        assert clean_spaces("  a[bc] de[fghi]  jkl[mnop]  qr  ", sanity_checks=False) == "a[bc] de[fghi] jkl[mnop]qr"
+        assert clean_spaces("<b> foo </b>", sanity_checks=False) == "<b>foo</b>"
+
+        with pytest.raises(JapaneseReadingFormattingError):
+            clean_spaces("abc  def[ghi]]", sanity_checks=False)
@@ -0,0 +1,60 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from japanese_text_cleaner.db.clean_state import CleanState
+from japanese_text_cleaner.db.notes import NoteField
+from japanese_text_cleaner.text.batch import clean_many
+from japanese_text_cleaner.text.pipeline import ALL_CLEANERS, FURIGANA, SPACING
+
+
+def _scanned(cleaner, *fields):
+    note_fields = [NoteField(nid=nid, mid=1, field=field, content=content, mod=mod)
+                   for nid, field, content, mod in fields]
+    return list(zip(note_fields, clean_many([f.content for f in note_fields], cleaner)))
+
+
+class TestCleanState:
+
+    def test_record_clean(self, tmpdir):
+        state = CleanState(str(tmpdir.join("clean_state.db")))
+        state.record_clean(SPACING, _scanned(
+            SPACING, (10, "Reading", "一[いち]", 110), (10, "Expression", "一 ", 110), (11, "Reading", "文", 111)))
+        assert state.clean_mods(SPACING, [10, 11, 12]) == {(10, "Reading"): 110, (11, "Reading"): 111}
+        assert state.clean_mods(FURIGANA, [10, 11]) == {}
+
+        # Persisted across instances
+        state.close()
+        state = CleanState(str(tmpdir.join("clean_state.db")))
+        assert state.clean_mods(SPACING, [11]) == {(11, "Reading"): 111}
+
+        state.clear()
+        assert state.clean_mods(SPACING, [10, 11]) == {}
+
+    def test_newer_mod_replaces(self, tmpdir):
+        state = CleanState(str(tmpdir.join("clean_state.db")))
+        state.record_clean(SPACING, _scanned(SPACING, (10, "Reading", "一", 110)))
+        state.record_clean(SPACING, _scanned(SPACING, (10, "Reading", "一", 200)))
+        assert state.clean_mods(SPACING, [10]) == {(10, "Reading"): 200}
+
+    def test_version(self, tmpdir, monkeypatch):
+        state = CleanState(str(tmpdir.join("clean_state.db")))
+        state.record_clean(ALL_CLEANERS, _scanned(ALL_CLEANERS, (10, "Reading", "一", 110)))
+        assert state.clean_mods(ALL_CLEANERS, [10]) == {(10, "Reading"): 110}
+        monkeypatch.setattr(ALL_CLEANERS, "version", "1+2")
+        assert state.clean_mods(ALL_CLEANERS, [10]) == {}
+
+    def test_chunked(self, tmpdir):
+        state = CleanState(str(tmpdir.join("clean_state.db")))
+        state.record_clean(SPACING, _scanned(SPACING, *[(nid, "Reading", "r", nid) for nid in range(1000)]))
+        assert len(state.clean_mods(SPACING, list(range(1000)), chunk_size=300)) == 1000
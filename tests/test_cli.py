@@ -0,0 +1,123 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from japanese_text_cleaner.cli import main
+from japanese_text_cleaner.db.change_log import ChangeLog
+from japanese_text_cleaner.db.collection import field_checksum
+from japanese_text_cleaner.db.sqlite import DB
+
+from .test_collection import SENTENCE_MID, VOCAB_MID, legacy_collection
+
+NOTES = [
+    (10, VOCAB_MID, ["一", " 一[いち]", "one"]),
+    (11, SENTENCE_MID, ["文 です", "文[ぶん]"]),
+    (12, VOCAB_MID, ["二", "二[に]", "two"]),
+]
+
+
+def _collection(tmpdir):
+    path = str(tmpdir.join("collection.anki2"))
+    legacy_collection(path, NOTES).close()
+    return path
+
+
+def _main(tmpdir, *args):
+    return main(list(args) + ["--workers", "1", "--clean-state", str(tmpdir.join("clean_state.db"))])
+
+
+class TestCollection:
+
+    def test_check(self, tmpdir, capsys):
+        path = _collection(tmpdir)
+        assert _main(tmpdir, "check", path, "--field", "Reading") == 0
+        assert "Checked 3 fields of 3 notes" in capsys.readouterr().out
+        assert DB(path).scalar("select count(*) from notes where mod > 200") == 0
+
+    def test_diff(self, tmpdir, capsys):
+        path = _collection(tmpdir)
+        output = str(tmpdir.join("diff.html"))
+        assert _main(tmpdir, "diff", path, "--field", "Reading", "--field", "Sentence", "--output", output) == 0
+        assert "Saved diff of 2 fields in 1 pages" in capsys.readouterr().out
+        page = tmpdir.join("diff_pages", "page_0001.html").read_text("utf-8")
+        assert "<p>nid 10 Reading:</p>" in page
+        assert "<p>nid 11 Sentence:</p>" in page
+
+    def test_fix(self, tmpdir, capsys):
+        path = _collection(tmpdir)
+        changelog_path = str(tmpdir.join("changelog.db"))
+        assert _main(tmpdir, "fix", path, "--field", "Reading", "--field", "Sentence", "--cleaner", "clean_spaces",
+                     "--changelog", changelog_path, "--chunk-size", "2") == 0
+        out = capsys.readouterr().out
+        assert "Updated 2 fields of 2 notes" in out
+        assert "Updated the sort field and duplicate checksum of 2 notes" in out
+
+        db = DB(path)
+        assert db.all("select id, flds, usn from notes order by id") == [
+            (10, "一\x1f一[いち]\x1fone", -1),
+            (11, "文です\x1f文[ぶん]", -1),
+            (12, "二\x1f二[に]\x1ftwo", 0),
+        ]
+        assert db.all("select id, sfld, csum from notes order by id") == [
+            (10, "一[いち]", field_checksum("一")),
+            (11, "文です", field_checksum("文です")),
+            (12, "", 0),
+        ]
+        assert db.scalar("select mod from col") > 0
+
+        changelog = ChangeLog(changelog_path)
+        assert sorted((op, nid, fld, old, new) for op, _, nid, fld, old, new in changelog.iter_changes()) == [
+            ("clean_spaces", 10, "Reading", " 一[いち]", "一[いち]"),
+            ("clean_spaces", 11, "Sentence", "文 です", "文です"),
+        ]
+        changelog.close()
+
+    def test_skips_clean(self, tmpdir, capsys):
+        path = _collection(tmpdir)
+        assert _main(tmpdir, "check", path, "--field", "Reading") == 0
+        capsys.readouterr()
+
+        db = DB(path)
+        db.execute("update notes set flds = ?, mod = ? where id = ?", "二\x1f 二[に]\x1ftwo", 300, 12)
+        db.commit()
+        assert _main(tmpdir, "check", path, "--field", "Reading") == 0
+        out = capsys.readouterr().out
+        assert "Skipped 1 fields found clean since their notes were last modified" in out
+        assert "Checked 2 fields of 2 notes" in out
+
+        assert _main(tmpdir, "check", path, "--field", "Reading", "--recheck") == 0
+        assert "Checked 3 fields of 3 notes" in capsys.readouterr().out
+
+    def test_missing_field(self, tmpdir, capsys):
+        path = _collection(tmpdir)
+        assert _main(tmpdir, "check", path, "--field", "Missing") == 2
+        assert "No note type has any of the fields Missing" in capsys.readouterr().err
+
+
+class TestNotesFile:
+
+    def test_fix(self, tmpdir, capsys):
+        path = tmpdir.join("notes.txt")
+        path.write_text("#separator:tab\n#columns:Expression\tReading\n一\t 一[いち]\n二\t二[に]\n", "utf-8")
+        output = str(tmpdir.join("cleaned.txt"))
+        assert main(["fix", str(path), "--field", "Reading", "--output", output, "--workers", "1"]) == 0
+        assert "Updated 1 fields" in capsys.readouterr().out
+        assert tmpdir.join("cleaned.txt").read_text("utf-8") == \
+            "#separator:tab\n#columns:Expression\tReading\n一\t一[いち]\n二\t二[に]\n"
+
+    def test_csv_columns_by_number(self, tmpdir, capsys):
+        path = tmpdir.join("notes.csv")
+        path.write_text("一, 一[いち]\n", "utf-8")
+        output = str(tmpdir.join("cleaned.csv"))
+        assert main(["fix", str(path), "--field", "2", "--output", output, "--workers", "1"]) == 0
+        assert tmpdir.join("cleaned.csv").read_text("utf-8") == "一,一[いち]\n"
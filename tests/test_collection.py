@@ -0,0 +1,120 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+from japanese_text_cleaner.db.collection import (CollectionModels, field_checksum, mark_collection_modified,
+                                                 strip_html_media, update_sort_fields)
+from japanese_text_cleaner.db.notes import field_indices
+from japanese_text_cleaner.db.sqlite import DB
+
+VOCAB_MID = 1
+SENTENCE_MID = 2
+
+
+def legacy_collection(path, notes):
+    """Creates a collection file with the note types in the models column, as older versions of Anki do"""
+    db = DB(path)
+    db.executescript("""
+        create table col (id integer primary key, mod integer not null, models text not null);
+        create table notes (id integer primary key, mid integer not null, flds text not null,
+                            mod integer not null, usn integer not null, sfld text not null,
+                            csum integer not null);
+    """)
+    models = {
+        str(VOCAB_MID): {"id": VOCAB_MID, "name": "Vocab", "sortf": 1, "flds": [
+            {"name": "Expression", "ord": 0}, {"name": "Reading", "ord": 1}, {"name": "Meaning", "ord": 2}]},
+        str(SENTENCE_MID): {"id": SENTENCE_MID, "name": "Sentence", "flds": [
+            {"name": "Sentence", "ord": 0}, {"name": "Reading", "ord": 1}]},
+    }
+    db.execute("insert into col (id, mod, models) values (1, 0, ?)", json.dumps(models))
+    db.executemany("insert into notes (id, mid, flds, mod, usn, sfld, csum) values (?,?,?,?,0,'',0)",
+                   [(nid, mid, "\x1f".join(fields), 100 + nid) for nid, mid, fields in notes])
+    db.commit()
+    return db
+
+
+class TestCollectionModels:
+
+    def test_legacy(self, tmpdir):
+        db = legacy_collection(str(tmpdir.join("collection.anki2")), [])
+        models = CollectionModels(db)
+        assert field_indices(models, ["Reading", "Expression"]) == {
+            VOCAB_MID: (("Reading", 1), ("Expression", 0)),
+            SENTENCE_MID: (("Reading", 1),),
+        }
+        assert models.get(SENTENCE_MID)["name"] == "Sentence"
+        assert models.sort_index(VOCAB_MID) == 1
+        assert models.sort_index(SENTENCE_MID) == 0
+
+    def test_notetypes_table(self):
+        db = DB(":memory:")
+        db.executescript("""
+            create table notetypes (id integer primary key, name text not null);
+            create table fields (ntid integer not null, ord integer not null, name text not null,
+                                 primary key (ntid, ord));
+            insert into notetypes values (7, 'Vocab');
+            insert into fields values (7, 1, 'Reading');
+            insert into fields values (7, 0, 'Expression');
+        """)
+        models = CollectionModels(db)
+        assert models.all() == [{"id": 7, "name": "Vocab", "sortf": 0, "flds": [
+            {"name": "Expression", "ord": 0}, {"name": "Reading", "ord": 1}]}]
+        assert field_indices(models, ["Reading"]) == {7: (("Reading", 1),)}
+
+    def test_notetypes_config_sort_index(self):
+        db = DB(":memory:")
+        db.executescript("""
+            create table notetypes (id integer primary key, name text not null, config blob not null);
+            create table fields (ntid integer not null, ord integer not null, name text not null,
+                                 primary key (ntid, ord));
+            insert into fields values (7, 0, 'Expression');
+            insert into fields values (7, 1, 'Reading');
+            insert into fields values (8, 0, 'Sentence');
+        """)
+        # kind 0, sort_field_idx 1 and css "ab" for 7.  The default sort field of 0 is left out for 8.
+        db.execute("insert into notetypes values (7, 'Vocab', ?)", b"\x08\x00\x10\x01\x1a\x02ab")
+        db.execute("insert into notetypes values (8, 'Sentence', ?)", b"\x1a\x02ab")
+        models = CollectionModels(db)
+        assert models.sort_index(7) == 1
+        assert models.sort_index(8) == 0
+
+    def test_update_sort_fields(self, tmpdir):
+        db = legacy_collection(str(tmpdir.join("collection.anki2")), [
+            (10, VOCAB_MID, ["<b>一</b>", "一[いち]", "one"]),
+            (11, SENTENCE_MID, ["文&nbsp;です", "文[ぶん]"]),
+            (12, SENTENCE_MID, ["二", "二[に]"]),
+        ])
+        update_sort_fields(db, CollectionModels(db), [10, 11], chunk_size=1)
+        assert db.all("select id, sfld, csum from notes order by id") == [
+            (10, "一[いち]", field_checksum("一")),
+            (11, "文 です", field_checksum("文 です")),
+            (12, "", 0),
+        ]
+
+    def test_mark_modified(self, tmpdir):
+        db = legacy_collection(str(tmpdir.join("collection.anki2")), [])
+        mark_collection_modified(db, 12345)
+        assert db.scalar("select mod from col") == 12345
+
+
+class TestFieldCaches:
+
+    def test_strip_html_media(self):
+        assert strip_html_media('<b>一</b>&nbsp;&amp;<!-- note --><img src="a.jpg">') == "一 & a.jpg "
+        assert strip_html_media("<style>b {}</style>文<script>x()</script>") == "文"
+
+    def test_field_checksum(self):
+        # First 8 hex digits of the sha1 of the text without html
+        assert field_checksum("<i>一</i>") == field_checksum("一") == 0xd274eee8
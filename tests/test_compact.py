@@ -0,0 +1,68 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from japanese_text_cleaner.db.compact import (apply_delta, decode_blob, decode_bytes, decode_change, encode_blob,
+                                              encode_bytes, encode_change, make_delta)
+
+
+class TestEncodeBytes:
+
+    def test_small_not_compressed(self):
+        assert encode_bytes(b"abc") == b"rabc"
+        assert decode_bytes(b"rabc") == b"abc"
+
+    def test_large_compressed(self):
+        data = "一[いち] です".encode("utf-8") * 100
+        encoded = encode_bytes(data)
+        assert encoded[:1] == b"z"
+        assert len(encoded) < len(data)
+        assert decode_bytes(encoded) == data
+
+    def test_blob(self):
+        assert decode_blob(encode_blob("一[いち]")) == "一[いち]"
+
+
+class TestDelta:
+
+    def test_round_trip(self):
+        for base, other in [
+            ("<b> 一[いち]</b>から  始[はじ]めましょう。", "<b>一[いち]</b>から始[はじ]めましょう。"),
+            ("abc", "abc"),
+            ("", "abc"),
+            ("abc", ""),
+            ("a b c d", "abcd"),
+            ("<div> 一</div>\n<div>二 [に]</div>\n", "<div>一</div>\n<div>二[に]</div>\n<div>三</div>"),
+            ("a\nb\nc\n", "x\ny\n"),
+        ]:
+            assert apply_delta(base, make_delta(base, other)) == other
+
+    def test_small_edits(self):
+        assert make_delta("a b c", "abc") == [[1, 3, "b"]]
+
+    def test_lines(self):
+        base = "一 [いち]\n二[に]\n三 [さん]\n"
+        assert make_delta(base, "一[いち]\n二[に]\n三[さん]\n") == [[1, 1, ""], [13, 1, ""]]
+        assert make_delta(base, "一 [いち]\n三 [さん]\n") == [[7, 5, ""]]
+
+
+class TestEncodeChange:
+
+    def test_longer_value_is_base(self):
+        base, base_is_old, delta = encode_change("文 です", "文です")
+        assert (base, base_is_old) == ("文 です", True)
+        assert decode_change(base, base_is_old, delta) == ("文 です", "文です")
+
+        base, base_is_old, delta = encode_change("文です", "文 です")
+        assert (base, base_is_old) == ("文 です", False)
+        assert decode_change(base, base_is_old, delta) == ("文です", "文 です")
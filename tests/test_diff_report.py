@@ -0,0 +1,71 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from japanese_text_cleaner.diff_report import DiffReportWriter
+from japanese_text_cleaner.text.pipeline import SPACING
+
+
+def _write(tmpdir, count, page_size, name="diff.html"):
+    path = str(tmpdir.join(name))
+    with DiffReportWriter(path, page_size=page_size) as report:
+        for nid in range(count):
+            report.add(nid, "Reading", SPACING.clean("a b{}".format(nid)))
+    return path, report
+
+
+class TestDiffReportWriter:
+
+    def test_pages(self, tmpdir):
+        path, report = _write(tmpdir, 5, page_size=2)
+        assert report.page_counts == [2, 2, 1]
+        assert report.count == 5
+        assert sorted(p.basename for p in tmpdir.join("diff_pages").listdir()) == [
+            "page_0001.html", "page_0002.html", "page_0003.html"]
+
+        index = tmpdir.join("diff.html").read_text("utf-8")
+        assert "5 fields need updating" in index
+        assert '<a href="diff_pages/page_0003.html">Page 3</a>: 1 fields' in index
+
+        page = tmpdir.join("diff_pages", "page_0002.html").read_text("utf-8")
+        assert "<p>nid 2 Reading:</p>" in page
+        assert "<p>nid 4 Reading:</p>" not in page
+        assert '<a href="page_0003.html">Next</a>' in page
+        assert '<a href="page_0001.html">Previous</a>' in page
+        assert '<a href="../diff.html">Index</a>' in page
+        assert "<del>" in page
+
+    def test_full_last_page_has_no_next(self, tmpdir):
+        _, report = _write(tmpdir, 4, page_size=2)
+        assert report.page_counts == [2, 2]
+        page = tmpdir.join("diff_pages", "page_0002.html").read_text("utf-8")
+        assert "Next" not in page
+
+    def test_empty(self, tmpdir):
+        path, report = _write(tmpdir, 0, page_size=2)
+        assert report.page_counts == []
+        assert "0 fields need updating" in tmpdir.join("diff.html").read_text("utf-8")
+        assert not tmpdir.join("diff_pages").exists()
+
+    def test_links_quoted(self, tmpdir):
+        _write(tmpdir, 1, page_size=2, name="a#b c.html")
+        assert '<a href="a%23b%20c_pages/page_0001.html">Page 1</a>' in tmpdir.join("a#b c.html").read_text("utf-8")
+        page = tmpdir.join("a#b c_pages", "page_0001.html").read_text("utf-8")
+        assert '<a href="../a%23b%20c.html">Index</a>' in page
+
+    def test_old_pages_removed(self, tmpdir):
+        _write(tmpdir, 5, page_size=2)
+        tmpdir.join("diff_pages", "notes.txt").write_text("kept", "utf-8")
+        _, report = _write(tmpdir, 1, page_size=2)
+        assert report.page_counts == [1]
+        assert sorted(p.basename for p in tmpdir.join("diff_pages").listdir()) == ["notes.txt", "page_0001.html"]
@@ -0,0 +1,82 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+from japanese_text_cleaner.text.edits import CleanResult, Edit, apply_edits, compose_edits
+from japanese_text_cleaner.text.pipeline import FURIGANA, SPACING
+
+
+def random_edits(rand, src):
+    edits = []
+    pos = rand.randint(0, 2)
+    while pos <= len(src):
+        deleted = src[pos:pos + rand.randint(0, 3)]
+        inserted = "".join(rand.choice("xyz") for _ in range(rand.randint(0, 2)))
+        if deleted or inserted:
+            edits.append(Edit(pos, deleted, inserted))
+        pos += len(deleted) + rand.randint(1, 3)
+    return edits
+
+
+class TestCleanResult:
+
+    def test_unchanged(self):
+        result = CleanResult("abc", [])
+        assert not result.changed
+        assert result.cleaned == "abc"
+        assert result.html_diff() == "abc"
+
+    def test_diffs(self):
+        result = CleanResult("a  bc[d]e", [Edit(1, "  ", ""), Edit(3, "bc[d]e", "b c[d]e")])
+        assert result.changed
+        assert result.cleaned == "ab c[d]e"
+        assert result.html_diff() == "a<del>&nbsp;&nbsp;</del><del>bc[d]e</del><ins>b&nbsp;c[d]e</ins>"
+        assert result.text_diff() == "a[-  -][-bc[d]e-]{+b c[d]e+}"
+
+    def test_matches_previous_html_diff(self):
+        # Same output the cleaners produced when they rendered html diffs themselves
+        assert SPACING.clean("  abc   def[ghi]  ").html_diff() \
+            == "<del>&nbsp;&nbsp;</del>abc<del>&nbsp;&nbsp;</del> def[ghi]<del>&nbsp;&nbsp;</del>"
+        assert FURIGANA.clean("abc gdef[ghi]z").html_diff() \
+            == "abc <del>gdef[ghi]z</del><ins>g&nbsp;def[hi]z</ins>"
+
+
+class TestComposeEdits:
+
+    def test_separate(self):
+        src = "a b c"
+        first = [Edit(0, "a", "x")]
+        second = [Edit(3, " ", "")]
+        assert compose_edits(src, first, second) == [Edit(0, "a", "x"), Edit(3, " ", "")]
+
+    def test_overlapping(self):
+        src = "abc def"
+        first = [Edit(0, "abc", "a bc")]
+        second = [Edit(1, " b", "")]
+        assert compose_edits(src, first, second) == [Edit(0, "abc", "ac")]
+
+    def test_random(self):
+        rand = random.Random(0)
+        for _ in range(2000):
+            src = "".join(rand.choice("abcdef") for _ in range(rand.randint(0, 10)))
+            first = random_edits(rand, src)
+            intermediate = apply_edits(src, first)
+            second = random_edits(rand, intermediate)
+            composed = compose_edits(src, first, second)
+            assert apply_edits(src, composed) == apply_edits(intermediate, second)
+            for edit in composed:
+                assert src[edit.offset:edit.offset + len(edit.deleted)] == edit.deleted
+            for prev, edit in zip(composed, composed[1:]):
+                assert prev.offset + len(prev.deleted) < edit.offset
@@ -0,0 +1,98 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+import gzip
+import json
+
+import pytest
+
+from japanese_text_cleaner.db.change_log import ChangeLog, ChangeLogEntry, ChangeLogQuery
+from japanese_text_cleaner.export import export_changes, export_format
+
+
+@pytest.fixture
+def changelog(tmpdir):
+    changelog = ChangeLog(str(tmpdir.join("changelog.db")))
+    changelog.record_and_commit_changes("clean_spaces", 1000, [
+        ChangeLogEntry(ts=1000, nid=1, fld="Reading", old="一 [いち]", new="一[いち]"),
+        ChangeLogEntry(ts=1001, nid=2, fld="Reading", old="a,\n\"b\"", new="a,\"b\""),
+    ])
+    changelog.record_and_commit_changes("clean_furigana", 2000, [
+        ChangeLogEntry(ts=2000, nid=3, fld="Expression", old="別に[べつに]", new="別[べつ]に"),
+    ])
+    yield changelog
+    changelog.close()
+
+
+EXPECTED = [
+    {"ts": 1000, "op": "clean_spaces", "nid": 1, "fld": "Reading", "old": "一 [いち]", "new": "一[いち]"},
+    {"ts": 1001, "op": "clean_spaces", "nid": 2, "fld": "Reading", "old": "a,\n\"b\"", "new": "a,\"b\""},
+    {"ts": 2000, "op": "clean_furigana", "nid": 3, "fld": "Expression", "old": "別に[べつに]", "new": "別[べつ]に"},
+]
+
+
+def _read_csv(inf):
+    return [dict(row, ts=int(row["ts"]), nid=int(row["nid"])) for row in csv.DictReader(inf)]
+
+
+class TestExportChanges:
+
+    def test_csv(self, tmpdir, changelog):
+        path = str(tmpdir.join("changes.csv"))
+        assert export_changes(changelog, path) == 3
+        with open(path, encoding="utf-8", newline="") as inf:
+            assert _read_csv(inf) == EXPECTED
+
+    def test_csv_gzip(self, tmpdir, changelog):
+        path = str(tmpdir.join("changes.csv.gz"))
+        assert export_changes(changelog, path) == 3
+        with gzip.open(path, "rt", encoding="utf-8", newline="") as inf:
+            assert _read_csv(inf) == EXPECTED
+
+    def test_jsonl(self, tmpdir, changelog):
+        path = str(tmpdir.join("changes.jsonl"))
+        assert export_changes(changelog, path) == 3
+        with open(path, encoding="utf-8") as inf:
+            assert [json.loads(line) for line in inf] == EXPECTED
+
+    def test_jsonl_gzip(self, tmpdir, changelog):
+        path = str(tmpdir.join("changes.JSONL.GZ"))
+        assert export_changes(changelog, path) == 3
+        with gzip.open(path, "rt", encoding="utf-8") as inf:
+            assert [json.loads(line) for line in inf] == EXPECTED
+
+    def test_filtered(self, tmpdir, changelog):
+        path = str(tmpdir.join("changes.jsonl"))
+        assert export_changes(changelog, path, ChangeLogQuery(init_ts=1000)) == 2
+        with open(path, encoding="utf-8") as inf:
+            assert [json.loads(line) for line in inf] == EXPECTED[:2]
+        assert export_changes(changelog, path, ChangeLogQuery(op="clean_furigana")) == 1
+        assert export_changes(changelog, path, ChangeLogQuery(start_ts=1001, end_ts=2000)) == 1
+
+    def test_batches(self, changelog):
+        assert [change[2] for change in changelog.iter_changes(batch_size=2)] == [1, 2, 3]
+
+
+class TestExportFormat:
+
+    def test_formats(self):
+        assert export_format("changes.csv") == ("csv", False)
+        assert export_format("changes.CSV.gz") == ("csv", True)
+        assert export_format("changes.jsonl") == ("jsonl", False)
+        assert export_format("changes.jsonl.gz") == ("jsonl", True)
+
+    def test_unknown(self):
+        with pytest.raises(ValueError):
+            export_format("changes.txt")
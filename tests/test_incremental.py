@@ -0,0 +1,57 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from japanese_text_cleaner.text.incremental import IncrementalCleaner
+from japanese_text_cleaner.text.pipeline import ALL_CLEANERS, FURIGANA, SPACING
+
+from .test_batch import CountingCleaner
+
+
+class TestIncrementalCleaner:
+
+    def test_same_as_cleaner(self):
+        content = "<b> 一[いち]</b>から  始[はじ]めましょう。\n文 です\n\n 三[さん]"
+        assert IncrementalCleaner(ALL_CLEANERS).clean(content) == ALL_CLEANERS.clean(content).cleaned
+
+    def test_same_as_furigana_cleaner(self):
+        for content in ["かの世\n[かい中]", "の\n世の中[よのなか]", "一[いち]\n喋る[しゃべる]"]:
+            assert IncrementalCleaner(FURIGANA).clean(content) == FURIGANA.clean(content).cleaned
+
+    def test_unchanged(self):
+        content = "一[いち]\n二[に]"
+        assert IncrementalCleaner(ALL_CLEANERS).clean(content) is content
+
+    def test_only_edited_lines_cleaned(self):
+        counting = CountingCleaner(SPACING)
+        cleaner = IncrementalCleaner(counting)
+        assert cleaner.clean("文 です\n一 です") == "文です\n一です"
+        assert counting.cleaned == ["文 です", "一 です"]
+        assert cleaner.clean("文 です\n一 です\n二 です") == "文です\n一です\n二です"
+        assert counting.cleaned == ["文 です", "一 です", "二 です"]
+
+    def test_lines_without_spaces_skipped(self):
+        counting = CountingCleaner(SPACING)
+        assert IncrementalCleaner(counting).clean("文 です\n一です") == "文です\n一です"
+        assert counting.cleaned == ["文 です"]
+
+    def test_invalid_line_left_as_is(self):
+        # Furigana still being typed has no closing bracket
+        content = "文 です\n一[いち"
+        assert IncrementalCleaner(ALL_CLEANERS).clean(content) == "文です\n一[いち"
+
+    def test_cache_bounded(self):
+        cleaner = IncrementalCleaner(SPACING, cache_size=2)
+        for i in range(5):
+            cleaner.clean("{} です".format(i))
+        assert len(cleaner.cache) == 2
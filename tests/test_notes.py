@@ -0,0 +1,183 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from japanese_text_cleaner.db.notes import (NoteChange, NoteChangedError, NoteField, fetch_note_fields, field_indices,
+                                            note_type_ids, update_note_fields)
+from japanese_text_cleaner.db.sqlite import DB
+
+VOCAB_MID = 1
+SENTENCE_MID = 2
+
+
+class FakeModels:
+    """Stands in for the collection's ModelManager"""
+
+    def __init__(self, models):
+        self.models = models
+
+    def all(self):
+        return self.models
+
+    def fieldMap(self, model):
+        return {f["name"]: (f["ord"], f) for f in model["flds"]}
+
+
+def _model(mid, *field_names):
+    return {"id": mid, "flds": [{"name": name, "ord": i} for i, name in enumerate(field_names)]}
+
+
+MODELS = FakeModels([
+    _model(VOCAB_MID, "Expression", "Reading", "Meaning"),
+    _model(SENTENCE_MID, "Sentence", "Meaning", "Reading"),
+])
+
+
+def collection_db(notes):
+    db = DB(":memory:")
+    db.executescript("create table notes (id integer primary key, mid integer not null, "
+                     "flds text not null, mod integer not null, usn integer not null)")
+    db.executemany("insert into notes (id, mid, flds, mod, usn) values (?,?,?,?,0)",
+                   [(nid, mid, "\x1f".join(fields), 100 + nid) for nid, mid, fields in notes])
+    return db
+
+
+class TestFieldIndices:
+
+    def test_indices(self):
+        assert field_indices(MODELS, ["Reading"]) == {VOCAB_MID: (("Reading", 1),), SENTENCE_MID: (("Reading", 2),)}
+        assert field_indices(MODELS, ["Expression"]) == {VOCAB_MID: (("Expression", 0),)}
+        assert field_indices(MODELS, ["Missing"]) == {}
+
+    def test_multiple_fields(self):
+        assert field_indices(MODELS, ["Reading", "Expression", "Sentence"]) == {
+            VOCAB_MID: (("Reading", 1), ("Expression", 0)),
+            SENTENCE_MID: (("Reading", 2), ("Sentence", 0)),
+        }
+
+
+class TestNoteTypeIds:
+
+    def test_note_type_ids(self):
+        db = collection_db([(nid, SENTENCE_MID if nid % 3 else VOCAB_MID, ["a", "b", "c"]) for nid in range(1, 1001)])
+        assert note_type_ids(db, list(range(1, 1001)), chunk_size=300) == [SENTENCE_MID, VOCAB_MID]
+        assert note_type_ids(db, [3, 99]) == [VOCAB_MID]
+
+
+class TestFetchNoteFields:
+
+    def test_fetch(self):
+        db = collection_db([
+            (10, VOCAB_MID, ["一", "一[いち]", "one"]),
+            (11, SENTENCE_MID, ["文", "sentence", "文[ぶん]"]),
+            (12, VOCAB_MID, ["二", "", "two"]),
+        ])
+        assert fetch_note_fields(db, [12, 10, 11], field_indices(MODELS, ["Reading"])) == [
+            NoteField(nid=12, mid=VOCAB_MID, field="Reading", content="", mod=112),
+            NoteField(nid=10, mid=VOCAB_MID, field="Reading", content="一[いち]", mod=110),
+            NoteField(nid=11, mid=SENTENCE_MID, field="Reading", content="文[ぶん]", mod=111),
+        ]
+
+    def test_multiple_fields(self):
+        db = collection_db([
+            (10, VOCAB_MID, ["一", "一[いち]", "one"]),
+            (11, SENTENCE_MID, ["文", "sentence", "文[ぶん]"]),
+        ])
+        indices = {VOCAB_MID: (("Expression", 0), ("Reading", 1)), SENTENCE_MID: (("Sentence", 0),)}
+        assert fetch_note_fields(db, [11, 10], indices) == [
+            NoteField(nid=11, mid=SENTENCE_MID, field="Sentence", content="文", mod=111),
+            NoteField(nid=10, mid=VOCAB_MID, field="Expression", content="一", mod=110),
+            NoteField(nid=10, mid=VOCAB_MID, field="Reading", content="一[いち]", mod=110),
+        ]
+
+    def test_skips_missing(self):
+        db = collection_db([
+            (10, VOCAB_MID, ["一", "一[いち]", "one"]),
+            (11, SENTENCE_MID, ["文", "sentence", "文[ぶん]"]),
+        ])
+        assert fetch_note_fields(db, [10, 11, 99], field_indices(MODELS, ["Expression"])) == [
+            NoteField(nid=10, mid=VOCAB_MID, field="Expression", content="一", mod=110),
+        ]
+
+    def test_chunked(self):
+        notes = [(nid, VOCAB_MID, ["e{}".format(nid), "r{}".format(nid), "m"]) for nid in range(1, 2001)]
+        db = collection_db(notes)
+        nids = list(range(2000, 0, -1))
+        fields = fetch_note_fields(db, nids, field_indices(MODELS, ["Reading"]), chunk_size=300)
+        assert [f.nid for f in fields] == nids
+        assert [f.content for f in fields] == ["r{}".format(nid) for nid in nids]
+
+    def test_empty(self):
+        assert fetch_note_fields(collection_db([]), [], {VOCAB_MID: (("Expression", 0),)}) == []
+
+
+class TestUpdateNoteFields:
+
+    def _db(self):
+        return collection_db([
+            (10, VOCAB_MID, ["一", "一[いち]", "one"]),
+            (11, SENTENCE_MID, ["文", "sentence", " 文[ぶん]"]),
+            (12, VOCAB_MID, ["二", "二[に]", "two"]),
+        ])
+
+    def test_update(self):
+        db = self._db()
+        update_note_fields(db, [
+            NoteChange(nid=11, field="Reading", old=" 文[ぶん]", new="文[ぶん]"),
+            NoteChange(nid=10, field="Reading", old="一[いち]", new="一 [いち]"),
+        ], field_indices(MODELS, ["Reading"]), mod=500, usn=-1)
+        assert db.all("select id, flds, mod, usn from notes order by id") == [
+            (10, "一\x1f一 [いち]\x1fone", 500, -1),
+            (11, "文\x1fsentence\x1f文[ぶん]", 500, -1),
+            (12, "二\x1f二[に]\x1ftwo", 112, 0),
+        ]
+
+    def test_multiple_fields(self):
+        db = self._db()
+        update_note_fields(db, [
+            NoteChange(nid=10, field="Expression", old="一", new="壱"),
+            NoteChange(nid=10, field="Reading", old="一[いち]", new="壱[いち]"),
+        ], field_indices(MODELS, ["Expression", "Reading"]), mod=500, usn=-1)
+        assert db.list("select flds from notes where id = 10") == ["壱\x1f壱[いち]\x1fone"]
+
+    def test_field_not_selected(self):
+        db = self._db()
+        with pytest.raises(NoteChangedError):
+            update_note_fields(db, [NoteChange(nid=10, field="Meaning", old="one", new="1")],
+                               field_indices(MODELS, ["Reading"]), mod=500, usn=-1)
+
+    def test_chunked(self):
+        db = collection_db([(nid, VOCAB_MID, ["e", "r{}".format(nid), "m"]) for nid in range(1, 1001)])
+        changes = [NoteChange(nid=nid, field="Reading", old="r{}".format(nid), new="R{}".format(nid))
+                   for nid in range(1, 1001)]
+        update_note_fields(db, changes, field_indices(MODELS, ["Reading"]), mod=500, usn=-1, chunk_size=300)
+        assert db.list("select flds from notes order by id") == ["e\x1fR{}\x1fm".format(nid) for nid in range(1, 1001)]
+
+    def test_changed(self):
+        db = self._db()
+        with pytest.raises(NoteChangedError):
+            update_note_fields(db, [
+                NoteChange(nid=10, field="Reading", old="一[いち]", new="一 [いち]"),
+                NoteChange(nid=12, field="Reading", old="二 [に]", new="二[に]"),
+            ], field_indices(MODELS, ["Reading"]), mod=500, usn=-1)
+
+        # No notes are updated when any has changed
+        assert db.scalar("select count(*) from notes where mod = 500") == 0
+
+    def test_deleted(self):
+        db = self._db()
+        with pytest.raises(NoteChangedError):
+            update_note_fields(db, [NoteChange(nid=99, field="Reading", old="a", new="b")],
+                               field_indices(MODELS, ["Reading"]), mod=500, usn=-1)
@@ -0,0 +1,73 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+
+import pytest
+
+from japanese_text_cleaner.notes_file import column_indices, read_notes_file, write_notes_file
+
+
+def _read(text):
+    header, rows = read_notes_file(io.StringIO(text, newline=""))
+    return header, list(rows)
+
+
+class TestReadNotesFile:
+
+    def test_plain(self):
+        header, rows = _read("一\t一 [いち]\n二\t二[に]\n")
+        assert header.lines == []
+        assert header.delimiter == "\t"
+        assert header.columns is None
+        assert rows == [["一", "一 [いち]"], ["二", "二[に]"]]
+
+    def test_header(self):
+        header, rows = _read('#separator:comma\n#html:true\n#columns:Expression,Reading\n一,"a ""b"", c"\n')
+        assert header.lines == ["#separator:comma\n", "#html:true\n", "#columns:Expression,Reading\n"]
+        assert header.delimiter == ","
+        assert header.columns == ["Expression", "Reading"]
+        assert rows == [["一", 'a "b", c']]
+
+    def test_multiline_field(self):
+        _, rows = _read('一\t"line 1\nline 2"\n')
+        assert rows == [["一", "line 1\nline 2"]]
+
+    def test_empty(self):
+        assert _read("") == (read_notes_file(io.StringIO(""))[0], [])
+
+
+class TestColumnIndices:
+
+    def test_names_and_numbers(self):
+        header, _ = _read("#columns:Expression\tReading\n")
+        assert column_indices(header, ["Reading", "1"]) == [1, 0]
+
+    def test_unknown(self):
+        header, _ = _read("a\tb\n")
+        with pytest.raises(ValueError):
+            column_indices(header, ["Reading"])
+        with pytest.raises(ValueError):
+            column_indices(header, ["0"])
+
+
+class TestWriteNotesFile:
+
+    def test_round_trip(self):
+        text = '#separator:tab\n一\t"a\nb"\n'
+        header, rows = read_notes_file(io.StringIO(text, newline=""))
+        outf = io.StringIO(newline="")
+        writer = write_notes_file(outf, header)
+        writer.writerows(rows)
+        assert outf.getvalue() == text
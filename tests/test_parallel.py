@@ -0,0 +1,80 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+
+from japanese_text_cleaner.text.batch import CleanCache, clean_many
+from japanese_text_cleaner.text.exceptions import JapaneseReadingFormattingError
+from japanese_text_cleaner.text.parallel import chunk_contents, clean_chunk, clean_parallel, forks_processes
+from japanese_text_cleaner.text.pipeline import ALL_CLEANERS, SPACING
+
+
+def _contents(count):
+    samples = ["a b", "世の中[よのなか]", "<b> 一[いち]</b>から", "c[ d", "abc", "e  f[g]\n 別に[べつに]"]
+    return ["{} {}".format(samples[i % len(samples)], i) for i in range(count)]
+
+
+class TestChunkContents:
+
+    def test_chunk_by_chars(self):
+        assert chunk_contents(["ab", "cd", "e", "fghij", "k"], 4) == [["ab", "cd"], ["e", "fghij"], ["k"]]
+
+    def test_long_content_alone(self):
+        assert chunk_contents(["abcdefgh", "a", "b"], 4) == [["abcdefgh"], ["a", "b"]]
+
+    def test_empty(self):
+        assert chunk_contents([], 4) == []
+
+
+class TestForksProcesses:
+
+    def test_start_method(self, monkeypatch):
+        monkeypatch.setattr(multiprocessing, "get_start_method", lambda allow_none=False: "spawn")
+        assert not forks_processes()
+        monkeypatch.setattr(multiprocessing, "get_start_method", lambda allow_none=False: "fork")
+        assert forks_processes()
+
+    def test_platform_default(self, monkeypatch):
+        monkeypatch.setattr(multiprocessing, "get_start_method", lambda allow_none=False: None)
+        monkeypatch.setattr(multiprocessing, "get_all_start_methods", lambda: ["spawn", "fork"])
+        assert not forks_processes()
+        monkeypatch.setattr(multiprocessing, "get_all_start_methods", lambda: ["fork", "spawn", "forkserver"])
+        assert forks_processes()
+
+
+class TestCleanParallel:
+
+    def test_small_input_in_process(self):
+        contents = _contents(10)
+        assert _summary(clean_parallel(contents, SPACING, workers=4)) == \
+            _summary(clean_chunk(contents, SPACING))
+
+    def test_matches_in_process(self):
+        contents = _contents(20000)
+        cleaned = clean_parallel(contents, ALL_CLEANERS, workers=2)
+        assert _summary(cleaned) == _summary(clean_chunk(contents, ALL_CLEANERS))
+        assert any(isinstance(error, JapaneseReadingFormattingError) for _, error in cleaned)
+
+    def test_empty(self):
+        assert clean_parallel([], SPACING, workers=2, min_parallel_chars=0) == []
+
+    def test_clean_many_workers(self):
+        contents = _contents(20000)
+        outcomes = clean_many(contents, ALL_CLEANERS, cache=CleanCache(), workers=2)
+        expected = clean_many(contents, ALL_CLEANERS, cache=CleanCache())
+        assert _summary(outcomes) == _summary(expected)
+
+
+def _summary(cleaned):
+    return [(result and result.edits, str(error)) for result, error, *_ in cleaned]
@@ -0,0 +1,80 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from japanese_text_cleaner.text import ALL_CLEANERS, CLEANERS, FURIGANA, SPACING, CleanerPipeline
+from japanese_text_cleaner.text.exceptions import JapaneseReadingFormattingError
+from japanese_text_cleaner.text.furigana import clean_redundant_furigana
+from japanese_text_cleaner.text.spacing import clean_spaces
+
+EXAMPLES = [
+    "abcdef",
+    "  a[bc] de[fghi]  jkl[mnop]  qr  ",
+    "  abc   def[ghi]  \n  mn[aa]  op[qrs]  tuv[wy]  ",
+    "abc  gdef[ghi]z",
+    "abbbc[dbbbe] efgmmmmg[zzmmmmyyyy]",
+    "<b> 一[いち]</b>から 始[はじ]めましょう。",
+    "彼女[かのじょ]はよく<b>喋る[しゃべる]</b>ね。",
+    "  abc   <a href=\"foo\">def</a>[ghi]  \n  <b>mn</b>[aa]  op[qrs]  tuv[wy]  ",
+    "の\n世の中[よのなか]",
+    "かの世\n[かい中]",
+]
+
+
+class TestCleanerPipeline:
+
+    def test_single_cleaner(self):
+        for example in EXAMPLES:
+            assert CleanerPipeline([SPACING]).clean(example).cleaned == clean_spaces(example)
+            assert CleanerPipeline([FURIGANA]).clean(example).cleaned == clean_redundant_furigana(example)
+
+    def test_chained_cleaners(self):
+        for example in EXAMPLES:
+            assert CleanerPipeline([FURIGANA, SPACING]).clean(example).cleaned \
+                == clean_spaces(clean_redundant_furigana(example))
+            assert CleanerPipeline([SPACING, FURIGANA]).clean(example).cleaned \
+                == clean_redundant_furigana(clean_spaces(example))
+
+    def test_all_cleaners(self):
+        assert ALL_CLEANERS.clean("  abc  gdef[ghi]z  \n<b> 喋る[しゃべる]</b>").cleaned == "abcg def[hi]z\n<b>喋[しゃべ]る</b>"
+
+    def test_same_as_furigana_then_spacing(self):
+        # Readings never belong to an expression on an earlier line
+        assert ALL_CLEANERS.clean("の\n世の中[よのなか]").cleaned == "の\n世[よ]の 中[なか]"
+        assert ALL_CLEANERS.clean("の\n世の中[よのなか]").cleaned == SPACING.clean(
+            FURIGANA.clean("の\n世の中[よのなか]").cleaned).cleaned
+
+    def test_names(self):
+        assert CleanerPipeline([FURIGANA, SPACING]).name == "clean_furigana+clean_spaces"
+        assert list(CLEANERS) == ["clean_spaces", "clean_furigana", "clean_all"]
+        assert CLEANERS["clean_all"] is ALL_CLEANERS
+
+    def test_edits(self):
+        result = ALL_CLEANERS.clean("ab  cd\n x\nyz")
+        assert result.edits == [(2, "  ", ""), (7, " ", "")]
+
+        # Edits from both cleaners within a chunk are merged
+        result = ALL_CLEANERS.clean("ab  gdef[ghi]\n x")
+        assert result.edits == [(2, "  gdef[ghi]", "g def[hi]"), (14, " ", "")]
+        assert result.cleaned == "abg def[hi]\nx"
+
+    def test_single_cleaner_edits(self):
+        for example in EXAMPLES:
+            assert CleanerPipeline([SPACING]).clean(example).edits == SPACING.clean(example).edits
+            assert CleanerPipeline([FURIGANA]).clean(example).edits == FURIGANA.clean(example).edits
+
+    def test_brackets(self):
+        with pytest.raises(JapaneseReadingFormattingError):
+            ALL_CLEANERS.clean("abc def[ghi]]")
@@ -0,0 +1,61 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from japanese_text_cleaner.progress import Progress
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestProgress:
+
+    def test_no_estimate_before_progress(self):
+        progress = Progress(1000, clock=FakeClock())
+        assert progress.rate is None
+        assert progress.remaining is None
+        assert str(progress) == "0 of 1000 notes"
+
+    def test_estimate(self):
+        clock = FakeClock()
+        progress = Progress(1000, clock=clock)
+        clock.now += 2.0
+        progress.update(100)
+        assert progress.rate == 50.0
+        assert progress.remaining == 18.0
+        assert str(progress) == "100 of 1000 notes (50 notes/sec, 18s remaining)"
+
+        clock.now += 1.0
+        progress.update(50)
+        assert str(progress) == "150 of 1000 notes (50 notes/sec, 17s remaining)"
+
+    def test_minutes_remaining(self):
+        clock = FakeClock()
+        progress = Progress(10000, clock=clock)
+        clock.now += 10.0
+        progress.update(100)
+        assert str(progress) == "100 of 10000 notes (10 notes/sec, 16m 30s remaining)"
+
+    def test_unknown_total(self):
+        clock = FakeClock()
+        progress = Progress(None, "rows", clock=clock)
+        clock.now += 2.0
+        progress.update(100)
+        assert progress.remaining is None
+        assert str(progress) == "100 rows (50 rows/sec)"
@@ -0,0 +1,92 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from japanese_text_cleaner.results import KeysetPager, one_line_preview, parse_time
+
+
+class TestOneLinePreview:
+
+    def test_short(self):
+        assert one_line_preview("abc") == "abc"
+
+    def test_newlines(self):
+        assert one_line_preview("a\r\nb\nc") == "a⏎b⏎c"
+
+    def test_truncated(self):
+        assert one_line_preview("abcdefgh", limit=5) == "abcd…"
+
+
+class TestKeysetPager:
+
+    def _pager(self, count, page_size=10):
+        # Rows are the numbers count - 1 down to 0, newest first, and are their own keys
+        fetches = []
+
+        def fetch_page(before, after, limit):
+            fetches.append((before, after))
+            if after is not None:
+                return list(range(min(after + limit, count - 1), after, -1))
+            start = count - 1 if before is None else before - 1
+            return list(range(start, max(start - limit, -1), -1))
+
+        return KeysetPager(fetch_page, lambda row: row, page_size=page_size), fetches
+
+    def test_pages(self):
+        pager, fetches = self._pager(25)
+        pager.newest()
+        assert pager.rows == list(range(24, 14, -1))
+        assert (pager.page_number, pager.has_newer, pager.has_older) == (1, False, True)
+        assert not pager.newer()
+
+        assert pager.older()
+        assert pager.rows == list(range(14, 4, -1))
+        assert pager.older()
+        assert pager.rows == [4, 3, 2, 1, 0]
+        assert (pager.page_number, pager.has_newer, pager.has_older) == (3, True, False)
+        assert not pager.older()
+
+        assert pager.newer()
+        assert pager.rows == list(range(14, 4, -1))
+        assert pager.newer()
+        assert pager.rows == list(range(24, 14, -1))
+        assert (pager.page_number, pager.has_newer, pager.has_older) == (1, False, True)
+        assert fetches == [(None, None), (15, None), (5, None), (None, 4), (None, 14)]
+
+    def test_exact_pages(self):
+        pager, _ = self._pager(20)
+        pager.newest()
+        assert pager.older()
+        assert pager.rows == list(range(9, -1, -1))
+        assert not pager.has_older
+
+    def test_empty(self):
+        pager, _ = self._pager(0)
+        pager.newest()
+        assert pager.rows == []
+        assert not pager.has_older
+        assert not pager.older()
+
+
+class TestParseTime:
+
+    def test_formats(self):
+        assert parse_time("2019-07-10") == 1562716800000
+        assert parse_time(" 2019-07-10T18:30 ") == 1562716800000 + (18 * 60 + 30) * 60000
+        assert parse_time("2019-07-10T18:30:15") == 1562716800000 + ((18 * 60 + 30) * 60 + 15) * 1000
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_time("10/07/2019")
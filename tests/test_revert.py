@@ -0,0 +1,117 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from japanese_text_cleaner.db.change_log import ChangeLog, ChangeLogEntry, ChangeLogQuery
+from japanese_text_cleaner.db.notes import NoteChangedError
+from japanese_text_cleaner.db.revert import REVERT_OP, RevertConflict, apply_revert, plan_revert
+
+from .test_notes import MODELS, SENTENCE_MID, VOCAB_MID, collection_db
+
+
+def _fields(db):
+    return dict(db.all("select id, flds from notes"))
+
+
+class TestRevert:
+
+    def _setup(self, tmpdir):
+        # The notes as left by a fix of the Reading fields in batch 1000, which was logged
+        db = collection_db([
+            (10, VOCAB_MID, ["一", "一[いち]", "one"]),
+            (11, SENTENCE_MID, ["文", "sentence", "文[ぶん]"]),
+            (12, VOCAB_MID, ["二", "二[に]", "two"]),
+        ])
+        changelog = ChangeLog(str(tmpdir.join("changelog.db")))
+        changelog.record_and_commit_changes("clean_spaces", 1000, [
+            ChangeLogEntry(ts=1000, nid=10, fld="Reading", old="一 [いち]", new="一[いち]"),
+            ChangeLogEntry(ts=1000, nid=11, fld="Reading", old=" 文[ぶん]", new="文[ぶん]"),
+            ChangeLogEntry(ts=1000, nid=12, fld="Reading", old="二 [に]", new="二[に]"),
+        ])
+        return db, changelog
+
+    def test_revert_batch(self, tmpdir):
+        db, changelog = self._setup(tmpdir)
+        plan = plan_revert(db, MODELS, changelog, ChangeLogQuery(init_ts=1000))
+        assert plan.conflicts == []
+        assert plan.nids() == [10, 11, 12]
+        apply_revert(db, changelog, plan, init_ts=5000000, usn=-1)
+        assert db.all("select id, flds, mod, usn from notes order by id") == [
+            (10, "一\x1f一 [いち]\x1fone", 5000, -1),
+            (11, "文\x1fsentence\x1f 文[ぶん]", 5000, -1),
+            (12, "二\x1f二 [に]\x1ftwo", 5000, -1),
+        ]
+        assert [(row[1], row[2], row[4], row[6], row[7]) for row in changelog.page(ChangeLogQuery(op=REVERT_OP))] == [
+            (REVERT_OP, 5000000, 12, "二[に]", "二 [に]"),
+            (REVERT_OP, 5000000, 11, "文[ぶん]", " 文[ぶん]"),
+            (REVERT_OP, 5000000, 10, "一[いち]", "一 [いち]"),
+        ]
+
+        # Reverting the revert restores the fix
+        plan = plan_revert(db, MODELS, changelog, ChangeLogQuery(init_ts=5000000))
+        apply_revert(db, changelog, plan, init_ts=6000000, usn=-1)
+        assert db.list("select flds from notes where id = 10") == ["一\x1f一[いち]\x1fone"]
+        changelog.close()
+
+    def test_conflicts(self, tmpdir):
+        db, changelog = self._setup(tmpdir)
+        db.execute("update notes set flds = ? where id = 10", "一\x1f一[いち]です\x1fone")
+        db.execute("delete from notes where id = 12")
+        plan = plan_revert(db, MODELS, changelog, ChangeLogQuery(init_ts=1000))
+        assert plan.conflicts == [
+            RevertConflict(nid=10, field="Reading", expected="一[いち]", current="一[いち]です"),
+            RevertConflict(nid=12, field="Reading", expected="二[に]", current=None),
+        ]
+        assert plan.nids() == [11]
+        apply_revert(db, changelog, plan, init_ts=5000000, usn=-1)
+        assert _fields(db) == {10: "一\x1f一[いち]です\x1fone", 11: "文\x1fsentence\x1f 文[ぶん]"}
+        assert changelog.count(ChangeLogQuery(op=REVERT_OP)) == 1
+        changelog.close()
+
+    def test_restores_before_first_change(self, tmpdir):
+        db, changelog = self._setup(tmpdir)
+        changelog.record_and_commit_changes("clean_furigana", 2000, [
+            ChangeLogEntry(ts=2000, nid=10, fld="Reading", old="一[いち]", new="一[いち]。"),
+        ])
+        db.execute("update notes set flds = ? where id = 10", "一\x1f一[いち]。\x1fone")
+        plan = plan_revert(db, MODELS, changelog, ChangeLogQuery(nid=10))
+        assert plan.conflicts == []
+        apply_revert(db, changelog, plan, init_ts=5000000, usn=-1)
+        assert db.list("select flds from notes where id = 10") == ["一\x1f一 [いち]\x1fone"]
+        changelog.close()
+
+    def test_edited_between_changes(self, tmpdir):
+        db, changelog = self._setup(tmpdir)
+        # The field was edited by hand after the fix, without being logged, and then fixed again
+        changelog.record_and_commit_changes("clean_spaces", 2000, [
+            ChangeLogEntry(ts=2000, nid=10, fld="Reading", old="一[いち]です ", new="一[いち]です"),
+        ])
+        db.execute("update notes set flds = ? where id = 10", "一\x1f一[いち]です\x1fone")
+        plan = plan_revert(db, MODELS, changelog, ChangeLogQuery(op="clean_spaces"))
+        assert plan.conflicts == [
+            RevertConflict(nid=10, field="Reading", expected="一[いち]", current="一[いち]です "),
+        ]
+        assert plan.nids() == [11, 12]
+
+    def test_modified_after_plan(self, tmpdir):
+        db, changelog = self._setup(tmpdir)
+        plan = plan_revert(db, MODELS, changelog, ChangeLogQuery(init_ts=1000))
+        db.execute("update notes set flds = ? where id = 12", "二\x1f二[に]です\x1ftwo")
+        before = _fields(db)
+        with pytest.raises(NoteChangedError):
+            apply_revert(db, changelog, plan, init_ts=5000000, usn=-1)
+        assert _fields(db) == before
+        assert changelog.count(ChangeLogQuery(op=REVERT_OP)) == 0
+        changelog.close()
@@ -0,0 +1,209 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from japanese_text_cleaner import scan as scan_module
+from japanese_text_cleaner.db.clean_state import CleanState
+from japanese_text_cleaner.db.notes import fetch_note_mods, field_indices
+from japanese_text_cleaner.scan import Rescan, rescan_notes, scan_notes
+from japanese_text_cleaner.text.pipeline import FURIGANA, SPACING
+
+from .test_notes import MODELS, SENTENCE_MID, VOCAB_MID, collection_db
+
+READING = field_indices(MODELS, ["Reading"])
+EXPRESSION = field_indices(MODELS, ["Expression"])
+BOTH = field_indices(MODELS, ["Expression", "Reading"])
+
+
+def _db():
+    return collection_db([
+        (10, VOCAB_MID, ["一", "<b> 一[いち]</b>", "one"]),
+        (11, SENTENCE_MID, ["文", "sentence", "文[ぶん]"]),
+        (12, VOCAB_MID, ["二", "二[に]", "two"]),
+    ])
+
+
+class RecordingExecutor:
+    """Stands in for a ProcessPoolExecutor, cleaning in this process while recording the chunks it's given"""
+
+    started = []
+
+    def __init__(self, max_workers):
+        self.chunks = []
+        RecordingExecutor.started.append(self)
+
+    def map(self, fn, chunks, *args):
+        chunks = list(chunks)
+        self.chunks.extend(chunks)
+        return map(fn, chunks, *args)
+
+    def shutdown(self):
+        pass
+
+
+def _cleaned(scan):
+    return [(note_field.nid, outcome.result.cleaned) for note_field, outcome in scan]
+
+
+class TestScanNotes:
+
+    def test_scan(self):
+        scan = scan_notes(_db(), [12, 10, 11], READING, SPACING)
+        assert _cleaned(scan) == [(12, "二[に]"), (10, "<b>一[いち]</b>"), (11, "文[ぶん]")]
+
+    def test_multiple_fields(self):
+        scan = scan_notes(_db(), [12, 10, 11], BOTH, SPACING)
+        assert [(note_field.nid, note_field.field) for note_field, _ in scan] == [
+            (12, "Expression"), (12, "Reading"), (10, "Expression"), (10, "Reading"), (11, "Reading")]
+        assert len(scan) == 5
+        assert scan.note_count == 3
+
+    def test_fetch_note_mods(self):
+        assert fetch_note_mods(_db(), [10, 11, 12, 99], EXPRESSION) == {10: (VOCAB_MID, 110), 12: (VOCAB_MID, 112)}
+
+
+class TestRescanNotes:
+
+    def test_no_previous_scan(self):
+        scan, cleaned = rescan_notes(_db(), None, [10, 11, 12], READING, SPACING)
+        assert cleaned == 3
+        assert len(scan) == 3
+
+    def test_unmodified(self):
+        db = _db()
+        scan = scan_notes(db, [10, 11, 12], READING, SPACING)
+        rescan, cleaned = rescan_notes(db, scan, [10, 11, 12], READING, SPACING)
+        assert rescan is scan
+        assert cleaned == 0
+
+    def test_modified(self):
+        db = _db()
+        scan = scan_notes(db, [10, 11, 12], READING, SPACING)
+        db.execute("update notes set flds = ?, mod = ? where id = ?", "三\x1f 三[さん]\x1fthree", 200, 12)
+        db.execute("delete from notes where id = ?", 11)
+        rescan, cleaned = rescan_notes(db, scan, [10, 11, 12], READING, SPACING)
+        assert cleaned == 1
+        assert _cleaned(rescan) == [(10, "<b>一[いち]</b>"), (12, "三[さん]")]
+        assert [note_field.mod for note_field, _ in rescan] == [110, 200]
+
+    def test_deleted(self):
+        db = _db()
+        scan = scan_notes(db, [10, 11, 12], READING, SPACING)
+        db.execute("delete from notes where id = ?", 11)
+        rescan, cleaned = rescan_notes(db, scan, [10, 11, 12], READING, SPACING)
+        assert cleaned == 0
+        assert [note_field.nid for note_field, _ in rescan] == [10, 12]
+
+    def test_different_field_or_cleaner(self):
+        db = _db()
+        scan = scan_notes(db, [10, 11, 12], READING, SPACING)
+        rescan, cleaned = rescan_notes(db, scan, [10, 11, 12], READING, FURIGANA)
+        assert cleaned == 3
+        assert rescan.cleaner_name == FURIGANA.name
+        rescan, cleaned = rescan_notes(db, rescan, [10, 11, 12], EXPRESSION, FURIGANA)
+        assert cleaned == 2
+        assert [note_field.content for note_field, _ in rescan] == ["一", "二"]
+
+
+class TestRescan:
+
+    def test_chunks(self):
+        db = _db()
+        rescan = Rescan(db, None, [10, 11, 12], READING, SPACING)
+        chunks = list(rescan.clean_chunks(chunk_size=2))
+        assert [[note_field.nid for note_field, _ in chunk] for chunk in chunks] == [[10, 11], [12]]
+        assert _cleaned(rescan.finish()) == [(10, "<b>一[いち]</b>"), (11, "文[ぶん]"), (12, "二[に]")]
+
+    def test_reused(self):
+        db = _db()
+        scan = scan_notes(db, [10, 11, 12], READING, SPACING)
+        db.execute("update notes set mod = ? where id = ?", 200, 11)
+        rescan = Rescan(db, scan, [10, 11, 12], READING, SPACING)
+        assert [note_field.nid for note_field, _ in rescan.reused] == [10, 12]
+        assert [note_field.nid for note_field in rescan.pending] == [11]
+
+    def test_reused_multiple_fields(self):
+        db = _db()
+        scan = scan_notes(db, [10, 11, 12], BOTH, SPACING)
+        db.execute("update notes set mod = ? where id = ?", 200, 10)
+        rescan = Rescan(db, scan, [10, 11, 12], BOTH, SPACING)
+        assert [(note_field.nid, note_field.field) for note_field, _ in rescan.reused] == [
+            (11, "Reading"), (12, "Expression"), (12, "Reading")]
+        assert [(note_field.nid, note_field.field) for note_field in rescan.pending] == [
+            (10, "Expression"), (10, "Reading")]
+        list(rescan.clean_chunks(chunk_size=1))
+        assert [note_field.nid for note_field, _ in rescan.finish()] == [10, 10, 11, 12, 12]
+
+    def test_skips_clean(self, tmpdir):
+        db = _db()
+        state = CleanState(str(tmpdir.join("clean_state.db")))
+        scan = scan_notes(db, [10, 11, 12], BOTH, SPACING, clean_state=state)
+        assert len(scan) == 5
+
+        # Only the fields that were changed or modified since are checked again
+        db.execute("update notes set mod = ? where id = ?", 200, 12)
+        rescan = Rescan(db, None, [10, 11, 12], BOTH, SPACING, state)
+        assert rescan.skipped == 2
+        assert rescan.skipped_notes == 1
+        assert [(note_field.nid, note_field.field) for note_field in rescan.pending] == [
+            (10, "Reading"), (12, "Expression"), (12, "Reading")]
+
+    def test_previous_scan_before_clean_state(self, tmpdir):
+        db = _db()
+        state = CleanState(str(tmpdir.join("clean_state.db")))
+        scan = scan_notes(db, [10, 11, 12], READING, SPACING, clean_state=state)
+        rescan = Rescan(db, scan, [10, 11, 12], READING, SPACING, state)
+        assert len(rescan.reused) == 3
+        assert rescan.skipped == 0
+        assert rescan.finish() is scan
+
+    def test_cancelled(self):
+        rescan = Rescan(_db(), None, [10, 11, 12], READING, SPACING)
+        chunks = rescan.clean_chunks(chunk_size=2)
+        next(chunks)
+        chunks.close()
+        with pytest.raises(ValueError):
+            rescan.finish()
+
+        # Continues from where it stopped
+        assert [len(chunk) for chunk in rescan.clean_chunks(chunk_size=2)] == [1]
+        assert len(rescan.finish()) == 3
+
+    def _parallel_db(self):
+        # Content not cleaned by other tests, so none of it is cached
+        return collection_db([
+            (10, VOCAB_MID, ["並", " 並[へい]", "parallel"]),
+            (11, VOCAB_MID, ["列", " 列[れつ]", "row"]),
+            (12, VOCAB_MID, ["行", " 行[ぎょう]", "line"]),
+        ])
+
+    def test_parallel_threshold_for_whole_scan(self, monkeypatch):
+        monkeypatch.setattr(scan_module, "ProcessPoolExecutor", RecordingExecutor)
+        monkeypatch.setattr(RecordingExecutor, "started", [])
+        rescan = Rescan(self._parallel_db(), None, [10, 11, 12], READING, SPACING)
+        # Each chunk holds too little to be cleaned by the workers on its own, but all of them together enough
+        chunks = list(rescan.clean_chunks(workers=2, chunk_size=1, min_parallel_chars=15))
+        assert len(chunks) == 3
+        assert len(RecordingExecutor.started) == 1
+        assert RecordingExecutor.started[0].chunks == [[" 並[へい]"], [" 列[れつ]"], [" 行[ぎょう]"]]
+        assert _cleaned(rescan.finish()) == [(10, "並[へい]"), (11, "列[れつ]"), (12, "行[ぎょう]")]
+
+    def test_small_scan_in_process(self, monkeypatch):
+        monkeypatch.setattr(scan_module, "ProcessPoolExecutor", RecordingExecutor)
+        monkeypatch.setattr(RecordingExecutor, "started", [])
+        rescan = Rescan(self._parallel_db(), None, [10, 11, 12], READING, SPACING)
+        list(rescan.clean_chunks(workers=2, chunk_size=1, min_parallel_chars=100))
+        assert RecordingExecutor.started == []
+        assert len(rescan.finish()) == 3
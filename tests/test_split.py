@@ -0,0 +1,66 @@
+# Copyright 2019 Matthew Hayes
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import types
+
+import pytest
+
+from japanese_text_cleaner.text.exceptions import JapaneseReadingFormattingError
+from japanese_text_cleaner.text.split import HTML, SPACES, TEXT, formatting_aware_split, iter_tokens
+
+
+class TestIterTokens:
+
+    def test_lazy(self):
+        assert isinstance(iter_tokens("abc"), types.GeneratorType)
+
+    def test_empty(self):
+        assert list(iter_tokens("")) == []
+
+    def test_text_and_spaces(self):
+        assert list(iter_tokens("  abc def  ")) == [
+            (SPACES, "  "), (TEXT, "abc"), (SPACES, " "), (TEXT, "def"), (SPACES, "  ")]
+
+    def test_readings_merged_with_text(self):
+        assert list(iter_tokens("a[bc] de[f g]hi")) == [
+            (TEXT, "a[bc]"), (SPACES, " "), (TEXT, "de[f g]hi")]
+
+    def test_html(self):
+        assert list(iter_tokens("<a href=\"x y\">b c</a>")) == [
+            (HTML, "<a href=\"x y\">"), (TEXT, "b"), (SPACES, " "), (TEXT, "c"), (HTML, "</a>")]
+
+    def test_brackets_and_angles_as_text(self):
+        assert list(iter_tokens("a<b c[]d[e")) == [
+            (TEXT, "a<b"), (SPACES, " "), (TEXT, "c[]d[e")]
+        assert list(iter_tokens("1 < 2<b>x</b>")) == [
+            (TEXT, "1"), (SPACES, " "), (TEXT, "<"), (SPACES, " "), (TEXT, "2"), (HTML, "<b>"),
+            (TEXT, "x"), (HTML, "</b>")]
+
+    def test_token_fields(self):
+        token = next(iter_tokens("abc"))
+        assert token.type == TEXT
+        assert token.text == "abc"
+
+    def test_formatting_aware_split(self):
+        assert formatting_aware_split("<b> a[b]</b>") == [
+            (HTML, "<b>"), (SPACES, " "), (TEXT, "a[b]"), (HTML, "</b>")]
+
+    def test_validate(self):
+        assert list(iter_tokens("a[b] c[]", validate=True)) == [(TEXT, "a[b]"), (SPACES, " "), (TEXT, "c[]")]
+        assert list(iter_tokens("<a title=\"[\">b]", validate=True)) == [(HTML, "<a title=\"[\">"), (TEXT, "b]")]
+
+        for content in ["abc[def", "abc]def", "abc[def]]", "abc[[def]", "<b>a</b> b]", "<a title=\"[\">b"]:
+            list(iter_tokens(content))
+            with pytest.raises(JapaneseReadingFormattingError):
+                list(iter_tokens(content, validate=True))